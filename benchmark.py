@@ -0,0 +1,675 @@
+# Benchmarks for the Student Management System on synthetic data
+# Run with: python benchmark.py <name> [size]
+import asyncio
+import csv
+import io
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import project
+from project import Student
+
+SUBJECTS = ["math", "phy", "chem", "bio", "cs"]
+
+# Build a list of random (obtained, max) marks, with roughly one in ten tests left blank (None)
+def synthetic_marks(rng, tests):
+    marks = []
+    for _ in range(tests):
+        total = rng.choice([20, 50, 100])
+        marks.append(None if rng.random() < 0.1 else (rng.randint(total // 5, total), total))
+    return marks
+
+# Build a list of random percentage scores, with roughly one in ten tests left blank
+def synthetic_scores(rng, tests):
+    return project.percentages(synthetic_marks(rng, tests))
+
+# Build the keyword arguments for n synthetic students, each enrolled in two to five subjects
+# The same seed always produces the same roster
+def synthetic_roster(n, seed=50):
+    rng = random.Random(seed)
+    roster = []
+    for _ in range(n):
+        enrolled = rng.sample(SUBJECTS, rng.randint(2, 5))
+        roster.append({sub: synthetic_marks(rng, rng.randint(3, 8)) for sub in enrolled})
+    return roster
+
+# Build users_data rows and GRN -> marks dictionaries for each subject
+# Every student has the same number of tests within a subject, as in the real gradebooks
+# Teachers are spread over the subjects in turn, so with more than five teachers several share a subject
+def synthetic_school(n, seed=50, teachers=5):
+    rng = random.Random(seed)
+    tests = {sub: rng.randint(3, 8) for sub in SUBJECTS}
+    users_data = []
+    subject_marks = {sub: {} for sub in SUBJECTS}
+    for i in range(n):
+        grn = str(1000 + i)
+        enrolled = rng.sample(SUBJECTS, rng.randint(2, 5))
+        users_data.append({"grn": grn, "name": f"Student {i}", **{sub: "1" if sub in enrolled else "0" for sub in SUBJECTS}})
+        for sub in enrolled:
+            subject_marks[sub][grn] = synthetic_marks(rng, tests[sub])
+    for i in range(teachers):
+        sub = SUBJECTS[i % len(SUBJECTS)]
+        users_data.append({"grn": "", "name": f"Teacher {i}", **{other: "1" if other == sub else "0" for other in SUBJECTS}})
+    return users_data, subject_marks
+
+# The subject dictionaries load_subject would return for the synthetic marks, with lists of their own
+def loaded_subjects(subject_marks):
+    return {sub: {grn: list(marks) for grn, marks in data.items()} for sub, data in subject_marks.items()}
+
+# Write users.csv and the subject CSVs for a synthetic school into a directory
+def write_school(directory, users_data, subject_marks):
+    with open(os.path.join(directory, "users.csv"), "w", newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=["grn", "name", *SUBJECTS])
+        writer.writeheader()
+        writer.writerows(users_data)
+    for sub, data in subject_marks.items():
+        tests = max((len(marks) for marks in data.values()), default=0)
+        with open(os.path.join(directory, f"{sub}.csv"), "w", newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(["grn", *[f"test{i + 1}" for i in range(tests)]])
+            for grn, marks in data.items():
+                writer.writerow([grn, *["" if mark is None else f"{mark[0]}/{mark[1]}" for mark in marks]])
+
+# Write passwords.csv for a synthetic school: an admin, then every student and teacher in users order
+# Everyone shares one hash of password123, as accounts created in bulk do, so even a million rows take seconds
+# The salt comes from the seed so the file is the same on every run
+def write_passwords(directory, users_data, seed=50):
+    password = project.hash_password("password123", salt=random.Random(seed).randbytes(16))
+    with open(os.path.join(directory, "passwords.csv"), "w", newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["name", "email", "password"])
+        writer.writerow(["Admin User", "admin.user@admin.edu", password])
+        for user in users_data:
+            first_name, last_name = user["name"].lower().split()
+            writer.writerow([user["name"], f"{first_name}.{last_name}@{'student' if user['grn'] else 'teacher'}.edu", password])
+
+# Write a complete synthetic school (users.csv, passwords.csv and a CSV per subject) into a directory
+# The same n and seed always produce the same files byte for byte; about one score in ten is blank and tests are out of 20, 50 or 100
+def generate_school(directory, n, seed=50, teachers=5):
+    users_data, subject_marks = synthetic_school(n, seed, teachers)
+    write_school(directory, users_data, subject_marks)
+    write_passwords(directory, users_data, seed)
+    return users_data
+
+# Generate a school of n students into school_<n> for the benchmark suite or for trying the menus at scale
+def bench_generate(n=1_000, seed=50):
+    directory = f"school_{n}"
+    os.makedirs(directory, exist_ok=True)
+    _, elapsed = timed(generate_school, directory, n, seed)
+    print(f"Wrote a school of {n} students to {directory} in {elapsed:.1f}s")
+
+# Time a function call and return its result with the elapsed seconds
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+# Measure memory per Student object and the time to compute every average twice
+# The second pass shows the benefit of cached averages
+def bench_students(n=100_000):
+    roster = synthetic_roster(n)
+    build = lambda: [Student(**scores) for scores in roster]
+    tracemalloc.start()
+    students = build()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del students
+    students, build_time = timed(build)
+    _, first_time = timed(lambda: [student.average() for student in students])
+    _, second_time = timed(lambda: [student.average() for student in students])
+    print(f"{n} students built in {build_time:.3f}s, {memory / n:.0f} bytes per student")
+    print(f"First averages pass: {first_time:.3f}s")
+    print(f"Second averages pass: {second_time:.3f}s")
+
+# Compare answering top-10, rank-range and percentile questions by sorting everyone with
+# a heap and with the order-statistics rank index, and the cost of keeping the index current after a score change
+def bench_queries(n=100_000, queries=100):
+    users_data, subject_marks = synthetic_school(n)
+    students = project.load_students(loaded_subjects(subject_marks), users_data)
+    rank_index, build_time = timed(project.RankIndex, users_data, students)
+    full = lambda: [project.calculate_student_rankings(users_data, students)[:10] for _ in range(queries)]
+    heap = lambda: [project.calculate_student_rankings(users_data, students, limit=10) for _ in range(queries)]
+    indexed = lambda: [rank_index.top(10) for _ in range(queries)]
+    averages = [student.average() for student in students.values()]
+    linear_percentile = lambda: [sum(avg < averages[i] for avg in averages) for i in range(queries)]
+    indexed_percentile = lambda: [rank_index.percentile(averages[i]) for i in range(queries)]
+    grns = list(students)[:queries]
+    def update():
+        for grn in grns:
+            students[grn].set_scores("math", [(19, 20), (18, 20)])
+            rank_index.update(grn, students[grn])
+    print(f"Rank index for {n} students built in {build_time:.3f}s")
+    for label, function in [("top 10, full sort", full), ("top 10, heap", heap), ("top 10, rank index", indexed),
+                            ("percentile, linear scan", linear_percentile), ("percentile, rank index", indexed_percentile),
+                            ("ranks 100-150, rank index", lambda: [rank_index.rank_range(100, 150) for _ in range(queries)]),
+                            ("score change + index update", update)]:
+        _, elapsed = timed(function)
+        print(f"{label}: {elapsed / queries * 1000:.3f}ms per query")
+
+# Compare the pure-Python and NumPy backends on the whole-school calculations
+def bench_engine(n=100_000):
+    users_data, subject_marks = synthetic_school(n)
+    subject_data = loaded_subjects(subject_marks)
+    students = project.load_students(subject_data, users_data)
+    engine, build_time = timed(project.load_score_engine, users_data, subject_data)
+    print(f"NumPy engine built for {n} students in {build_time:.3f}s")
+    for label, backend in [("python", None), ("numpy", engine)]:
+        for student in students.values():
+            student.invalidate()
+        _, rankings_time = timed(project.calculate_student_rankings, users_data, students, backend)
+        _, teachers_time = timed(project.calculate_teacher_averages, users_data, subject_data, students, backend)
+        print(f"{label}: student rankings {rankings_time:.3f}s, teacher averages {teachers_time:.3f}s")
+
+# Teacher averages the way they were computed before the subject statistics:
+# every teacher walks all of their subject's students again, even when another teacher shares the subject
+def per_teacher_averages(users_data, subject_data, students):
+    results = []
+    for user in users_data:
+        if not user["grn"]:
+            sub = project.get_enrolled_subjects(user)[0]
+            averages = [students[grn].average(sub) for grn in subject_data[sub]]
+            results.append({"name": user["name"], "average": sum(averages) / len(averages)})
+    return results
+
+# Compare per-teacher averages with one statistics pass shared by every teacher, on a school with many teachers
+def bench_teachers(n=100_000, teachers=500):
+    users_data, subject_marks = synthetic_school(n, teachers=teachers)
+    subject_data = loaded_subjects(subject_marks)
+    students = project.load_students(subject_data, users_data)
+    project.calculate_student_rankings(users_data, students)
+    _, per_teacher_time = timed(per_teacher_averages, users_data, subject_data, students)
+    results, shared_time = timed(project.calculate_teacher_averages, users_data, subject_data, students)
+    print(f"{teachers} teachers, {n} students")
+    print(f"Per-teacher averages: {per_teacher_time:.3f}s")
+    print(f"Shared subject statistics (mean, count, min, max, stddev, median): {shared_time:.3f}s")
+    if project.np is not None:
+        engine = project.load_score_engine(users_data, subject_data)
+        _, engine_time = timed(project.calculate_teacher_averages, users_data, subject_data, students, engine)
+        print(f"Shared subject statistics with the NumPy engine: {engine_time:.3f}s")
+    assert [result["average"] for result in results] == [result["average"] for result in per_teacher_averages(users_data, subject_data, students)]
+
+# Compare rendering a large class's score table with tabulate and with the streaming grid renderer,
+# including how long it takes before the first line can be written
+def bench_table(n=2_000):
+    from tabulate import tabulate
+    rng = random.Random(50)
+    entries = [(f"Student {i}", synthetic_scores(rng, 8), rng.uniform(40, 100)) for i in range(n)]
+    def with_tabulate():
+        table_data = [[label, *[project.format_score(score) for score in scores], f"{average:.2f}%"] for label, scores, average in entries]
+        return tabulate(table_data, headers=["Student Name", *[f"Test {i+1}" for i in range(8)], "Average"], tablefmt="grid")
+    expected, tabulate_time = timed(with_tabulate)
+    table, stream_time = timed(project.scores_table, "Student Name", entries)
+    _, first_time = timed(lambda: next(project.iter_score_table("Student Name", entries)))
+    print(f"{n}-student table with tabulate: {tabulate_time * 1000:.1f}ms")
+    print(f"Streaming renderer: {stream_time * 1000:.1f}ms, first line after {first_time * 1000:.1f}ms, identical: {table == expected}")
+
+# Measure login cost against a large credentials file: loading it, finding the username
+# with a linear scan versus the email dictionary, and verifying the hashed password
+# Every row shares one hash because hashing a million passwords would dominate the setup
+def bench_login(n=1_000_000):
+    stored = project.hash_password("password123")
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        with open("passwords.csv", "w", newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(["name", "email", "password"])
+            writer.writerows([f"Student {i}", f"student.{i}@student.edu", stored] for i in range(n))
+        passwords, load_time = timed(project.load_passwords)
+        credentials, index_time = timed(project.load_credentials, passwords)
+    username = f"student.{n - 1}@student.edu"
+    _, scan_time = timed(lambda: next(row for row in passwords if row["email"] == username))
+    _, lookup_time = timed(credentials.get, username)
+    _, verify_time = timed(project.verify_password, "password123", credentials[username]["password"])
+    print(f"{n} accounts loaded in {load_time:.3f}s, email index built in {index_time:.3f}s")
+    print(f"Username lookup: linear scan {scan_time * 1000:.3f}ms, dictionary {lookup_time * 1000:.3f}ms")
+    print(f"Password verification ({project.PBKDF2_ITERATIONS} PBKDF2 iterations): {verify_time * 1000:.1f}ms")
+
+# Measure loading users.csv and the menu lookups that used to scan every user:
+# finding a student by name, finding a teacher's subject and preparing a teacher's class table
+def bench_directory(n=100_000):
+    users_data, subject_marks = synthetic_school(n)
+    subject_data = loaded_subjects(subject_marks)
+    with tempfile.TemporaryDirectory() as directory:
+        write_school(directory, users_data, subject_marks)
+        os.chdir(directory)
+        users_data, load_time = timed(project.load_users_data)
+    _, student_time = timed(project.get_student_row, f"Student {n - 1}", users_data)
+    teacher_subject, teacher_time = timed(project.get_teacher_subject, "Teacher 4", users_data)
+    _, prepare_time = timed(project.prepare_teacher_data, teacher_subject, subject_data[teacher_subject], users_data)
+    print(f"{n} users loaded in {load_time:.3f}s")
+    print(f"Student lookup by name: {student_time * 1000:.3f}ms")
+    print(f"Teacher subject lookup: {teacher_time * 1000:.3f}ms")
+    print(f"Teacher class table for {len(subject_data[teacher_subject])} students: {prepare_time:.3f}s")
+
+# Runs project.py as a script and reports its own peak RSS in KiB on stderr when it exits
+# VmHWM is used on Linux because ru_maxrss also counts the benchmark's memory inherited through fork
+RUN_PROJECT = """
+import resource, runpy, sys
+sys.argv = [sys.argv[1]]
+try:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+finally:
+    try:
+        with open("/proc/self/status") as status:
+            peak = next(line.split()[1] for line in status if line.startswith("VmHWM"))
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(peak, file=sys.stderr)
+"""
+
+# Run project.py in a directory with the given keyboard input, returning wall time and peak RSS in KiB
+def run_session(directory, keystrokes):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", RUN_PROJECT, os.path.abspath(project.__file__)],
+                            cwd=directory, input=keystrokes, capture_output=True, text=True)
+    return time.perf_counter() - start, int(result.stderr.split()[-1])
+
+# Measure time and peak memory until the login prompt, and for a student who only lists their courses
+def bench_startup(n=100_000):
+    users_data, subject_marks = synthetic_school(n)
+    with tempfile.TemporaryDirectory() as directory:
+        write_school(directory, users_data, subject_marks)
+        with open(os.path.join(directory, "passwords.csv"), "w", newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(["name", "email", "password"])
+            writer.writerows([row["name"], f"student.{i}@student.edu", "password123"] for i, row in enumerate(users_data))
+        prompt_time, prompt_rss = run_session(directory, "")
+        courses_time, courses_rss = run_session(directory, "student.0@student.edu\npassword123\n1\n")
+    print(f"Time to first prompt ({n} students): {prompt_time:.3f}s, peak RSS {prompt_rss / 1024:.1f} MiB")
+    print(f"Student listing their courses: {courses_time:.3f}s, peak RSS {courses_rss / 1024:.1f} MiB")
+
+# Compare driving the student menu once per student (one process each, as the expect scripts did)
+# with one report run that loads the data once and streams every student's report
+# The per-process approach is timed on a sample of students and scaled up
+def bench_report(n=100_000, sample=5):
+    users_data, subject_marks = synthetic_school(n)
+    with tempfile.TemporaryDirectory() as directory:
+        write_school(directory, users_data, subject_marks)
+        with open(os.path.join(directory, "passwords.csv"), "w", newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(["name", "email", "password"])
+            writer.writerows([row["name"], f"student.{i}@student.edu", "password123"] for i, row in enumerate(users_data))
+        menu_time = sum(run_session(directory, f"student.{i}@student.edu\npassword123\n2\n3\n4\n")[0] for i in range(sample))
+        for output_format in ["csv", "json"]:
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable, os.path.abspath(project.__file__), "report", "--role", "student", "--all",
+                                     "--format", output_format, "--output", f"report.{output_format}"],
+                                    cwd=directory, capture_output=True, text=True)
+            print(f"report --format {output_format}: {time.perf_counter() - start:.3f}s in total; {result.stderr.strip()}")
+    print(f"One menu session per student: {sample / menu_time:.1f} reports/s, about {menu_time / sample * n / 3600:.1f}h for {n}")
+
+# Time table-format report generation with 1 to N worker processes and check every run matches the serial output
+# The data is loaded before timing, so only report building and formatting are measured
+def bench_parallel(n=20_000, max_workers=None):
+    max_workers = max_workers or os.cpu_count()
+    users_data, subject_marks = synthetic_school(n)
+    with tempfile.TemporaryDirectory() as directory:
+        write_school(directory, users_data, subject_marks)
+        os.chdir(directory)
+        project._loaded.clear()
+        project.get_rank_index()
+        serial = None
+        for workers in range(1, max_workers + 1):
+            buffer = io.StringIO()
+            _, elapsed = timed(project.write_reports, "student", buffer, "table", None, None, workers)
+            serial = serial or buffer.getvalue()
+            print(f"{workers} worker(s): {elapsed:.3f}s, {n / elapsed:.0f} reports/s, identical to serial: {buffer.getvalue() == serial}")
+
+# Send one HTTP/1.1 request on an open keep-alive connection and return the status and decoded JSON body
+# headers add to or replace the Host, Content-Length and Authorization headers worked out from the other arguments
+# Shared with the API tests in test_project.py
+async def http_request(reader, writer, method, path, token=None, body=b"", headers=None):
+    fields = {"Host": "localhost", "Content-Length": str(len(body))}
+    if token:
+        fields["Authorization"] = f"Bearer {token}"
+    fields.update(headers or {})
+    head = f"{method} {path} HTTP/1.1\r\n" + "".join(f"{key}: {value}\r\n" for key, value in fields.items())
+    writer.write(head.encode() + b"\r\n" + body)
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while (line := await reader.readline()) != b"\r\n":
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":")[1])
+    return status, json.loads(await reader.readexactly(length))
+
+# One simulated user: log in, then send requests back to back, recording each request's latency
+# Most users are students; every tenth is a teacher looking up students and every fiftieth an admin paging through rankings
+async def api_user(port, user, requests, latencies):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    if user % 50 == 0:
+        email, paths = "admin.0@admin.edu", ["/students/rankings?limit=50", "/teachers/averages"]
+    elif user % 10 == 0:
+        email, paths = f"teacher.{user % 5}@teacher.edu", [f"/class/{1000 + user}", f"/class/{1001 + user}"]
+    else:
+        email, paths = f"student.{user}@student.edu", ["/me/scores", "/me/ranks", "/me/averages", "/me/courses"]
+    _, login = await http_request(reader, writer, "POST", "/login", body=json.dumps({"email": email, "password": "password123"}).encode())
+    for i in range(requests):
+        start = time.perf_counter()
+        status, _ = await http_request(reader, writer, "GET", paths[i % len(paths)], login["token"])
+        latencies.append(time.perf_counter() - start)
+        assert status in (200, 404), status
+    writer.close()
+
+# Load test the API server: start it on a synthetic school, then drive it with many concurrent keep-alive clients
+# Passwords are stored in plain text so the logins do not turn the run into a PBKDF2 benchmark
+def bench_api(n=10_000, clients=200, requests=50):
+    users_data, subject_marks = synthetic_school(n)
+    with tempfile.TemporaryDirectory() as directory:
+        write_school(directory, users_data, subject_marks)
+        with open(os.path.join(directory, "passwords.csv"), "w", newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(["name", "email", "password"])
+            writer.writerows([row["name"], f"student.{i}@student.edu", "password123"] for i, row in enumerate(users_data) if row["grn"])
+            writer.writerows([row["name"], f"teacher.{i}@teacher.edu", "password123"] for i, row in enumerate(row for row in users_data if not row["grn"]))
+            writer.writerow(["Admin", "admin.0@admin.edu", "password123"])
+        server = subprocess.Popen([sys.executable, os.path.abspath(project.__file__), "serve", "--port", "0"], cwd=directory, stdout=subprocess.PIPE, text=True)
+        try:
+            port = int(server.stdout.readline().rsplit(":", 1)[1])
+            latencies = []
+            async def load():
+                await asyncio.gather(*[api_user(port, user, requests, latencies) for user in range(1, clients + 1)])
+            _, elapsed = timed(asyncio.run, load())
+        finally:
+            server.terminate()
+            server.wait()
+    latencies.sort()
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+    print(f"{clients} concurrent clients, {len(latencies)} requests in {elapsed:.2f}s ({len(latencies) / elapsed:.0f} requests/s)")
+    print(f"Latency p50 {percentile(50):.2f}ms, p99 {percentile(99):.2f}ms, max {latencies[-1] * 1000:.2f}ms")
+
+# Time a function call, then call it again under tracemalloc to find its peak memory in bytes
+# Returns the result with the elapsed seconds and the peak
+def traced(function, *args):
+    result, elapsed = timed(function, *args)
+    del result
+    tracemalloc.start()
+    result = function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+# Compare loading a large subject file with per-test detail against streaming only the averages
+def bench_ingest(n=1_000_000):
+    users_data, subject_marks = synthetic_school(n)
+    with tempfile.TemporaryDirectory() as directory:
+        write_school(directory, users_data, {"math": subject_marks["math"]})
+        filename = os.path.join(directory, "math.csv")
+        rows = len(subject_marks["math"])
+        data, load_time, load_peak = traced(project.load_subject, filename)
+        averages, stream_time, stream_peak = traced(project.stream_subject_averages, filename)
+        assert averages == {grn: project.scores_average(scores) for grn, scores in data.items()}
+    print(f"load_subject on {rows} rows: {load_time:.3f}s, peak {load_peak / 2**20:.1f} MiB")
+    print(f"stream_subject_averages on {rows} rows: {stream_time:.3f}s, peak {stream_peak / 2**20:.1f} MiB")
+
+# Compare a cold subject load (parse the CSV and write the binary sidecar) with a warm load from the sidecar
+def bench_cache(n=1_000_000):
+    users_data, subject_marks = synthetic_school(n)
+    with tempfile.TemporaryDirectory() as directory:
+        write_school(directory, users_data, {"math": subject_marks["math"]})
+        filename = os.path.join(directory, "math.csv")
+        cold, cold_time = timed(project.load_subject_cached, filename)
+        warm, warm_time = timed(project.load_subject_cached, filename)
+        assert cold == warm
+    print(f"Cold load of {len(cold)} rows (parse and write sidecar): {cold_time:.3f}s")
+    print(f"Warm load from the memory-mapped sidecar: {warm_time:.3f}s")
+
+# Compare onboarding an intake through the bulk roster import with one account at a time
+# Both hash every account's password separately; one-at-a-time creation also writes every file per student,
+# so it is timed on a sample and scaled up
+def bench_bulk(n=5_000, sample=50):
+    rng = random.Random(50)
+    roster = [{"first_name": f"New{i}", "last_name": "Student", **{sub: str(rng.randint(0, 1)) for sub in SUBJECTS}} for i in range(n)]
+    users_data, subject_marks = synthetic_school(10_000)
+    with tempfile.TemporaryDirectory() as directory:
+        write_school(directory, users_data, subject_marks)
+        with open(os.path.join(directory, "passwords.csv"), "w") as file:
+            file.write("name,email,password\n")
+        os.chdir(directory)
+        project._loaded.clear()
+        project.get_students()
+        _, bulk_time = timed(project.create_student_accounts, roster)
+        _, single_time = timed(lambda: [project.create_student_accounts([student]) for student in roster[:sample]])
+    print(f"Bulk import of {n} students: {bulk_time:.3f}s, {bulk_time / n * 1000:.2f}ms per student")
+    print(f"One at a time: {single_time / sample * 1000:.1f}ms per student, about {single_time / sample * n:.0f}s for {n}")
+
+# Enter a new test's scores for a whole math class, with the rank index loaded
+# Compares one batched write that moves each student in the rank index with rebuilding the index
+# after every entry (timed on a sample), and shows the cost of saving entries one at a time
+def bench_entry(n=100_000, sample=20):
+    rng = random.Random(50)
+    users_data, subject_marks = synthetic_school(n)
+    with tempfile.TemporaryDirectory() as directory:
+        write_school(directory, users_data, subject_marks)
+        os.chdir(directory)
+        project._loaded.clear()
+        rank_index = project.get_rank_index()
+        class_grns = list(project.get_subject("math"))
+        tests = project.add_test("math")
+        marks = {grn: {tests - 1: f"{rng.randint(0, 20)}/20"} for grn in class_grns}
+        _, batch_time = timed(project.record_scores, "math", marks)
+        students = project.get_students()
+        rebuild = lambda: [project.RankIndex(project.get_users_data(), students) for _ in range(sample)]
+        _, rebuild_time = timed(rebuild)
+        single = lambda: [project.record_scores("math", {grn: marks[grn]}) for grn in class_grns[:sample]]
+        _, single_time = timed(single)
+        assert rank_index.total() == len(students)
+    print(f"Whole class of {len(class_grns)} in one write with index updates: {batch_time:.3f}s")
+    print(f"Rebuilding the rank index after every entry: {rebuild_time / sample * 1000:.1f}ms per entry, about {rebuild_time / sample * len(class_grns):.0f}s for the class")
+    print(f"One entry per write with index update: {single_time / sample * 1000:.2f}ms per entry")
+
+# Pick up outside changes to a loaded school: the cost of the watch state taken when a file is loaded, of a poll
+# that finds nothing, of reading rows appended to a subject file and of diffing a subject file edited in place,
+# against reloading and re-ranking everything
+def bench_watch(n=100_000, changes=100):
+    rng = random.Random(50)
+    users_data, subject_marks = synthetic_school(n)
+    with tempfile.TemporaryDirectory() as directory:
+        write_school(directory, users_data, subject_marks)
+        os.chdir(directory)
+        project._loaded.clear()
+        project.get_rank_index()
+        _, state_time = timed(project.FileState, "math.csv")
+        size = os.path.getsize("math.csv")
+        _, idle_time = timed(lambda: [project.refresh_data() for _ in range(100)])
+        grns = rng.sample(list(subject_marks["math"]), changes)
+        tests = len(next(iter(subject_marks["math"].values())))
+        with open("math.csv", "a", newline='') as file:
+            csv.writer(file).writerows([grn, *[f"{rng.randint(0, 20)}/20"] * tests] for grn in grns)
+        _, append_time = timed(project.refresh_data)
+        with open("math.csv", newline='') as file:
+            rows = list(csv.reader(file))
+        for row in rows[1:changes + 1]:
+            row[1] = f"{rng.randint(0, 20)}/20"
+        with open("math.csv", "w", newline='') as file:
+            csv.writer(file).writerows(rows)
+        _, edit_time = timed(project.refresh_data)
+        project._loaded.clear()
+        _, reload_time = timed(project.get_rank_index)
+    print(f"Watch state for math.csv ({size / 2**20:.1f} MiB): {state_time * 1000:.3f}ms")
+    print(f"Poll with no changes: {idle_time / 100 * 1000:.3f}ms")
+    print(f"{changes} rows appended to math.csv: {append_time * 1000:.1f}ms")
+    print(f"math.csv edited in place ({changes} scores changed): {edit_time * 1000:.1f}ms")
+    print(f"Full reload and re-rank of {n} students: {reload_time * 1000:.1f}ms")
+
+# Close several terms of a synthetic school and time a student's trend across them: from the summaries cached
+# when each term was closed, with the summaries rebuilt from the term files, and reloading every term's files
+# and students the way separate copies of the data directory had to be
+def bench_terms(n=100_000, terms=4):
+    users_data, _ = synthetic_school(n)
+    names = [f"2024-{i + 1}" for i in range(terms)]
+    grn = users_data[0]["grn"]
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        close_times = []
+        for i, name in enumerate(names):
+            write_school(directory, users_data, synthetic_school(n, seed=50 + i)[1])
+            project._loaded.clear()
+            _, close_time = timed(project.close_term, name)
+            close_times.append(close_time)
+        project._loaded.clear()
+        trend, cached_time = timed(project.student_trend, grn, names)
+        for name in names:
+            os.remove(os.path.join(project.TERMS_DIRECTORY, name, f"summary.{project.AVERAGE_MODE}.cache"))
+        project._loaded.clear()
+        _, rebuild_time = timed(project.student_trend, grn, names)
+        def reload():
+            averages = []
+            for name in names:
+                term = os.path.join(project.TERMS_DIRECTORY, name)
+                term_users = project.load_users_data(os.path.join(term, "users.csv"))
+                term_subjects = {sub: project.load_subject(os.path.join(term, f"{sub}.csv")) for sub in term_users.subjects}
+                averages.append(project.load_students(term_subjects, term_users)[grn].average())
+            return averages
+        averages, reload_time = timed(reload)
+    assert averages == [entry["average"] for entry in trend]
+    print(f"{terms} terms of {n} students, closed in {sum(close_times) / terms:.2f}s each (archive, reset and summary)")
+    print(f"Trend from cached summaries: {cached_time * 1000:.1f}ms")
+    print(f"Trend with the summaries rebuilt from the term files: {rebuild_time * 1000:.1f}ms")
+    print(f"Reloading every term's files and students: {reload_time * 1000:.1f}ms")
+
+# Per-call cost of the instrumentation on a cheap instrumented function (a rank index lookup),
+# compared with calling the undecorated function, with profiling off, on, and on with memory tracing
+def bench_profile(n=10_000, calls=200_000):
+    users_data, subject_marks = synthetic_school(n)
+    students = project.load_students(loaded_subjects(subject_marks), users_data)
+    rank_index = project.RankIndex(users_data, students)
+    row = next(user for user in users_data if user["grn"])
+    undecorated = project.calculate_overall_rank.__wrapped__
+    loop = lambda function: [function(row, students, rank_index) for _ in range(calls)]
+    _, base_time = timed(loop, undecorated)
+    _, off_time = timed(loop, project.calculate_overall_rank)
+    with tempfile.TemporaryDirectory() as directory:
+        results = []
+        for memory in [False, True]:
+            project.start_profiling(os.path.join(directory, "profile.json"), memory)
+            _, on_time = timed(loop, project.calculate_overall_rank)
+            project.stop_profiling()
+            results.append(on_time)
+    for label, elapsed in [("undecorated", base_time), ("profiling off", off_time),
+                           ("profiling on", results[0]), ("profiling on, tracemalloc", results[1])]:
+        print(f"{label}: {elapsed / calls * 1e6:.2f}us per call")
+
+# Overall average the way it was computed before marks were stored exactly:
+# sums of floating-point percentages, so the result depends on the order the tests and subjects are added in
+def float_average(marks_by_subject):
+    averages = []
+    for marks in marks_by_subject.values():
+        scores = [(mark[0] / mark[1]) * 100 for mark in marks if mark and mark[0]]
+        averages.append(sum(scores) / len(scores) if scores else 0)
+    positive = [avg for avg in averages if avg > 0]
+    return sum(positive) / len(positive) if positive else 0
+
+# Compare exact averages with the old floating-point ones: students whose average came out differently,
+# ties the floating-point sums split, and the cost of each average mode and the memory per student
+def bench_exact(n=100_000):
+    users_data, subject_marks = synthetic_school(n)
+    subject_data = loaded_subjects(subject_marks)
+    by_student = {}
+    for sub, data in subject_marks.items():
+        for grn, marks in data.items():
+            by_student.setdefault(grn, {})[sub] = marks
+    floats = {grn: float_average(by_student.get(grn, {})) for grn in (user["grn"] for user in users_data if user["grn"])}
+    for mode in ["mean", "weighted"]:
+        project.AVERAGE_MODE = mode
+        tracemalloc.start()
+        students, build_time = timed(project.load_students, subject_data, users_data)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        averages, average_time = timed(lambda: {grn: student.average() for grn, student in students.items()})
+        print(f"{mode}: {n} students built in {build_time:.3f}s ({memory / n:.0f} bytes each), averages in {average_time:.3f}s")
+        if mode == "mean":
+            groups = {}
+            for grn, avg in averages.items():
+                groups.setdefault(avg, set()).add(floats[grn])
+            changed = sum(avg != floats[grn] for grn, avg in averages.items())
+            split = sum(len(values) > 1 for values in groups.values())
+            print(f"  {changed} averages differ from the floating-point sums, which split {split} ties")
+    project.AVERAGE_MODE = "mean"
+
+# Create accounts one at a time from a worker process, through the locked and journaled write path
+# Password hashing is stubbed out so the benchmark measures file writes rather than PBKDF2
+def locked_writer(directory, worker, accounts):
+    os.chdir(directory)
+    project.hash_password = lambda password, *args, **kwargs: "benchmark"
+    for i in range(accounts):
+        project.create_student_accounts([{"first_name": f"W{worker}", "last_name": f"S{i}", "math": "1", "phy": "1"}])
+
+# Create accounts the way the unlocked code did: GRNs from the users loaded at startup and plain appends to each file
+def unlocked_writer(directory, worker, accounts):
+    os.chdir(directory)
+    max_grn = project.load_users_data().max_grn
+    for i in range(accounts):
+        max_grn += 1
+        for filename, row in [("users.csv", [max_grn, f"W{worker} S{i}", 1, 1, 0, 0, 0]), ("math.csv", [max_grn]),
+                              ("phy.csv", [max_grn]), ("passwords.csv", [f"W{worker} S{i}", f"w{worker}.s{i}@student.edu", "benchmark"])]:
+            with open(filename, "a", newline='') as file:
+                csv.writer(file).writerow(row)
+
+# Run writer processes against one data directory and report accounts per second and duplicated GRNs
+# Every worker must exit cleanly and every account must land in users.csv, or the throughput would mean nothing
+def run_writers(writer, processes, accounts):
+    with tempfile.TemporaryDirectory() as directory:
+        users_data, subject_marks = synthetic_school(1_000)
+        write_school(directory, users_data, subject_marks)
+        with open(os.path.join(directory, "passwords.csv"), "w") as file:
+            file.write("name,email,password\n")
+        with open(os.path.join(directory, "users.csv")) as file:
+            existing = sum(1 for row in csv.DictReader(file) if row["grn"])
+        workers = [multiprocessing.Process(target=writer, args=(directory, worker, accounts)) for worker in range(processes)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        assert all(worker.exitcode == 0 for worker in workers), [worker.exitcode for worker in workers]
+        with open(os.path.join(directory, "users.csv")) as file:
+            grns = [row["grn"] for row in csv.DictReader(file) if row["grn"]]
+        assert len(grns) == existing + processes * accounts, (len(grns), existing + processes * accounts)
+    return processes * accounts / elapsed, len(grns) - len(set(grns))
+
+# Compare concurrent account creation through the locked, journaled path with the old unlocked appends
+def bench_writers(processes=4, accounts=200):
+    for label, writer in [("unlocked appends", unlocked_writer), ("locked + journaled", locked_writer)]:
+        rate, duplicates = run_writers(writer, processes, accounts)
+        print(f"{label}, {processes} processes: {rate:.0f} accounts/s, {duplicates} duplicated GRNs")
+
+BENCHMARKS = {
+    "generate": bench_generate,
+    "students": bench_students,
+    "engine": bench_engine,
+    "queries": bench_queries,
+    "teachers": bench_teachers,
+    "table": bench_table,
+    "login": bench_login,
+    "directory": bench_directory,
+    "startup": bench_startup,
+    "report": bench_report,
+    "parallel": bench_parallel,
+    "api": bench_api,
+    "ingest": bench_ingest,
+    "cache": bench_cache,
+    "bulk": bench_bulk,
+    "writers": bench_writers,
+    "entry": bench_entry,
+    "profile": bench_profile,
+    "watch": bench_watch,
+    "exact": bench_exact,
+    "terms": bench_terms,
+}
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        sys.exit(f"Usage: python benchmark.py <{'|'.join(BENCHMARKS)}> [size]")
+    args = [int(arg) for arg in sys.argv[2:]]
+    BENCHMARKS[sys.argv[1]](*args)
+
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,425 @@
 # Importing the necessary modules
+import argparse
+import asyncio
+import atexit
+import cProfile
 import csv
+import gc
+import hashlib
+import hmac
+import io
+import json
+import mmap
+import re
+import secrets
+import shutil
+import os
+import sqlite3
+import struct
 import sys
-from tabulate import tabulate
+import time
+import traceback
+import tracemalloc
+from array import array
+from math import ceil, lcm, nan, sqrt
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from fractions import Fraction
+from functools import wraps
+from http import HTTPStatus
+from heapq import nlargest
+from itertools import chain, groupby, repeat
+from operator import neg
+from urllib.parse import parse_qsl
 
-# The Student class represents a student with their test scores in five subjects
-# Each subject stores a list of percentage scores, with None for missing tests
+# fcntl is only available on Unix; elsewhere writes go ahead without the advisory lock
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# NumPy is optional; without it the pure-Python backend is always used
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Hot-path instrumentation, off unless SMS_PROFILE (or --profile) names a file to write when the program exits
+# A file ending in .prof gets a cProfile dump for pstats or snakeviz; any other file gets a JSON summary of
+# the instrumented functions' call counts and total, mean and p99 durations, plus the bytes they allocated
+# (net and peak, traced with tracemalloc) when SMS_PROFILE_MEMORY=1 (or --profile-memory) is also set
+# _profile is empty while instrumentation is off, so an instrumented call only adds one truth test
+_profile = {}
+
+# Record every call of a function under its qualified name while instrumentation is on
+def instrumented(function):
+    name = function.__qualname__
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _profile:
+            return function(*args, **kwargs)
+        with measure(name):
+            return function(*args, **kwargs)
+    return wrapper
+
+# Record the duration (and allocations, when traced) of a block of code under a name while instrumentation is on
+@contextmanager
+def measure(name):
+    if not _profile or "timings" not in _profile:
+        yield
+        return
+    memory = tracemalloc.is_tracing()
+    if memory:
+        # Peaks are absolute, and each block hands its peak up to the block it is nested in,
+        # since resetting the tracemalloc peak for an inner block loses the outer block's peak so far
+        start_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        _profile["peaks"].append(start_memory)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _profile["timings"].setdefault(name, []).append(time.perf_counter() - start)
+        if memory:
+            end_memory, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, _profile["peaks"].pop())
+            if _profile["peaks"]:
+                _profile["peaks"][-1] = max(_profile["peaks"][-1], peak)
+            allocations = _profile["allocations"].setdefault(name, [0, 0])
+            allocations[0] += end_memory - start_memory
+            allocations[1] = max(allocations[1], peak - start_memory)
+
+# Switch instrumentation on and register the write of filename at exit
+def start_profiling(filename, memory=False):
+    _profile["file"] = filename
+    _profile["start"] = time.perf_counter()
+    if filename.endswith(".prof"):
+        _profile["profiler"] = cProfile.Profile()
+        _profile["profiler"].enable()
+    else:
+        _profile["timings"] = {}
+        if memory:
+            _profile["allocations"] = {}
+            _profile["peaks"] = []
+            tracemalloc.start()
+    atexit.register(stop_profiling)
+
+# Summarize the recorded calls: count, total, mean and p99 duration, and allocated bytes when traced
+def profile_summary():
+    functions = {}
+    for name, durations in sorted(_profile.get("timings", {}).items()):
+        durations = sorted(durations)
+        functions[name] = {
+            "calls": len(durations),
+            "total_seconds": sum(durations),
+            "mean_ms": sum(durations) / len(durations) * 1000,
+            "p99_ms": durations[ceil(len(durations) * 0.99) - 1] * 1000,
+        }
+        if name in _profile.get("allocations", {}):
+            functions[name]["allocated_bytes"], functions[name]["peak_bytes"] = _profile["allocations"][name]
+    return {"wall_seconds": time.perf_counter() - _profile["start"], "functions": functions}
+
+# Switch instrumentation off and write the cProfile dump or the JSON summary
+def stop_profiling():
+    if not _profile:
+        return
+    if "profiler" in _profile:
+        _profile["profiler"].disable()
+        _profile["profiler"].dump_stats(_profile["file"])
+    else:
+        summary = profile_summary()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        with open(_profile["file"], "w") as file:
+            json.dump(summary, file, indent=2)
+    _profile.clear()
+
+# How averages are taken: "mean" (the default) averages the percentage of each test, while "weighted"
+# divides the total marks obtained by the total max marks, so a test out of 100 counts five times a test out of 20
+# Chosen with SMS_AVERAGE=weighted or --average weighted before any data is loaded
+AVERAGE_MODE = os.environ.get("SMS_AVERAGE", "mean")
+
+# The Student class represents a student with their test scores in any number of subjects
+# Scores are passed per subject as keyword arguments, as (obtained, max) marks or as percentages,
+# e.g. Student(math=[(17, 20), None], phy=[70]); None is a missing test
+# All marks are kept exactly, as one compact integer array of obtained and max pairs ((0, 0) for a missing test),
+# and the subject boundaries (counted in tests) are kept in a small offsets array indexed by each subject's slot
+# Averages are worked out in integers and rounded to a float once, so equal averages always compare equal
+# The overall average (slot 0) and subject averages (slot + 1) are cached; a new student's are filled in
+# from the totals gathered while its marks are packed, and ones dropped later are worked out again on the next call
+# Anything that changes a student's scores must call invalidate() (set_scores does this)
 class Student:
-    def __init__(self, math=None, phy=None, chem=None, bio=None, cs=None):
-        self.math = math or []
-        self.phy = phy or []
-        self.chem = chem or []
-        self.bio = bio or []
-        self.cs = cs or []
-
-    # Calculate average for each subject, ignoring None values
+    __slots__ = ("_marks", "_offsets", "_averages")
+
+    def __init__(self, **subject_scores):
+        slots = SUBJECT_SLOTS
+        by_slot = {slots[subject] if subject in slots else subject_slot(subject): scores for subject, scores in subject_scores.items()}
+        try:
+            self._pack(by_slot)
+        except TypeError:
+            # Percentages rather than parsed marks
+            self._pack({slot: [None if score is None else as_mark(score) for score in scores] for slot, scores in by_slot.items()})
+
+    # Pack every subject's marks in slot order, filling in the averages from the exact totals pack_marks returns
+    def _pack(self, by_slot):
+        flat = []
+        offsets = [0]
+        ratios = []
+        averages = [0]
+        for slot in range(max(by_slot, default=-1) + 1):
+            scores = by_slot.get(slot)
+            ratio = pack_marks(scores, flat) if scores else None
+            ratios.append(ratio)
+            averages.append(ratio[0] / ratio[1] if ratio else 0)
+            offsets.append(len(flat) // 2)
+        averages[0] = mean_of_ratios(ratios)
+        self._marks = array("i", flat)
+        self._offsets = array("I", offsets)
+        self._averages = array("d", averages)
+
+    # The start and end of a subject's marks, or None if the student has none stored for it
+    def _bounds(self, subject):
+        slot = SUBJECT_SLOTS.get(subject, len(self._offsets))
+        if slot + 1 >= len(self._offsets):
+            return None
+        return self._offsets[slot], self._offsets[slot + 1]
+
+    # Return one subject's marks as (obtained, max) pairs, with None for missing tests
+    def marks(self, subject):
+        bounds = self._bounds(subject)
+        if bounds is None:
+            return []
+        start, end = bounds
+        return [(obtained, maximum) if maximum else None
+                for obtained, maximum in zip(self._marks[2 * start:2 * end:2], self._marks[2 * start + 1:2 * end:2])]
+
+    # Return one subject's scores as percentages for display, with NaN for missing tests
+    def scores(self, subject):
+        return array("d", [nan if mark is None else percentage(mark) for mark in self.marks(subject)])
+
+    # Replace the scores of one subject and drop the averages that depend on them
+    def set_scores(self, subject, scores):
+        slot = subject_slot(subject)
+        while slot + 1 >= len(self._offsets):
+            self._offsets.append(self._offsets[-1])
+            self._averages.append(nan)
+        start, end = self._offsets[slot], self._offsets[slot + 1]
+        marks = mark_array(scores)
+        self._marks[2 * start:2 * end] = marks
+        shift = len(marks) // 2 - (end - start)
+        for i in range(slot + 1, len(self._offsets)):
+            self._offsets[i] += shift
+        self.invalidate(subject)
+
+    # Drop the cached average of a subject (or of every subject) and the overall average
+    def invalidate(self, subject=None):
+        if subject is None:
+            self._averages = array("d", [nan] * len(self._offsets))
+            return
+        slot = SUBJECT_SLOTS.get(subject, len(self._offsets))
+        if slot + 1 < len(self._offsets):
+            self._averages[slot + 1] = nan
+        self._averages[0] = nan
+
+    # The exact average of a subject slot as a (numerator, denominator) pair, or None without valid scores
+    def _ratio(self, slot):
+        start, end = self._offsets[slot], self._offsets[slot + 1]
+        marks = iter(self._marks[2 * start:2 * end])
+        return marks_ratio(zip(marks, marks))
+
+    # Return the cached average for a subject slot, computing it on a cache miss
+    def _cached_average(self, slot):
+        avg = self._averages[slot + 1]
+        if avg != avg:
+            ratio = self._ratio(slot)
+            avg = self._averages[slot + 1] = ratio[0] / ratio[1] if ratio else 0
+        return avg
+
+    # Average of one subject, ignoring missing values, or the overall average if no subject is given
+    # The overall average only includes subjects with positive averages (a 0 average is assumed to be for a student of the subject with no entered scores)
     # Returns 0 if no valid scores exist
+    def average(self, subject=None):
+        if subject is not None:
+            slot = SUBJECT_SLOTS.get(subject, len(self._offsets))
+            return self._cached_average(slot) if slot + 1 < len(self._offsets) else 0
+        if self._averages[0] == self._averages[0]:
+            return self._averages[0]
+        ratios = [self._ratio(slot) for slot in range(len(self._offsets) - 1)]
+        for slot, ratio in enumerate(ratios):
+            self._averages[slot + 1] = ratio[0] / ratio[1] if ratio else 0
+        self._averages[0] = mean_of_ratios(ratios)
+        return self._averages[0]
+
+# Position of each subject inside every Student's offsets, assigned the first time a subject name is seen
+# Slots are only an internal layout detail; the subjects a school teaches come from the users.csv header
+SUBJECT_SLOTS = {}
+
+# Return a subject's slot, registering the subject if it is new
+def subject_slot(subject):
+    slot = SUBJECT_SLOTS.get(subject)
+    if slot is None:
+        slot = SUBJECT_SLOTS[subject] = len(SUBJECT_SLOTS)
+    return slot
+
+# Turn a score into an (obtained, max) mark: marks pass through, and a percentage becomes a mark out of 100
+# Percentages are read as the nearest fraction with a denominator up to a million, so 85.00000000000001 is 85/100
+def as_mark(score):
+    if type(score) is tuple:
+        return score
+    ratio = Fraction(score).limit_denominator(1_000_000)
+    return ratio.numerator, ratio.denominator * 100
+
+# The packed form of a missing test
+NO_MARK = (0, 0)
+
+# Pack a list of scores into one compact array of obtained and max pairs, with (0, 0) for missing tests
+# Parsed marks are packed as they are; a list holding percentages fails to unpack and is converted first
+def mark_array(scores):
+    try:
+        return array("i", chain.from_iterable([NO_MARK if score is None else score for score in scores]))
+    except TypeError:
+        return array("i", chain.from_iterable([NO_MARK if score is None else as_mark(score) for score in scores]))
+
+# The percentage a mark stands for, for display
+def percentage(mark):
+    return (mark[0] / mark[1]) * 100
+
+# Convert a list of marks into percentages for display, keeping None for missing tests
+def percentages(marks):
+    return [None if mark is None else (mark[0] / mark[1]) * 100 for mark in marks]
+
+# Append marks (None for a missing test) to a flat list of obtained and max integers, and return their exact
+# average percentage as a (numerator, denominator) pair of integers, or None when no test counts
+# Missing tests (None or max 0) and zero scores are not counted; a percentage instead of a mark raises TypeError
+# The per-test mean, 100/n * sum(obtained/max), is kept over the least common multiple of the max marks seen so far,
+# and the weighted mode (pack_weighted_marks) is 100 * total obtained / total max
+def pack_marks(marks, flat):
+    if AVERAGE_MODE == "weighted":
+        return pack_weighted_marks(marks, flat)
+    total = count = 0
+    common = 1
+    for mark in marks:
+        if mark is None:
+            flat += NO_MARK
+            continue
+        flat += mark
+        obtained, maximum = mark
+        if obtained and maximum:
+            if common % maximum:
+                scale = lcm(common, maximum)
+                total *= scale // common
+                common = scale
+            total += obtained * (common // maximum)
+            count += 1
+    return (100 * total, count * common) if count else None
+
+# pack_marks for the weighted mode, which only needs the obtained and max totals
+def pack_weighted_marks(marks, flat):
+    obtained_total = maximum_total = 0
+    for mark in marks:
+        if mark is None:
+            flat += NO_MARK
+            continue
+        flat += mark
+        obtained, maximum = mark
+        if obtained and maximum:
+            obtained_total += obtained
+            maximum_total += maximum
+    return (100 * obtained_total, maximum_total) if obtained_total else None
+
+# Exact average percentage of (obtained, max) pairs, as pack_marks works it out
+def marks_ratio(pairs):
+    return pack_marks(pairs, [])
+
+# Exact mean of the positive averages among (numerator, denominator) pairs (None for none), rounded to a float once
+# The few subject averages are summed by cross-multiplying, which needs no common multiple; int division rounds exactly
+# Returns 0 if there are none
+def mean_of_ratios(ratios):
+    total = count = 0
+    common = 1
+    for ratio in ratios:
+        if ratio and ratio[0] > 0:
+            numerator, denominator = ratio
+            total = total * denominator + numerator * common
+            common *= denominator
+            count += 1
+    return total / (count * common) if count else 0
+
+# Average of a list of marks (None for missing tests), skipping missing and zero entries, computed exactly
+# Returns 0 if no valid scores exist
+def scores_average(marks):
+    ratio = marks_ratio(mark for mark in marks if mark)
+    return ratio[0] / ratio[1] if ratio else 0
+
+# Format a single percentage score for display, showing N/A for missing tests
+def format_score(score):
+    if score and score == score:
+        return f"{score:.2f}%"
+    return "N/A"
+
+# Score tables are drawn in the same grid layout as tabulate's "grid" format:
+# every cell is left-aligned and padded by one space, and each column is as wide as its widest cell,
+# or its header plus two spaces; rows with fewer tests are padded with blank cells
+# entries are (label, scores, average) tuples; label_header names the first column
+
+# Find the width of every column in one pass over the entries, without formatting the cells
+# Scores and averages are all shown as "{:.2f}%", whose length only grows with the value,
+# so it is enough to keep the largest value shown in each column (or None if it only shows N/A or blanks)
+def score_table_widths(label_header, entries):
+    label_width = len(label_header) + 2
+    largest = [None]
+    not_available = [False]
+    for label, scores, average in entries:
+        if label is not None:
+            label_width = max(label_width, len(str(label).strip()))
+        cells = len(scores) + 1
+        if cells > len(largest):
+            largest.extend([None] * (cells - len(largest)))
+            not_available.extend([False] * (cells - len(not_available)))
+        for column, value in enumerate([*scores, average]):
+            if column < len(scores) and not (value and value == value):
+                not_available[column] = True
+            elif largest[column] is None or value > largest[column]:
+                largest[column] = value
+    headers = [f"Test {i+1}" for i in range(len(largest) - 1)] + ["Average"]
+    widths = [label_width]
+    for header, value, na in zip(headers, largest, not_available):
+        cell_width = len(f"{value:.2f}%") if value is not None else 3 if na else 0
+        widths.append(max(len(header) + 2, cell_width))
+    return [label_header, *headers], widths
+
+# Yield a score table piece by piece: the header block first, then each row with the border under it
+# Joining the pieces with newlines gives the whole table
+def iter_score_table(label_header, entries):
+    headers, widths = score_table_widths(label_header, entries)
+    border = "+" + "+".join("-" * (width + 2) for width in widths) + "+"
+    line = lambda cells: "| " + " | ".join(cell.ljust(width) for cell, width in zip(cells, widths)) + " |"
+    yield "\n".join([border, line(headers), border.replace("-", "=")])
+    if not entries:
+        yield border
+    blanks = [""] * len(widths)
+    for label, scores, average in entries:
+        cells = ["" if label is None else str(label).strip(), *[format_score(score) for score in scores], f"{average:.2f}%"]
+        yield line(cells + blanks[len(cells):]) + "\n" + border
 
-    def math_average(self):
-        valid_scores = [score for score in self.math if score]
-        return sum(valid_scores) / len(valid_scores) if valid_scores else 0
-
-    def phy_average(self):
-        valid_scores = [score for score in self.phy if score]
-        return sum(valid_scores) / len(valid_scores) if valid_scores else 0
-
-    def chem_average(self):
-        valid_scores = [score for score in self.chem if score]
-        return sum(valid_scores) / len(valid_scores) if valid_scores else 0
-
-    def bio_average(self):
-        valid_scores = [score for score in self.bio if score]
-        return sum(valid_scores) / len(valid_scores) if valid_scores else 0
-
-    def cs_average(self):
-        valid_scores = [score for score in self.cs if score]
-        return sum(valid_scores) / len(valid_scores) if valid_scores else 0
-
-    # Calculate overall average across all subjects
-    # Only includes subjects with positive averages (a 0 average is assumed to be for a student of the subject with no entered scores)
-    # Returns 0 if no subjects have valid averages
-    def average(self):
-        subject_averages = [
-            self.math_average(),
-            self.phy_average(),
-            self.chem_average(),
-            self.bio_average(),
-            self.cs_average()
-        ]
-        valid_averages = [avg for avg in subject_averages if avg > 0]
-        return sum(valid_averages) / len(valid_averages) if valid_averages else 0
+# Render a whole score table as one string
+def scores_table(label_header, entries):
+    return "\n".join(iter_score_table(label_header, entries))
+
+# Number of students shown per page of a score table in the interactive menus
+TABLE_PAGE_ROWS = 25
+
+# Write a score table to standard output as it is rendered
+# With page_rows, the reader is asked before each further page and can stop early with q
+@instrumented
+def print_score_table(label_header, entries, page_rows=None):
+    for row, piece in enumerate(iter_score_table(label_header, entries)):
+        if page_rows and row > 1 and (row - 1) % page_rows == 0:
+            if input("Press Enter for more, or q to stop: ").strip().lower() == "q":
+                return
+        sys.stdout.write(piece + "\n")
 
 # Load password data from CSV file into a list of dictionaries
 # Each dictionary contains 'name', 'email', and 'password' keys
@@ -60,99 +431,1315 @@ def load_passwords():
             passwords.append(row)
     return passwords
 
-# Load user data from CSV file into a list of dictionaries
-# Each dictionary contains user information including GRN, name, and subject enrollments
-def load_users_data():
-    users_data = []
-    with open("users.csv") as file:
+# Build a dictionary mapping each email to its password row for O(1) username lookups
+def load_credentials(passwords):
+    return {row["email"]: row for row in passwords}
+
+# Stored passwords use the format pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>
+PBKDF2_ITERATIONS = 600_000
+
+# New accounts get the default password the admin hands out, hashed separately for each account with its own salt
+# The password itself is printed and documented, so stretching it protects nothing and it gets fewer iterations;
+# the full count is for passwords people choose
+DEFAULT_PASSWORD = "password123"
+DEFAULT_PASSWORD_ITERATIONS = 10_000
+
+# Hash a password with PBKDF2-HMAC-SHA256 and a random salt
+def hash_password(password, iterations=PBKDF2_ITERATIONS, salt=None):
+    salt = salt or os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return f"pbkdf2_sha256${iterations}${salt.hex()}${digest.hex()}"
+
+# Check a password against a stored hash in constant time
+# Rows that have not been migrated yet still hold the plain password and are compared directly
+def verify_password(password, stored):
+    if not stored.startswith("pbkdf2_sha256$"):
+        return hmac.compare_digest(password.encode(), stored.encode())
+    _, iterations, salt, digest = stored.split("$")
+    candidate = hashlib.pbkdf2_hmac("sha256", password.encode(), bytes.fromhex(salt), int(iterations))
+    return hmac.compare_digest(candidate.hex(), digest)
+
+# One-time migration that replaces every plain password in the file with its hash
+# Already hashed rows are kept as they are, and the file is replaced in a single rename
+def migrate_passwords(filename="passwords.csv"):
+    with data_lock():
+        recover_journal()
+        with open(filename) as file:
+            reader = csv.DictReader(file)
+            fieldnames = reader.fieldnames
+            rows = list(reader)
+        migrated = 0
+        for row in rows:
+            if not row["password"].startswith("pbkdf2_sha256$"):
+                row["password"] = hash_password(row["password"])
+                migrated += 1
+        with open(f"{filename}.tmp", "w", newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(f"{filename}.tmp", filename)
+    return migrated
+
+# Writes to the data files are serialized across processes with an advisory lock on LOCK_FILE,
+# and every multi-file write goes through a journal so a crash never leaves the files half updated
+LOCK_FILE = ".sms.lock"
+JOURNAL_FILE = ".sms.journal"
+
+# Hold the exclusive data lock for the duration of a with block
+@contextmanager
+def data_lock():
+    with open(LOCK_FILE, "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+# Format rows as CSV text, with the same line endings csv.writer uses when appending to a file
+def csv_text(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+# Append text to several files as one all-or-nothing write; must be called with the data lock held
+# The planned appends and each file's current size are saved to the journal and renamed into place
+# (the commit point) before any data file is touched, then the journal is replayed and removed
+def journaled_append(appends):
+    journaled_write([{"file": filename, "size": os.path.getsize(filename), "data": text} for filename, text in appends.items()])
+
+# Commit journal entries and apply them; must be called with the data lock held
+def journaled_write(entries):
+    with open(f"{JOURNAL_FILE}.tmp", "w") as file:
+        json.dump(entries, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(f"{JOURNAL_FILE}.tmp", JOURNAL_FILE)
+    replay_journal(entries)
+    os.remove(JOURNAL_FILE)
+
+# Apply journal entries, each of which is safe to replay twice:
+# an append ({"file", "size", "data"}) cuts the file back to its recorded size first,
+# a rewrite ({"file", "data"}) writes a temporary file and renames it into place,
+# and a directory move ({"move", "to"}) is skipped once the directory is no longer where it was
+def replay_journal(entries):
+    for entry in entries:
+        if "move" in entry:
+            if os.path.exists(entry["move"]):
+                os.rename(entry["move"], entry["to"])
+        elif "size" not in entry:
+            with open(f"{entry['file']}.tmp", "w", newline='') as file:
+                file.write(entry["data"])
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(f"{entry['file']}.tmp", entry["file"])
+        else:
+            with open(entry["file"], "r+b") as file:
+                file.truncate(entry["size"])
+                file.seek(entry["size"])
+                file.write(entry["data"].encode())
+                file.flush()
+                os.fsync(file.fileno())
+
+# Finish a committed write that was interrupted by a crash, or discard one that never committed
+# Must be called with the data lock held; returns True if a write had to be finished
+def recover_journal():
+    if os.path.exists(f"{JOURNAL_FILE}.tmp"):
+        os.remove(f"{JOURNAL_FILE}.tmp")
+    if not os.path.exists(JOURNAL_FILE):
+        return False
+    with open(JOURNAL_FILE) as file:
+        replay_journal(json.load(file))
+    os.remove(JOURNAL_FILE)
+    return True
+
+# What a data file looked like the last time this process read or wrote it: its size, modification time and inode,
+# and the last FILE_TAIL_WINDOW bytes read, so the watcher can tell an append from an edit without reading the whole file
+# An edit is a file that was replaced, got shorter, kept its size but changed, or changed inside that last window;
+# an edit further back that also makes the file longer is the one change taken for an append
+FILE_TAIL_WINDOW = 4096
+
+class FileState:
+    __slots__ = ("size", "mtime_ns", "inode", "tail")
+
+    def __init__(self, filename):
+        stat = os.stat(filename)
+        with open(filename, "rb") as file:
+            self._take(file, stat)
+
+    # True if the file is exactly as it was last seen
+    def current(self, filename):
+        stat = os.stat(filename)
+        return (stat.st_size, stat.st_mtime_ns) == (self.size, self.mtime_ns)
+
+    # Take the file as read up to its last complete line, remembering the window of bytes before that point
+    def _take(self, file, stat):
+        start = max(stat.st_size - FILE_TAIL_WINDOW, 0)
+        file.seek(start)
+        window = file.read(stat.st_size - start)
+        end = window.rfind(b"\n") + 1
+        self.size = start + end
+        self.tail = window[:end]
+        self.mtime_ns = stat.st_mtime_ns
+        self.inode = stat.st_ino
+
+    # Check the file for changes; returns "unchanged", "appended" with the new complete lines, or "edited"
+    # Only the window before the part already read and the new bytes after it are read
+    # A partly written last line is left for the next poll; after an edit the file is taken as read up to its last complete line
+    def poll(self, filename):
+        stat = os.stat(filename)
+        if (stat.st_size, stat.st_mtime_ns) == (self.size, self.mtime_ns):
+            return "unchanged", ""
+        with open(filename, "rb") as file:
+            if stat.st_ino == self.inode and stat.st_size > self.size:
+                file.seek(self.size - len(self.tail))
+                if file.read(len(self.tail)) == self.tail:
+                    tail = file.read(stat.st_size - self.size)
+                    tail = tail[:tail.rfind(b"\n") + 1]
+                    self.tail = (self.tail + tail)[-FILE_TAIL_WINDOW:]
+                    self.size += len(tail)
+                    self.mtime_ns = stat.st_mtime_ns
+                    return ("appended", tail.decode()) if tail else ("unchanged", "")
+            self._take(file, stat)
+            return "edited", ""
+
+    # Take text this process just appended as read
+    def extend(self, filename, text):
+        data = text.encode()
+        self.tail = (self.tail + data)[-FILE_TAIL_WINDOW:]
+        self.size += len(data)
+        self.mtime_ns = os.stat(filename).st_mtime_ns
+
+# Columns of users.csv that are not subject enrollment flags; every other column names a subject
+USER_COLUMNS = ("grn", "name")
+
+# The subjects a users.csv row has enrollment flags for, in column order
+def row_subjects(row):
+    return [key for key in row if key not in USER_COLUMNS]
+
+# Rows of users.csv in file order, plus dictionary indexes so lookups do not scan every row
+# subjects lists the subject columns (taken from the first row when not given),
+# by_grn maps a student's GRN to their row, by_name maps a name to the first row with that name,
+# by_subject maps each subject to the rows of the students enrolled in it,
+# max_grn is the largest student GRN seen so far, and offset is how much of users.csv had been written when it was loaded
+# Iterating over it yields the rows, so it can be used wherever a list of user rows is expected
+class UserDirectory:
+    def __init__(self, rows=(), subjects=None):
+        self.rows = []
+        self.by_grn = {}
+        self.by_name = {}
+        self.subjects = list(subjects) if subjects is not None else None
+        self.by_subject = {sub: [] for sub in self.subjects or []}
+        self.max_grn = 0
+        self.offset = 0
+        for row in rows:
+            self.add(row)
+
+    # Swap in a new set of rows in place, so everything holding this directory sees them
+    def replace(self, rows, offset):
+        self.__init__(rows, self.subjects)
+        self.offset = offset
+
+    # Add a row and update every index
+    def add(self, row):
+        if self.subjects is None:
+            self.subjects = row_subjects(row)
+            self.by_subject = {sub: [] for sub in self.subjects}
+        self.rows.append(row)
+        self.by_name.setdefault(row["name"], row)
+        if row["grn"]:
+            self.by_grn[row["grn"]] = row
+            self.max_grn = max(self.max_grn, int(row["grn"]))
+            for sub, enrolled in self.by_subject.items():
+                if row.get(sub) == "1":
+                    enrolled.append(row)
+
+    # Raise max_grn to cover rows other processes appended to users.csv since it was loaded
+    # Only the new tail of the file is read; must be called with the data lock held
+    def refresh_max_grn(self, filename="users.csv"):
+        with open(filename, "rb") as file:
+            file.seek(self.offset)
+            tail = file.read()
+        self.offset += len(tail)
+        for row in csv.reader(tail.decode().splitlines()):
+            if row and row[0].isdigit():
+                self.max_grn = max(self.max_grn, int(row[0]))
+        return self.max_grn
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+# Load user data from CSV file into a UserDirectory
+# Each row is a dictionary containing user information including GRN, name, and subject enrollments
+# The subjects are discovered from the header: every column after grn and name is a subject with its own <subject>.csv
+def load_users_data(filename="users.csv"):
+    with open(filename) as file:
+        offset = os.fstat(file.fileno()).st_size
         reader = csv.DictReader(file)
-        for row in reader:
-            users_data.append(row)
+        users_data = UserDirectory(reader, row_subjects(reader.fieldnames or []))
+    users_data.offset = offset
     return users_data
 
-# Load subject data from CSV file and convert test scores to percentages
-# Returns a dictionary mapping GRN to list of percentage scores for each test
+# Parsed marks by cell text; a class has only a few distinct marks, so every "17/20" shares one tuple
+_marks = {}
+
+# Convert one "obtained/max" cell into an exact (obtained, max) mark, or None for a blank cell
+def parse_mark(cell):
+    if not cell:
+        return None
+    mark = _marks.get(cell)
+    if mark is None:
+        a, b = map(int, cell.split("/"))
+        mark = _marks[cell] = (a, b)
+    return mark
+
+# Check a score typed in by a teacher and return it as an "obtained/max" cell
+# Both parts must be whole numbers, with max above 0 and obtained between 0 and max; raises ValueError otherwise
+def parse_marks(text):
+    obtained, maximum = map(int, text.replace(" ", "").split("/"))
+    if maximum <= 0 or not 0 <= obtained <= maximum:
+        raise ValueError(f"invalid score: {text}")
+    return f"{obtained}/{maximum}"
+
+# Raise ValueError if marks (GRN -> {test index: cell}) name a test outside a subject's tests
+def check_tests(marks, tests):
+    for entered in marks.values():
+        for test in entered:
+            if not 0 <= test < tests:
+                raise ValueError(f"no test{test + 1} in a subject with {tests} tests")
+
+# Stream a subject file as (grn, scores) tuples, one row at a time
+# Uses a plain csv.reader with the column layout worked out once from the header,
+# so no dictionary is built per row; short rows are padded with None like csv.DictReader does
+def iter_subject(filename):
+    with open(filename, newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header:
+            yield from subject_rows(header, reader)
+
+# Parse rows of a subject file laid out as its header says into (grn, scores) tuples
+def subject_rows(header, rows):
+    grn_column = header.index("grn")
+    test_columns = range(1, len(header))
+    for row in rows:
+        if not row:
+            continue
+        yield row[grn_column], [parse_mark(row[i]) if i < len(row) else None for i in test_columns]
+
+# Load subject data from CSV file, keeping each test score as an exact (obtained, max) mark
+# Returns a dictionary mapping GRN to list of marks for each test
 # Missing scores are stored as None values
+# A later row for a GRN that already has one is a score patch (appended by record_scores):
+# its non-blank cells replace the earlier scores
+@instrumented
 def load_subject(filename):
     data = {}
-    with open(filename) as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            marks = []
-            for test in reader.fieldnames[1:]:
-                if row[test]:
-                    a, b = map(int, row[test].split("/"))
-                    marks.append((a / b) * 100)
+    for grn, scores in iter_subject(filename):
+        if grn in data:
+            merge_scores(data[grn], scores)
+        else:
+            data[grn] = scores
+    return data
+
+# Apply a patch row to a student's scores in place, keeping the scores the patch leaves blank
+def merge_scores(scores, patch):
+    for test, score in enumerate(patch):
+        if score is not None:
+            scores[test] = score
+
+# Compute every student's average in a subject file without keeping their scores
+# Each row is averaged exactly as it streams past, like scores_average, and only the average is kept per GRN
+# GRNs with patch rows are re-read in a second pass that keeps only their rows, merged like load_subject
+def stream_subject_averages(filename):
+    totals = {}
+    patched = set()
+    for grn, scores in iter_subject(filename):
+        if grn in totals:
+            patched.add(grn)
+            continue
+        totals[grn] = scores_average(scores)
+    if patched:
+        merged = {}
+        for grn, scores in iter_subject(filename):
+            if grn in patched:
+                if grn in merged:
+                    merge_scores(merged[grn], scores)
                 else:
-                    marks.append(None)
-            data[row["grn"]] = marks
+                    merged[grn] = scores
+        for grn, scores in merged.items():
+            totals[grn] = scores_average(scores)
+    return totals
+
+# Binary sidecar written next to each subject CSV (e.g. math.csv.cache) so later runs can skip parsing
+# Layout: a header with the CSV's mtime and size, the row and test counts and the length of the GRN block,
+# then the GRNs joined by newlines (padded to 8 bytes), then rows x tests pairs of little-endian 32-bit
+# obtained and max marks, with (0, 0) for blanks
+SUBJECT_CACHE_HEADER = struct.Struct("<4sIqqIIQ")
+SUBJECT_CACHE_MAGIC = b"SMSC"
+SUBJECT_CACHE_VERSION = 2
+
+# Write the parsed subject data to its sidecar, recording the CSV's mtime and size at parse time
+# The sidecar is written to a temporary file first and renamed, so a reader never sees half of it
+def write_subject_cache(filename, data, stat):
+    grns = "\n".join(data).encode()
+    tests = len(next(iter(data.values()), []))
+    marks = mark_array([mark for row in data.values() for mark in row])
+    header = SUBJECT_CACHE_HEADER.pack(SUBJECT_CACHE_MAGIC, SUBJECT_CACHE_VERSION, stat.st_mtime_ns, stat.st_size, len(data), tests, len(grns))
+    padding = b"\0" * (-len(grns) % 8)
+    with open(f"{filename}.cache.tmp", "wb") as file:
+        file.write(header + grns + padding)
+        marks.tofile(file)
+    os.replace(f"{filename}.cache.tmp", f"{filename}.cache")
+
+# Memory-map a subject's sidecar and rebuild the GRN -> scores dictionary from it
+# Returns None when there is no sidecar, it is damaged, or the CSV's mtime or size has changed since it was written
+def read_subject_cache(filename, stat):
+    try:
+        with open(f"{filename}.cache", "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            magic, version, mtime, size, rows, tests, grns_length = SUBJECT_CACHE_HEADER.unpack_from(mapped)
+            if (magic, version, mtime, size) != (SUBJECT_CACHE_MAGIC, SUBJECT_CACHE_VERSION, stat.st_mtime_ns, stat.st_size):
+                return None
+            start = SUBJECT_CACHE_HEADER.size + grns_length + (-grns_length % 8)
+            grns = mapped[SUBJECT_CACHE_HEADER.size:SUBJECT_CACHE_HEADER.size + grns_length].decode().split("\n") if rows else []
+            cells = rows * tests
+            with memoryview(mapped)[start:start + cells * 8] as view:
+                marks = view.cast("i").tolist()
+    except (OSError, ValueError, struct.error):
+        return None
+    if len(grns) != rows or len(marks) != cells * 2:
+        return None
+    interned = {}
+    pairs = [interned.setdefault(mark, mark) if mark[1] else None for mark in zip(marks[0::2], marks[1::2])]
+    return {grn: pairs[row * tests:(row + 1) * tests] for row, grn in enumerate(grns)}
+
+# Pause the cyclic garbage collector while building large numbers of lists that can never form cycles
+# Without this, collections triggered by the allocations rescan the whole heap over and over
+@contextmanager
+def gc_paused():
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+# Load a subject from its binary sidecar when it is up to date, otherwise parse the CSV and refresh the sidecar
+# Returns the same GRN -> scores dictionary as load_subject
+@instrumented
+def load_subject_cached(filename):
+    stat = os.stat(filename)
+    with gc_paused():
+        data = read_subject_cache(filename, stat)
+        if data is None:
+            data = load_subject(filename)
+            try:
+                write_subject_cache(filename, data, stat)
+            except OSError:
+                pass
     return data
 
-# Load all subject data files and return them as separate dictionaries
-# Each dictionary contains GRN to test score mappings for that subject
-def load_all_subjects():
-    math_data = load_subject("math.csv")
-    phy_data = load_subject("phy.csv")
-    chem_data = load_subject("chem.csv")
-    bio_data = load_subject("bio.csv")
-    cs_data = load_subject("cs.csv")
-    return math_data, phy_data, chem_data, bio_data, cs_data
+# Load the data file of every given subject
+# Returns a dictionary mapping each subject to its GRN to test score mappings
+# Uses each subject's binary sidecar when it is up to date
+def load_all_subjects(subjects):
+    return {sub: load_subject_cached(f"{sub}.csv") for sub in subjects}
 
 # Create Student objects for all users who have GRNs
+# subject_data maps each subject to its GRN to test score mappings
 # Returns a dictionary mapping GRN to Student objects
-# Each Student object contains test scores for enrolled subjects
-def load_students(math_data, phy_data, chem_data, bio_data, cs_data, users_data):
+# Each Student object contains test scores for every subject the student has a row in
+@instrumented
+def load_students(subject_data, users_data):
     students = {}
     for row in users_data:
-        if row["grn"]:
-            students[row["grn"]] = Student(
-                math_data.get(row["grn"], []),
-                phy_data.get(row["grn"], []),
-                chem_data.get(row["grn"], []),
-                bio_data.get(row["grn"], []),
-                cs_data.get(row["grn"], [])
-            )
+        grn = row["grn"]
+        if grn:
+            students[grn] = Student(**{sub: data[grn] for sub, data in subject_data.items() if grn in data})
     return students
 
+# Storage backends behind the loaders and the account-creation writes
+# CSVStorage reads and writes the CSV files in the working directory (the default)
+# SQLiteStorage keeps the same data in indexed SQLite tables and is used when SMS_DATABASE names a database file
+# Every file CSVStorage loads is watched: its FileState is taken just before it is read,
+# poll_changes reports the files that changed since, and this process's own appends are taken as read
+class CSVStorage:
+    def __init__(self):
+        self.watched = {}
+
+    def load_passwords(self):
+        self.watched["passwords.csv"] = FileState("passwords.csv")
+        return load_passwords()
+
+    def load_users_data(self):
+        self.watched["users.csv"] = FileState("users.csv")
+        return load_users_data()
+
+    def load_subject(self, subject):
+        self.watched[f"{subject}.csv"] = FileState(f"{subject}.csv")
+        return load_subject_cached(f"{subject}.csv")
+
+    # The watched files that changed since they were last read, as filename -> (change, appended text)
+    def poll_changes(self):
+        changes = {}
+        for filename, state in self.watched.items():
+            try:
+                change, text = state.poll(filename)
+            except FileNotFoundError:
+                # An editor saving by renaming a new file into place; the file is read on the next poll
+                continue
+            if change != "unchanged":
+                changes[filename] = (change, text)
+        return changes
+
+    # Make a journaled append; must be called with the data lock held
+    # Watched files that were up to date before the append are kept up to date, so the watcher skips this process's own rows,
+    # while a file someone else changed in the meantime is left for the watcher to read (own rows included) on its next poll
+    def append(self, appends):
+        up_to_date = [filename for filename in appends if filename in self.watched and self.watched[filename].current(filename)]
+        journaled_append(appends)
+        for filename in up_to_date:
+            self.watched[filename].extend(filename, appends[filename])
+
+    # Finish any write a crash interrupted
+    def recover(self):
+        with data_lock():
+            return recover_journal()
+
+    # Assign GRNs to new students and append them to every file as one journaled write under the data lock
+    # new_students are dictionaries with name, email, password and a 1/0 flag per subject
+    # Returns the new users.csv rows, the new passwords.csv rows and the number of tests in each subject written to
+    def add_students(self, users_data, new_students):
+        subjects = users_data.subjects
+        with data_lock():
+            recover_journal()
+            grn = users_data.refresh_max_grn()
+            user_rows = []
+            password_rows = []
+            for student in new_students:
+                grn += 1
+                user_rows.append({"grn": str(grn), "name": student["name"], **{sub: student[sub] for sub in subjects}})
+                password_rows.append({"name": student["name"], "email": student["email"], "password": student["password"]})
+
+            appends = {"users.csv": csv_text([row["grn"], row["name"], *[row[sub] for sub in subjects]] for row in user_rows)}
+            subject_tests = {}
+            for subject in subjects:
+                enrolled = [row["grn"] for row in user_rows if row[subject] == "1"]
+                if enrolled:
+                    with open(f"{subject}.csv", newline='') as file:
+                        tests = len(next(csv.reader(file))) - 1
+                    appends[f"{subject}.csv"] = csv_text([grn, *[""] * tests] for grn in enrolled)
+                    subject_tests[subject] = tests
+            appends["passwords.csv"] = csv_text([row["name"], row["email"], row["password"]] for row in password_rows)
+            self.append(appends)
+            users_data.max_grn = max(users_data.max_grn, grn)
+        return user_rows, password_rows, subject_tests
+
+    # Add an empty test column to a subject file and return the new number of tests
+    # This is the one write that rewrites a file: each student's patch rows are folded into their first row
+    # while it is copied to a temporary file, which is then renamed into place
+    def add_test(self, subject):
+        filename = f"{subject}.csv"
+        with data_lock():
+            recover_journal()
+            up_to_date = filename in self.watched and self.watched[filename].current(filename)
+            with open(filename, newline='') as file:
+                reader = csv.reader(file)
+                header = next(reader)
+                rows = {}
+                for cells in reader:
+                    if not cells:
+                        continue
+                    cells = cells[:len(header)] + [""] * (len(header) - len(cells))
+                    if cells[0] in rows:
+                        first = rows[cells[0]]
+                        for column, cell in enumerate(cells[1:], 1):
+                            if cell:
+                                first[column] = cell
+                    else:
+                        rows[cells[0]] = cells
+            header.append(f"test{len(header)}")
+            with open(f"{filename}.tmp", "w", newline='') as file:
+                csv.writer(file).writerows([header, *[[*cells, ""] for cells in rows.values()]])
+            os.replace(f"{filename}.tmp", filename)
+            if up_to_date:
+                self.watched[filename] = FileState(filename)
+        return len(header) - 1
+
+    # Append the scores a teacher entered to a subject file as one patch row per student, under the data lock
+    # marks maps each GRN to {test index: "obtained/max"}; the tests left out of a patch row are blank,
+    # so the student's earlier scores for them are kept (see load_subject)
+    # Returns the number of tests in the subject
+    def record_scores(self, subject, marks):
+        filename = f"{subject}.csv"
+        with data_lock():
+            recover_journal()
+            with open(filename, newline='') as file:
+                tests = len(next(csv.reader(file))) - 1
+            check_tests(marks, tests)
+            self.append({filename: csv_text([grn, *[entered.get(test, "") for test in range(tests)]] for grn, entered in marks.items())})
+        return tests
+
+    # Copy users.csv and the subject files into the term's directory under TERMS_DIRECTORY, then start the next term:
+    # every subject file is rewritten with the same students and no tests
+    # The copies and the term's summary are first built in a hidden staging directory; moving it into place and
+    # resetting the subject files are then journaled as one write, so a crash leaves the term either closed or still open
+    # Raises FileExistsError if the term has already been closed
+    def close_term(self, term, subjects):
+        directory = os.path.join(TERMS_DIRECTORY, term)
+        staging = os.path.join(TERMS_DIRECTORY, f".{term}.tmp")
+        with data_lock():
+            recover_journal()
+            if os.path.exists(directory):
+                raise FileExistsError(directory)
+            # A staging directory left by a close that crashed before it committed
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(staging)
+            try:
+                for filename in ["users.csv", *[f"{sub}.csv" for sub in subjects]]:
+                    shutil.copy2(filename, os.path.join(staging, filename))
+                load_term_summary(staging)
+                entries = [{"move": staging, "to": directory}]
+                for sub in subjects:
+                    with open(f"{sub}.csv", newline='') as file:
+                        reader = csv.reader(file)
+                        next(reader, None)
+                        grns = dict.fromkeys(cells[0] for cells in reader if cells)
+                    entries.append({"file": f"{sub}.csv", "data": csv_text([["grn"], *[[grn] for grn in grns]])})
+            except BaseException:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            journaled_write(entries)
+        return directory
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, grn TEXT NOT NULL, name TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS users_grn ON users (grn);
+CREATE INDEX IF NOT EXISTS users_name ON users (name);
+CREATE TABLE IF NOT EXISTS enrollments (user_id INTEGER NOT NULL REFERENCES users (id), subject TEXT NOT NULL, PRIMARY KEY (user_id, subject));
+CREATE INDEX IF NOT EXISTS enrollments_subject ON enrollments (subject, user_id);
+CREATE TABLE IF NOT EXISTS passwords (id INTEGER PRIMARY KEY, name TEXT NOT NULL, email TEXT NOT NULL UNIQUE, password TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS subjects (subject TEXT PRIMARY KEY, tests INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS gradebook (subject TEXT NOT NULL, row INTEGER NOT NULL, grn TEXT NOT NULL, PRIMARY KEY (subject, row));
+CREATE INDEX IF NOT EXISTS gradebook_grn ON gradebook (grn, subject);
+CREATE TABLE IF NOT EXISTS scores (subject TEXT NOT NULL, row INTEGER NOT NULL, test INTEGER NOT NULL, obtained INTEGER NOT NULL, max INTEGER NOT NULL, PRIMARY KEY (subject, row, test));
+CREATE TABLE IF NOT EXISTS subject_averages (subject TEXT NOT NULL, grn TEXT NOT NULL, average REAL NOT NULL, PRIMARY KEY (subject, grn));
+CREATE TABLE IF NOT EXISTS overall_averages (grn TEXT PRIMARY KEY, average REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+# Every student's cached overall average and every enrolled student's cached average in each subject (0 when nothing has been entered)
+# The averages are kept in subject_averages and overall_averages by SQLiteStorage.refresh_averages
+SQLITE_AVERAGES = """
+WITH overall AS (
+    SELECT u.id, u.grn, u.name, COALESCE(o.average, 0) AS average
+    FROM users u LEFT JOIN overall_averages o ON o.grn = u.grn WHERE u.grn != ''
+),
+enrolled AS (
+    SELECT e.subject, u.grn, COALESCE(a.average, 0) AS average
+    FROM enrollments e JOIN users u ON u.id = e.user_id AND u.grn != ''
+    LEFT JOIN subject_averages a ON a.subject = e.subject AND a.grn = u.grn
+)
+"""
+
+class SQLiteStorage:
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path, isolation_level=None)
+        self.connection.executescript(SQLITE_SCHEMA)
+        self.average_mode = self.stored_average_mode()
+
+    # The AVERAGE_MODE the cached averages were worked out in, or None if they never were
+    def stored_average_mode(self):
+        row = self.connection.execute("SELECT value FROM settings WHERE key = 'average_mode'").fetchone()
+        return row[0] if row else None
+
+    def load_passwords(self):
+        rows = self.connection.execute("SELECT name, email, password FROM passwords ORDER BY id")
+        return [{"name": name, "email": email, "password": password} for name, email, password in rows]
+
+    def load_users_data(self):
+        enrolled = {}
+        for user_id, subject in self.connection.execute("SELECT user_id, subject FROM enrollments"):
+            enrolled.setdefault(user_id, set()).add(subject)
+        subjects = self.load_subject_names()
+        rows = self.connection.execute("SELECT id, grn, name FROM users ORDER BY id")
+        return UserDirectory(({"grn": grn, "name": name, **{sub: "1" if sub in enrolled.get(user_id, ()) else "0" for sub in subjects}}
+                              for user_id, grn, name in rows), subjects)
+
+    # The subjects in the order they were imported (the users.csv column order)
+    def load_subject_names(self):
+        return [subject for subject, in self.connection.execute("SELECT subject FROM subjects ORDER BY rowid")]
+
+    # Rebuild the GRN -> marks dictionary load_subject returns, optionally for a single student
+    def load_subject(self, subject, grn=None):
+        tests = self.connection.execute("SELECT tests FROM subjects WHERE subject = ?", (subject,)).fetchone()
+        tests = tests[0] if tests else 0
+        where, parameters = ("g.subject = ?", (subject,)) if grn is None else ("g.subject = ? AND g.grn = ?", (subject, grn))
+        rows = {}
+        data = {}
+        for row, row_grn in self.connection.execute(f"SELECT g.row, g.grn FROM gradebook g WHERE {where} ORDER BY g.row", parameters):
+            rows[row] = data[row_grn] = [None] * tests
+        query = f"SELECT s.row, s.test, s.obtained, s.max FROM scores s JOIN gradebook g ON g.subject = s.subject AND g.row = s.row WHERE {where}"
+        for row, test, obtained, maximum in self.connection.execute(query, parameters):
+            rows[row][test] = (obtained, maximum)
+        return data
+
+    # Build one student's Student object from just their own rows
+    def load_student(self, grn):
+        return Student(**{sub: self.load_subject(sub, grn).get(grn, []) for sub in self.load_subject_names()})
+
+    # Nothing to recover: SQLite rolls back unfinished transactions itself
+    def recover(self):
+        return False
+
+    # Work out the cached averages of some students (or of everyone when grns is None) again from their raw marks,
+    # inside the caller's transaction
+    # The averages come from marks_ratio and mean_of_ratios like the Student objects' do, and are stored as the floats
+    # they round to, so students with exactly equal averages store equal values and RANK() ties them;
+    # summing percentages in SQL would round each test separately
+    def refresh_averages(self, cursor, grns=None):
+        query = """SELECT g.grn, g.subject, s.obtained, s.max FROM gradebook g
+                   LEFT JOIN scores s ON s.subject = g.subject AND s.row = g.row"""
+        if grns is None:
+            cursor.execute("DELETE FROM subject_averages")
+            cursor.execute("DELETE FROM overall_averages")
+            batches = [self.connection.execute(query + " ORDER BY g.grn, g.subject")]
+        else:
+            batches = (self.connection.execute(query + " WHERE g.grn = ? ORDER BY g.subject", (grn,)) for grn in grns)
+        for rows in batches:
+            for grn, student_rows in groupby(rows, key=lambda row: row[0]):
+                ratios = {subject: marks_ratio((obtained, maximum) for _, _, obtained, maximum in subject_rows if maximum)
+                          for subject, subject_rows in groupby(student_rows, key=lambda row: row[1])}
+                cursor.executemany("INSERT OR REPLACE INTO subject_averages (subject, grn, average) VALUES (?, ?, ?)",
+                                   [(subject, grn, ratio[0] / ratio[1] if ratio else 0) for subject, ratio in ratios.items()])
+                cursor.execute("INSERT OR REPLACE INTO overall_averages (grn, average) VALUES (?, ?)", (grn, mean_of_ratios(ratios.values())))
+        if grns is None:
+            cursor.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('average_mode', ?)", (AVERAGE_MODE,))
+            self.average_mode = AVERAGE_MODE
+
+    # Work out every cached average again if they were stored for another AVERAGE_MODE (or never stored)
+    def check_averages(self):
+        if self.average_mode == AVERAGE_MODE:
+            return
+        cursor = self.connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            self.average_mode = self.stored_average_mode()
+            if self.average_mode != AVERAGE_MODE:
+                self.refresh_averages(cursor)
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+
+    # Every student's name and overall average (or the best limit students), best first, ties in users order
+    def student_rankings(self, limit=None):
+        self.check_averages()
+        rows = self.connection.execute(SQLITE_AVERAGES + "SELECT name, average FROM overall ORDER BY average DESC, id LIMIT ?",
+                                       (-1 if limit is None else limit,))
+        return [{"name": name, "average": average} for name, average in rows]
+
+    # A student's rank in each enrolled subject and overall, using RANK() window functions over the cached averages
+    # Returns the subject ranks, the overall rank and the number of students ranked overall
+    def student_ranks(self, grn, enrolled_subjects):
+        self.check_averages()
+        query = SQLITE_AVERAGES + """
+            SELECT subject, rank, total FROM (
+                SELECT subject, grn, RANK() OVER (PARTITION BY subject ORDER BY average DESC) AS rank,
+                       COUNT(*) OVER (PARTITION BY subject) AS total
+                FROM enrolled
+            ) WHERE grn = ?"""
+        ranks = {subject: (rank, total) for subject, rank, total in self.connection.execute(query, (grn,))}
+        subject_ranks = [{"subject": sub, "rank": ranks[sub][0], "total_students": ranks[sub][1]} for sub in enrolled_subjects]
+        query = SQLITE_AVERAGES + """
+            SELECT rank, total FROM (
+                SELECT grn, RANK() OVER (ORDER BY average DESC) AS rank, COUNT(*) OVER () AS total FROM overall
+            ) WHERE grn = ?"""
+        overall_rank, total = self.connection.execute(query, (grn,)).fetchone()
+        return subject_ranks, overall_rank, total
+
+    # Assign GRNs and insert the new students in one transaction
+    # BEGIN IMMEDIATE takes the database write lock first, so concurrent admins never share a GRN
+    def add_students(self, users_data, new_students):
+        subjects = users_data.subjects
+        cursor = self.connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            grn = cursor.execute("SELECT COALESCE(MAX(CAST(grn AS INTEGER)), 0) FROM users WHERE grn != ''").fetchone()[0]
+            tests = dict(cursor.execute("SELECT subject, tests FROM subjects"))
+            user_rows = []
+            password_rows = []
+            subject_tests = {}
+            for student in new_students:
+                grn += 1
+                row = {"grn": str(grn), "name": student["name"], **{sub: student[sub] for sub in subjects}}
+                user_id = cursor.execute("INSERT INTO users (grn, name) VALUES (?, ?)", (row["grn"], row["name"])).lastrowid
+                for sub in subjects:
+                    if row[sub] == "1":
+                        cursor.execute("INSERT INTO enrollments (user_id, subject) VALUES (?, ?)", (user_id, sub))
+                        cursor.execute("INSERT INTO gradebook (subject, row, grn) SELECT ?, COALESCE(MAX(row) + 1, 0), ? FROM gradebook WHERE subject = ?", (sub, row["grn"], sub))
+                        subject_tests[sub] = tests.get(sub, 0)
+                cursor.execute("INSERT INTO passwords (name, email, password) VALUES (?, ?, ?)", (student["name"], student["email"], student["password"]))
+                user_rows.append(row)
+                password_rows.append({"name": student["name"], "email": student["email"], "password": student["password"]})
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        users_data.max_grn = max(users_data.max_grn, grn)
+        return user_rows, password_rows, subject_tests
+
+    # Add an empty test to a subject and return the new number of tests
+    def add_test(self, subject):
+        cursor = self.connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("UPDATE subjects SET tests = tests + 1 WHERE subject = ?", (subject,))
+            tests = cursor.execute("SELECT tests FROM subjects WHERE subject = ?", (subject,)).fetchone()[0]
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        return tests
+
+    # Insert or overwrite the scores a teacher entered in one transaction
+    # marks maps each GRN to {test index: "obtained/max"}; a student without a gradebook row in the subject gets one
+    # Returns the number of tests in the subject
+    def record_scores(self, subject, marks):
+        cursor = self.connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            tests = cursor.execute("SELECT tests FROM subjects WHERE subject = ?", (subject,)).fetchone()
+            tests = tests[0] if tests else 0
+            check_tests(marks, tests)
+            for grn, entered in marks.items():
+                query = "SELECT row FROM gradebook WHERE subject = ? AND grn = ? ORDER BY row LIMIT 1"
+                row = cursor.execute(query, (subject, grn)).fetchone()
+                if row is None:
+                    cursor.execute("INSERT INTO gradebook (subject, row, grn) SELECT ?, COALESCE(MAX(row) + 1, 0), ? FROM gradebook WHERE subject = ?", (subject, grn, subject))
+                    row = cursor.execute(query, (subject, grn)).fetchone()
+                cursor.executemany("INSERT OR REPLACE INTO scores (subject, row, test, obtained, max) VALUES (?, ?, ?, ?, ?)",
+                                   [(subject, row[0], test, *map(int, cell.split("/"))) for test, cell in entered.items()])
+            self.refresh_averages(cursor, marks)
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        return tests
+
+# Copy the CSV files in the working directory into a SQLite database, replacing what it held
+def csv_to_sqlite(database):
+    storage = SQLiteStorage(database)
+    cursor = storage.connection.cursor()
+    cursor.execute("BEGIN")
+    for table in ["scores", "gradebook", "subjects", "passwords", "enrollments", "users"]:
+        cursor.execute(f"DELETE FROM {table}")
+    users_data = load_users_data()
+    for row in users_data:
+        user_id = cursor.execute("INSERT INTO users (grn, name) VALUES (?, ?)", (row["grn"], row["name"])).lastrowid
+        cursor.executemany("INSERT INTO enrollments (user_id, subject) VALUES (?, ?)",
+                           [(user_id, sub) for sub in users_data.subjects if row[sub] == "1"])
+    cursor.executemany("INSERT INTO passwords (name, email, password) VALUES (?, ?, ?)",
+                       [(row["name"], row["email"], row["password"]) for row in load_passwords()])
+    for sub in users_data.subjects:
+        with open(f"{sub}.csv", newline='') as file:
+            reader = csv.reader(file)
+            header = next(reader)
+            cursor.execute("INSERT INTO subjects (subject, tests) VALUES (?, ?)", (sub, len(header) - 1))
+            # Patch rows (a repeated GRN) are folded into the student's first gradebook row
+            rows = {}
+            for cells in reader:
+                if not cells:
+                    continue
+                if cells[0] not in rows:
+                    rows[cells[0]] = len(rows)
+                    cursor.execute("INSERT INTO gradebook (subject, row, grn) VALUES (?, ?, ?)", (sub, rows[cells[0]], cells[0]))
+                cursor.executemany("INSERT OR REPLACE INTO scores (subject, row, test, obtained, max) VALUES (?, ?, ?, ?, ?)",
+                                   [(sub, rows[cells[0]], test, *map(int, cell.split("/"))) for test, cell in enumerate(cells[1:len(header)]) if cell])
+    storage.refresh_averages(cursor)
+    cursor.execute("COMMIT")
+
+# Write the contents of a SQLite database back out as CSV files in the working directory
+# Each file is written to a temporary file first and renamed into place
+def sqlite_to_csv(database):
+    storage = SQLiteStorage(database)
+    users_data = storage.load_users_data()
+    files = {
+        "users.csv": [[*USER_COLUMNS, *users_data.subjects]]
+                     + [[row["grn"], row["name"], *[row[sub] for sub in users_data.subjects]] for row in users_data],
+        "passwords.csv": [["name", "email", "password"]] + [[row["name"], row["email"], row["password"]] for row in storage.load_passwords()],
+    }
+    for sub in users_data.subjects:
+        tests = storage.connection.execute("SELECT tests FROM subjects WHERE subject = ?", (sub,)).fetchone()
+        tests = tests[0] if tests else 0
+        rows = {row: [grn] + [""] * tests for row, grn in storage.connection.execute("SELECT row, grn FROM gradebook WHERE subject = ? ORDER BY row", (sub,))}
+        for row, test, obtained, maximum in storage.connection.execute("SELECT row, test, obtained, max FROM scores WHERE subject = ?", (sub,)):
+            rows[row][test + 1] = f"{obtained}/{maximum}"
+        files[f"{sub}.csv"] = [["grn", *[f"test{i + 1}" for i in range(tests)]]] + list(rows.values())
+    for filename, rows in files.items():
+        with open(f"{filename}.tmp", "w", newline='') as file:
+            csv.writer(file).writerows(rows)
+        os.replace(f"{filename}.tmp", filename)
+
+# Averages kept sorted from lowest to highest, with each student's position in users order alongside
+# Equal averages are kept in descending position order, so reading them backwards gives
+# the order calculate_student_rankings uses: best first, ties in users order
+# Place i (0-based, best first) is index len - 1 - i of the sorted entries
+# The entries are split into blocks of at most 2 * BLOCK, each a pair of parallel values and positions lists,
+# with every block's last entry and a Fenwick tree over the block sizes alongside
+# Finding an entry is a binary search over the blocks and one within a block, and counting the entries before it
+# walks the tree, so inserts, removes and rank queries cost O(log N + BLOCK) rather than shifting every entry
+class OrderedAverages:
+    BLOCK = 1000
+
+    def __init__(self, pairs=()):
+        pairs = sorted(pairs, key=lambda pair: (pair[0], -pair[1]))
+        self.size = len(pairs)
+        self._values = [[average for average, position in pairs[i:i + self.BLOCK]] for i in range(0, len(pairs), self.BLOCK)]
+        self._positions = [[position for average, position in pairs[i:i + self.BLOCK]] for i in range(0, len(pairs), self.BLOCK)]
+        self._index_blocks()
+
+    # Rebuild the last entries and the Fenwick tree after blocks were split, dropped or replaced
+    def _index_blocks(self):
+        self._last = [values[-1] for values in self._values]
+        self._maxes = [(values[-1], -positions[-1]) for values, positions in zip(self._values, self._positions)]
+        tree = [0] + [len(values) for values in self._values]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _resize(self, block, delta):
+        i = block + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    # Number of entries in the blocks before this one
+    def _before(self, block):
+        total = 0
+        while block:
+            total += self._tree[block]
+            block -= block & -block
+        return total
+
+    # The block holding the entry at an index, and the entry's index within that block
+    def _locate(self, index):
+        block = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            if block + step < len(self._tree) and self._tree[block + step] <= index:
+                block += step
+                index -= self._tree[block]
+            step >>= 1
+        return block, index
+
+    # Block and index within it of a student's entry, or of where it belongs, found with binary searches
+    def _find(self, average, position):
+        block = min(bisect_left(self._maxes, (average, -position)), len(self._maxes) - 1)
+        values = self._values[block]
+        lo = bisect_left(values, average)
+        hi = bisect_right(values, average, lo)
+        return block, bisect_left(self._positions[block], -position, lo, hi, key=neg)
+
+    def insert(self, average, position):
+        self.size += 1
+        if not self._values:
+            self._values, self._positions = [[average]], [[position]]
+            self._index_blocks()
+            return
+        block, index = self._find(average, position)
+        values, positions = self._values[block], self._positions[block]
+        values.insert(index, average)
+        positions.insert(index, position)
+        if len(values) > 2 * self.BLOCK:
+            self._values[block:block + 1] = [values[:self.BLOCK], values[self.BLOCK:]]
+            self._positions[block:block + 1] = [positions[:self.BLOCK], positions[self.BLOCK:]]
+            self._index_blocks()
+            return
+        self._resize(block, 1)
+        self._last[block] = values[-1]
+        self._maxes[block] = (values[-1], -positions[-1])
+
+    def remove(self, average, position):
+        self.size -= 1
+        block, index = self._find(average, position)
+        values, positions = self._values[block], self._positions[block]
+        del values[index]
+        del positions[index]
+        if not values:
+            del self._values[block]
+            del self._positions[block]
+            self._index_blocks()
+            return
+        self._resize(block, -1)
+        self._last[block] = values[-1]
+        self._maxes[block] = (values[-1], -positions[-1])
+
+    # Move entries to new averages; moves are (old average, new average, position) triples
+    # A few moves are removes and inserts, but once more than 1/16 of the entries move
+    # the entries are re-sorted once instead (O(N log N) for any batch)
+    def move(self, moves):
+        if len(moves) * 16 <= self.size:
+            for old_average, new_average, position in moves:
+                self.remove(old_average, position)
+                self.insert(new_average, position)
+            return
+        moved = {position for _, _, position in moves}
+        pairs = [pair for pair in self if pair[1] not in moved]
+        pairs.extend((new_average, position) for _, new_average, position in moves)
+        self.__init__(pairs)
+
+    def __len__(self):
+        return self.size
+
+    # The (average, position) entries from lowest to highest
+    def __iter__(self):
+        for values, positions in zip(self._values, self._positions):
+            yield from zip(values, positions)
+
+    # Number of averages lower than this one, or lower than or equal to it when inclusive
+    def _count(self, average, inclusive=False):
+        search = bisect_right if inclusive else bisect_left
+        block = search(self._last, average)
+        if block == len(self._last):
+            return self.size
+        return self._before(block) + search(self._values[block], average)
+
+    # 1 + the number of averages strictly higher than this one
+    def rank(self, average):
+        return 1 + self.size - self._count(average, inclusive=True)
+
+    # (average, position) pairs for places start to stop - 1, best first
+    def places(self, start, stop):
+        start, stop = max(start, 0), min(stop, self.size)
+        if start >= stop:
+            return []
+        block, index = self._locate(self.size - 1 - start)
+        places = []
+        while len(places) < stop - start:
+            take = min(index + 1, stop - start - len(places))
+            values, positions = self._values[block], self._positions[block]
+            places.extend(zip(reversed(values[index + 1 - take:index + 1]), reversed(positions[index + 1 - take:index + 1])))
+            block -= 1
+            index = len(self._values[block]) - 1
+        return places
+
+    # Percentile rank of an average: the percentage of averages below it, counting equal ones as half below
+    def percentile(self, average):
+        if not self.size:
+            return 0
+        below = self._count(average)
+        equal = self._count(average, inclusive=True) - below
+        return (below + equal / 2) / self.size * 100
+
+    # The average at an index of the sorted entries
+    def _value(self, index):
+        block, index = self._locate(index)
+        return self._values[block][index]
+
+    # The average at quantile q (0 = lowest, 1 = highest), interpolating linearly between neighbours
+    def quantile(self, q):
+        if not self.size:
+            return 0
+        position = q * (self.size - 1)
+        lower = int(position)
+        upper = min(lower + 1, self.size - 1)
+        return self._value(lower) + (self._value(upper) - self._value(lower)) * (position - lower)
+
+# Order-statistics index over every student's overall and per-subject averages
+# Ranks, top-K lists, rank-range slices, percentiles and quantiles are answered with binary searches
+# and slices of the sorted lists instead of a full scan or sort per query
+# A rank is 1 + the number of students with a strictly higher average
+# Each indexed GRN remembers its users-order position and the averages it was inserted with,
+# so it can be removed or updated later without rebuilding the index
+class RankIndex:
+    @instrumented
+    def __init__(self, users_data, students):
+        self.grns = []
+        self.entries = {}
+        pairs = {None: []}
+        for user in users_data:
+            grn = user["grn"]
+            if grn and grn in students:
+                position = len(self.grns)
+                self.grns.append(grn)
+                overall_avg, subject_avgs = self._averages(students[grn], get_enrolled_subjects(user))
+                self.entries[grn] = (position, overall_avg, subject_avgs)
+                pairs[None].append((overall_avg, position))
+                for sub, avg in subject_avgs.items():
+                    pairs.setdefault(sub, []).append((avg, position))
+        self.overall = OrderedAverages(pairs.pop(None))
+        self.subjects = {sub: OrderedAverages(subject_pairs) for sub, subject_pairs in pairs.items()}
+
+    # A student's overall average and their averages in the given subjects
+    def _averages(self, student, enrolled_subjects):
+        return student.average(), {sub: student.average(sub) for sub in enrolled_subjects}
+
+    # The sorted averages overall, or within a subject if one is given
+    def _ordered(self, subject=None):
+        if subject is None:
+            return self.overall
+        return self.subjects.get(subject) or OrderedAverages()
+
+    # Add a student to the index; a new GRN goes after everyone in users order
+    def add(self, grn, student, enrolled_subjects):
+        if grn in self.entries:
+            position = self.entries[grn][0]
+            self.remove(grn)
+        else:
+            position = len(self.grns)
+            self.grns.append(grn)
+        overall_avg, subject_avgs = self._averages(student, enrolled_subjects)
+        self.entries[grn] = (position, overall_avg, subject_avgs)
+        self.overall.insert(overall_avg, position)
+        for sub, avg in subject_avgs.items():
+            self.subjects.setdefault(sub, OrderedAverages()).insert(avg, position)
+
+    # Remove a student from the index using the averages they were stored with
+    def remove(self, grn):
+        position, overall_avg, subject_avgs = self.entries.pop(grn)
+        self.overall.remove(overall_avg, position)
+        for sub, avg in subject_avgs.items():
+            self.subjects[sub].remove(avg, position)
+
+    # Re-index a student after their scores or enrollments change
+    # Keeps their previous enrollments if none are given
+    def update(self, grn, student, enrolled_subjects=None):
+        if enrolled_subjects is None and grn in self.entries:
+            self.update_many({grn: student})
+            return
+        self.add(grn, student, enrolled_subjects or [])
+
+    # Re-index indexed students after their scores change, keeping their enrollments
+    # changed maps each GRN to its Student; only the sorted lists an average actually changed in are touched,
+    # and each list gets all of its moves in one batch
+    def update_many(self, changed):
+        moves = {}
+        for grn, student in changed.items():
+            position, overall_avg, subject_avgs = self.entries[grn]
+            new_overall, new_subject_avgs = self._averages(student, subject_avgs)
+            self.entries[grn] = (position, new_overall, new_subject_avgs)
+            if new_overall != overall_avg:
+                moves.setdefault(None, []).append((overall_avg, new_overall, position))
+            for sub, avg in new_subject_avgs.items():
+                if avg != subject_avgs[sub]:
+                    moves.setdefault(sub, []).append((subject_avgs[sub], avg, position))
+        for subject, subject_moves in moves.items():
+            (self.overall if subject is None else self.subjects[subject]).move(subject_moves)
+
+    # Rank of an average overall, or within a subject if one is given
+    def rank(self, average, subject=None):
+        return self._ordered(subject).rank(average)
+
+    # Number of indexed students overall, or enrolled in a subject if one is given
+    def total(self, subject=None):
+        return len(self._ordered(subject))
+
+    # The students in places first to last of the ranking (1-based, inclusive), best first, ties in users order
+    # Returns dictionaries with each student's GRN, average and rank (tied students share a rank)
+    def rank_range(self, first, last, subject=None):
+        ordered = self._ordered(subject)
+        return [{"grn": self.grns[position], "average": average, "rank": ordered.rank(average)}
+                for average, position in ordered.places(first - 1, last)]
+
+    # The k best students, best first
+    def top(self, k, subject=None):
+        return self.rank_range(1, k, subject)
+
+    # Percentile rank of an average overall or within a subject
+    def percentile(self, average, subject=None):
+        return self._ordered(subject).percentile(average)
+
+    # The average at quantile q (between 0 and 1) overall or within a subject
+    def quantile(self, q, subject=None):
+        return self._ordered(subject).quantile(q)
+
+# A subject's scores as dense students x tests matrices of obtained and max marks, with max 0 for missing tests
+# grns lists the GRN stored in each row and rows maps a GRN back to its row
+# Each row's exact average is kept as a numerator and a denominator next to its float value
+class ScoreMatrix:
+    def __init__(self, subject_data):
+        self.grns = list(subject_data)
+        self.rows = {grn: row for row, grn in enumerate(self.grns)}
+        tests = max((len(scores) for scores in subject_data.values()), default=0)
+        padded = list(chain.from_iterable(scores if len(scores) == tests else scores + [None] * (tests - len(scores)) for scores in subject_data.values()))
+        marks = np.frombuffer(mark_array(padded), dtype=np.int32).astype(np.int64)
+        marks = marks.reshape(len(self.grns), tests, 2)
+        self.obtained = marks[:, :, 0]
+        self.maximum = marks[:, :, 1]
+        self.numerators, self.denominators = row_ratios(self.obtained, self.maximum)
+        self.averages = ratio_values(self.numerators, self.denominators)
+
+# Least common multiple of some integers, or None once it reaches limit
+def bounded_lcm(values, limit):
+    common = 1
+    for value in values:
+        common = lcm(common, int(value))
+        if common >= limit:
+            return None
+    return common
+
+# Exact average of each row of obtained and max mark matrices as numerator and denominator vectors, like marks_ratio,
+# with 0 / 0 for rows without valid scores
+# The per-test mean puts every row over one common multiple of the max marks; when the sums would not stay below 2**53,
+# where int64 to float64 conversion stops being exact, the rows are worked out one at a time with marks_ratio instead
+def row_ratios(obtained, maximum):
+    valid = (obtained != 0) & (maximum != 0)
+    if AVERAGE_MODE == "weighted":
+        return 100 * np.where(valid, obtained, 0).sum(axis=1), np.where(valid, maximum, 0).sum(axis=1)
+    largest = max(int(obtained.max(initial=0)), 1)
+    common = bounded_lcm(np.unique(maximum[valid]), 2**53 // (100 * max(obtained.shape[1], 1) * largest))
+    if common is not None:
+        scaled = np.where(valid, obtained * (common // np.where(valid, maximum, 1)), 0)
+        return 100 * scaled.sum(axis=1), valid.sum(axis=1) * common
+    ratios = [marks_ratio(zip(row_obtained, row_maximum)) or (0, 0) for row_obtained, row_maximum in zip(obtained.tolist(), maximum.tolist())]
+    return np.array([ratio[0] for ratio in ratios], dtype=object), np.array([ratio[1] for ratio in ratios], dtype=object)
+
+# Float value of each numerator / denominator pair, rounded once, with 0 where the denominator is 0
+def ratio_values(numerators, denominators):
+    if numerators.dtype == object:
+        return np.array([numerator / denominator if denominator else 0 for numerator, denominator in zip(numerators, denominators)], dtype=float)
+    return np.divide(numerators, denominators, out=np.zeros(len(numerators)), where=denominators > 0)
+
+# Exact mean of each student's positive subject averages, like mean_of_ratios
+# ratios holds a (numerators, denominators) pair of vectors per subject; every positive average is put over
+# one common denominator when the totals stay below 2**53, and students are worked out one at a time otherwise
+def overall_ratios(ratios, size):
+    positive = [numerators > 0 for numerators, _ in ratios]
+    counts = sum(positive, np.zeros(size, dtype=np.int64))
+    largest = max((int(ratio_values(numerators, denominators).max(initial=0)) for numerators, denominators in ratios), default=0) + 1
+    exact = all(numerators.dtype != object for numerators, _ in ratios)
+    denominators = np.unique(np.concatenate([denominators[mask] for (_, denominators), mask in zip(ratios, positive)] or [np.zeros(0, dtype=np.int64)])) if exact else []
+    common = bounded_lcm(denominators, 2**53 // (max(len(ratios), 1) * largest)) if exact else None
+    if common is None:
+        return np.array([mean_of_ratios([(int(numerators[i]), int(denominators[i])) for numerators, denominators in ratios]) for i in range(size)], dtype=float)
+    totals = np.zeros(size, dtype=np.int64)
+    for (numerators, denominators), mask in zip(ratios, positive):
+        totals += np.where(mask, numerators * (common // np.where(mask, denominators, 1)), 0)
+    return np.divide(totals, counts * common, out=np.zeros(size), where=counts > 0)
+
+# Vectorized backend holding every student's subject and overall averages as NumPy vectors
+# Vectors follow the order of the students in users_data, like the pure-Python functions do
+# The averages are worked out exactly from the marks, so they are bit-for-bit those of the Student class
+class ScoreEngine:
+    def __init__(self, users_data, matrices):
+        student_rows = [user for user in users_data if user["grn"]]
+        self.grns = [user["grn"] for user in student_rows]
+        self.names = [user["name"] for user in student_rows]
+        self.positions = {grn: position for position, grn in enumerate(self.grns)}
+        self.matrices = matrices
+        self.subject_averages = {}
+        self.enrolled = {}
+        ratios = []
+        for sub, matrix in matrices.items():
+            known = [row for row, grn in enumerate(matrix.grns) if grn in self.positions]
+            positions = [self.positions[matrix.grns[row]] for row in known]
+            numerators = np.zeros(len(self.grns), dtype=matrix.numerators.dtype)
+            denominators = np.zeros(len(self.grns), dtype=matrix.denominators.dtype)
+            numerators[positions] = matrix.numerators[known]
+            denominators[positions] = matrix.denominators[known]
+            ratios.append((numerators, denominators))
+            self.subject_averages[sub] = ratio_values(numerators, denominators)
+            self.enrolled[sub] = np.array([user[sub] == "1" for user in student_rows], dtype=bool)
+        self.overall = overall_ratios(ratios, len(self.grns))
+
+# Build the NumPy backend from the loaded subject dictionaries (subject -> GRN -> scores)
+def load_score_engine(users_data, subject_data):
+    return ScoreEngine(users_data, {sub: ScoreMatrix(data) for sub, data in subject_data.items()})
+
+# Left-to-right sum of a NumPy vector (cumsum is sequential, unlike np.sum's pairwise summation)
+def sequential_sum(values):
+    return float(np.cumsum(values)[-1]) if len(values) else 0
+
 # Calculate ranked list of all students based on their overall averages
 # Returns a list of dictionaries with 'name' and 'average' keys, sorted by average descending
-def calculate_student_rankings(users_data, students):
+# With a limit only the best limit students are returned, picked with a heap instead of sorting everyone
+# Uses a stable argsort of the engine's overall averages when a NumPy engine is given
+@instrumented
+def calculate_student_rankings(users_data, students, engine=None, limit=None):
+    if engine is not None:
+        order = np.argsort(-engine.overall, kind="stable")[:limit]
+        return [{"name": engine.names[i], "average": float(engine.overall[i])} for i in order]
     all_students = []
     for user in users_data:
         if user["grn"]:
             avg = students[user["grn"]].average()
             student_name = user["name"]
             all_students.append({"name": student_name, "average": avg})
+    if limit is not None:
+        return nlargest(limit, all_students, key=lambda student: student["average"])
     ranked_students = sorted(all_students, key=lambda student: student["average"], reverse=True)
     return ranked_students
 
+# Summary statistics of a list of student averages: count, mean, min, max, population standard deviation and median
+# Every value is 0 for an empty class
+def summarize_averages(averages):
+    count = len(averages)
+    if not count:
+        return {"count": 0, "mean": 0, "min": 0, "max": 0, "stddev": 0, "median": 0}
+    mean = sum(averages) / count
+    ordered = sorted(averages)
+    middle = count // 2
+    median = ordered[middle] if count % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+    stddev = sqrt(sum((avg - mean) ** 2 for avg in averages) / count)
+    return {"count": count, "mean": mean, "min": ordered[0], "max": ordered[-1], "stddev": stddev, "median": median}
+
+# Calculate the statistics of every subject's student averages in one pass over the subjects
+# subject_data maps each subject to its GRN to test score mappings; every student with a row in the subject is counted
+# Returns a dictionary mapping each subject to the dictionary summarize_averages returns
+# Uses the per-row averages of the subject matrices when a NumPy engine is given
+@instrumented
+def calculate_subject_statistics(subject_data, students, engine=None):
+    statistics = {}
+    for sub, data in subject_data.items():
+        if engine is None:
+            statistics[sub] = summarize_averages([students[grn].average(sub) for grn in data])
+            continue
+        averages = engine.matrices[sub].averages
+        if not len(averages):
+            statistics[sub] = summarize_averages([])
+            continue
+        mean = sequential_sum(averages) / len(averages)
+        statistics[sub] = {
+            "count": len(averages),
+            "mean": mean,
+            "min": float(averages.min()),
+            "max": float(averages.max()),
+            "stddev": sqrt(sequential_sum((averages - mean) ** 2) / len(averages)),
+            "median": float(np.median(averages)),
+        }
+    return statistics
+
 # Calculate average scores for each teacher's subject
-# Returns a list of dictionaries with teacher names and their subject averages
-def calculate_teacher_averages(users_data, math_data, phy_data, chem_data, bio_data, cs_data, students):
+# subject_data maps each subject to its GRN to test score mappings
+# Returns a list of dictionaries with teacher names, their subject, their subject average and the subject's full statistics
+# The statistics are computed once per subject and shared by every teacher of that subject
+@instrumented
+def calculate_teacher_averages(users_data, subject_data, students, engine=None):
+    statistics = calculate_subject_statistics(subject_data, students, engine)
     teacher_results = []
     for user in users_data:
         if not user["grn"]:
-            for sub in ["math","phy","chem","bio","cs"]:
-                if user[sub] == "1":
-                    teacher_subject = sub
-                    teacher_name = user["name"]
-            subject_data = {
-                "math": math_data,
-                "phy": phy_data,
-                "chem": chem_data,
-                "bio": bio_data,
-                "cs": cs_data
-            }[teacher_subject]
-            student_averages = []
-            for grn in subject_data:
-                student_averages.append(getattr(students[grn], f"{teacher_subject}_average")())
-            teacher_average = sum(student_averages) / len(student_averages)
-            teacher_results.append({"name": teacher_name, "average": teacher_average})
+            teacher_subject = get_enrolled_subjects(user)[0]
+            subject_statistics = statistics[teacher_subject]
+            teacher_results.append({"name": user["name"], "subject": teacher_subject, "average": subject_statistics["mean"], "statistics": subject_statistics})
     return teacher_results
 
 # Calculate the average of all student averages in a class
-# Takes a list of student dictionaries with 'average' keys
+# Takes a list of student dictionaries with 'average' keys, or a NumPy vector of averages
+# Returns 0 for an empty class
 def calculate_class_average(student_averages):
+    if not len(student_averages):
+        return 0
+    if np is not None and isinstance(student_averages, np.ndarray):
+        return sequential_sum(student_averages) / len(student_averages)
     sum_student_averages = 0
     for student in student_averages:
         sum_student_averages += student["average"]
@@ -160,26 +1747,40 @@ def calculate_class_average(student_averages):
 
 # Calculate a student's rank in each enrolled subject
 # Returns a list of dictionaries with subject, rank, and total students in that subject
-def calculate_student_ranks_in_subjects(student_row, enrolled_subjects, users_data, students):
+# Uses binary searches on the rank index when one is given, vectorized comparisons when a NumPy engine is given,
+# and otherwise compares with the subject's students, read from the UserDirectory's subject index when it has one
+@instrumented
+def calculate_student_ranks_in_subjects(student_row, enrolled_subjects, users_data, students, rank_index=None, engine=None):
     subject_ranks = []
+    by_subject = getattr(users_data, "by_subject", None)
     for sub in enrolled_subjects:
-        student_avg = getattr(students[student_row["grn"]], f"{sub}_average")()
-        rank = 1
-        total_sub_students = 0
-        for user in users_data:
-            if user["grn"]:
-                if user[f"{sub}"] == "1":
-                    total_sub_students += 1
-                    avg = getattr(students[user["grn"]], f"{sub}_average")()
-                    if avg > student_avg:
-                        rank += 1
-        subject_ranks.append({"subject": sub, "rank": rank, "total_students": total_sub_students})
+        student_avg = students[student_row["grn"]].average(sub)
+        if rank_index is not None:
+            subject_ranks.append({"subject": sub, "rank": rank_index.rank(student_avg, sub), "total_students": rank_index.total(sub)})
+            continue
+        if engine is not None:
+            enrolled_averages = engine.subject_averages[sub][engine.enrolled[sub]]
+            rank = 1 + int(np.count_nonzero(enrolled_averages > student_avg))
+            subject_ranks.append({"subject": sub, "rank": rank, "total_students": len(enrolled_averages)})
+            continue
+        if by_subject is not None:
+            enrolled = by_subject.get(sub, [])
+        else:
+            enrolled = [user for user in users_data if user["grn"] and user[sub] == "1"]
+        rank = 1 + sum(students[user["grn"]].average(sub) > student_avg for user in enrolled)
+        subject_ranks.append({"subject": sub, "rank": rank, "total_students": len(enrolled)})
     return subject_ranks
 
 # Calculate a student's overall rank among all students
 # Compares the student's average against all other students' averages
-def calculate_overall_rank(student_row, students):
+# Uses a binary search on the rank index when one is given, or a vectorized comparison when a NumPy engine is given
+@instrumented
+def calculate_overall_rank(student_row, students, rank_index=None, engine=None):
     student_avg = students[student_row["grn"]].average()
+    if rank_index is not None:
+        return rank_index.rank(student_avg)
+    if engine is not None:
+        return 1 + int(np.count_nonzero(engine.overall > student_avg))
     rank = 1
     for student in students.values():
         avg = student.average()
@@ -187,11 +1788,103 @@ def calculate_overall_rank(student_row, students):
             rank += 1
     return rank
 
-# Initialize global data structures by loading all required data
-passwords = load_passwords()
-users_data = load_users_data()
-math_data, phy_data, chem_data, bio_data, cs_data = load_all_subjects()
-students = load_students(math_data, phy_data, chem_data, bio_data, cs_data, users_data)
+# Data files are loaded lazily: nothing is read when project is imported, and each file is
+# parsed the first time a menu needs it, then kept for the rest of the session
+_loaded = {}
+
+# Return a cached value, calling the loader to create it on first use
+def lazy(key, loader):
+    if key not in _loaded:
+        _loaded[key] = loader()
+    return _loaded[key]
+
+# The storage backend: SQLite when SMS_DATABASE names a database file, otherwise the CSV files
+def get_storage():
+    database = os.environ.get("SMS_DATABASE")
+    return lazy("storage", lambda: SQLiteStorage(database) if database else CSVStorage())
+
+def get_passwords():
+    return lazy("passwords", lambda: get_storage().load_passwords())
+
+def get_credentials():
+    return lazy("credentials", lambda: load_credentials(get_passwords()))
+
+def get_users_data():
+    return lazy("users_data", lambda: get_storage().load_users_data())
+
+# Load a single subject file on first use
+def get_subject(subject):
+    return lazy(f"{subject}_data", lambda: get_storage().load_subject(subject))
+
+# The subjects the school teaches, discovered from the users data
+def get_subjects():
+    return get_users_data().subjects
+
+# Return a dictionary of every subject's data, loading any that have not been loaded yet
+def get_all_subjects():
+    return {sub: get_subject(sub) for sub in get_subjects()}
+
+def get_students():
+    return lazy("students", lambda: load_students(get_all_subjects(), get_users_data()))
+
+def get_rank_index():
+    return lazy("rank_index", lambda: RankIndex(get_users_data(), get_students()))
+
+# Return one student's Student object
+# With SQLite storage only that student's rows are read unless every student is already loaded
+def get_student(grn):
+    storage = get_storage()
+    if "students" not in _loaded and isinstance(storage, SQLiteStorage):
+        return storage.load_student(grn)
+    return get_students()[grn]
+
+# Return subject -> marks dictionaries holding at least one student's rows in the given subjects
+# SQLite storage reads just that student's rows for subjects not loaded yet; otherwise the subjects are loaded in full
+def get_student_subjects(grn, subjects):
+    storage = get_storage()
+    if isinstance(storage, SQLiteStorage):
+        return {sub: _loaded.get(f"{sub}_data") or storage.load_subject(sub, grn) for sub in subjects}
+    return {sub: get_subject(sub) for sub in subjects}
+
+# Return a student's ranks in each enrolled subject, their overall rank and the number of students ranked overall
+# SQLite storage ranks with window functions over its cached averages; otherwise the in-memory rank index is used
+def get_student_ranks(student_row, enrolled_subjects):
+    storage = get_storage()
+    if isinstance(storage, SQLiteStorage):
+        return storage.student_ranks(student_row["grn"], enrolled_subjects)
+    users_data, students, rank_index = get_users_data(), get_students(), get_rank_index()
+    subject_ranks = calculate_student_ranks_in_subjects(student_row, enrolled_subjects, users_data, students, rank_index)
+    return subject_ranks, calculate_overall_rank(student_row, students, rank_index), rank_index.total()
+
+# Return every student's name and overall average (or only the best limit students), best first
+# SQLite storage sorts its cached averages in the database; otherwise the loaded students are ranked in memory
+def get_student_rankings(limit=None):
+    storage = get_storage()
+    if isinstance(storage, SQLiteStorage):
+        return storage.student_rankings(limit)
+    return calculate_student_rankings(get_users_data(), get_students(), get_engine(), limit)
+
+# The NumPy backend is used when NumPy is installed, unless SMS_ENGINE=python is set
+def get_engine():
+    if np is None or os.environ.get("SMS_ENGINE", "numpy") != "numpy":
+        return None
+    return lazy("engine", lambda: load_score_engine(get_users_data(), get_all_subjects()))
+
+# Keep the old module attributes (project.users_data, project.math_data, ...) working by loading them on access
+def __getattr__(name):
+    getters = {
+        "passwords": get_passwords,
+        "credentials": get_credentials,
+        "users_data": get_users_data,
+        "students": get_students,
+        "rank_index": get_rank_index,
+        "engine": get_engine,
+    }
+    if name in getters:
+        return getters[name]()
+    if name.endswith("_data") and name.removesuffix("_data") in get_subjects():
+        return get_subject(name.removesuffix("_data"))
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Handle user authentication by verifying username and password
 # Returns the user's name and email domain for menu display
@@ -202,13 +1895,12 @@ def login():
     while not is_username:
         try:
             username = input("Username: ")
-            for password in passwords:
-                if username == password["email"]:
-                    is_username = True
-                    name = password["name"]
-                    dotname, domain = password["email"].split("@")
-                    correct_password = password["password"]
-                    break
+            credential = get_credentials().get(username)
+            if credential:
+                is_username = True
+                name = credential["name"]
+                dotname, domain = credential["email"].split("@")
+                stored_password = credential["password"]
             if not is_username:
                 print("Invalid email address! Please re-enter")
         except EOFError:
@@ -219,7 +1911,7 @@ def login():
     while not is_password:
         try:
             password = input("Password: ")
-            if password == correct_password:
+            if verify_password(password, stored_password):
                 is_password = True
                 break
             if not is_password:
@@ -232,7 +1924,7 @@ def login():
 
 # Print all student averages with their rankings in descending order
 def admin_print_student_averages():
-    ranked_students = calculate_student_rankings(users_data, students)
+    ranked_students = get_student_rankings()
     rank = 1
     for student in ranked_students:
         print(f"{rank}. {student['name']} - {student['average']:.2f}%")
@@ -240,28 +1932,23 @@ def admin_print_student_averages():
 
 # Print all teacher averages with their names
 def admin_print_teacher_averages():
-    teacher_results = calculate_teacher_averages(users_data, math_data, phy_data, chem_data, bio_data, cs_data, students)
+    teacher_results = calculate_teacher_averages(get_users_data(), get_all_subjects(), get_students(), get_engine())
     number = 1
     for teacher in teacher_results:
+        stats = teacher["statistics"]
         print(f"{number}. {teacher['name']}; Average: {teacher['average']:.2f}")
+        print(f"   {stats['count']} students; Median: {stats['median']:.2f}; Min: {stats['min']:.2f}; Max: {stats['max']:.2f}; Std dev: {stats['stddev']:.2f}")
         number += 1
 
 # Create a new student account by gathering information and writing to CSV files
 # Generates email, GRN, and default password for the new student
+# The new student is added to the loaded data straight away, so they show up without a restart
 def admin_create_student_account():
     first_name = input("Enter student's first name: ").strip()
     last_name = input("Enter student's last name: ").strip()
-    full_name = f"{first_name} {last_name}"
-    email = f"{first_name.lower()}.{last_name.lower()}@student.edu"
-
-    max_grn = 0
-    for user in users_data:
-        if user["grn"]:
-            max_grn = max(max_grn, int(user["grn"]))
-    new_grn = str(max_grn + 1)
 
     print("\nEnroll student in subjects (enter 'y' for yes, 'n' for no):")
-    subjects = {"math": "0", "phy": "0", "chem": "0", "bio": "0", "cs": "0"}
+    subjects = {sub: "0" for sub in get_subjects()}
     for subject in subjects:
         while True:
             choice = input(f"Enroll in {subject}? (y/n): ").lower()
@@ -271,45 +1958,430 @@ def admin_create_student_account():
             else:
                 print("Please enter 'y' or 'n'!")
 
-    with open("users.csv", "a", newline='') as file:
-        fieldnames = ["grn", "name", "math", "phy", "chem", "bio", "cs"]
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writerow({
-            "grn": new_grn,
-            "name": full_name,
-            "math": subjects["math"],
-            "phy": subjects["phy"],
-            "chem": subjects["chem"],
-            "bio": subjects["bio"],
-            "cs": subjects["cs"]
-        })
-
-    for subject in subjects:
-        if subjects[subject] == "1":
-            with open(f"{subject}.csv", 'r') as file:
-                reader = csv.DictReader(file)
-                fieldnames = reader.fieldnames
-            with open(f"{subject}.csv", 'a', newline='') as file:
-                writer = csv.DictWriter(file, fieldnames=fieldnames)
-                new_row = {"grn": new_grn}
-                for field in fieldnames[1:]:
-                    new_row[field] = ""
-                writer.writerow(new_row)
-
-    with open("passwords.csv", "a", newline='') as file:
-        fieldnames = ["name", "email", "password"]
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writerow({
-            "name": full_name,
-            "email": email,
-            "password": "password123"
-        })
+    [(row, email)] = create_student_accounts([{"first_name": first_name, "last_name": last_name, **subjects}])
 
     print(f"\nStudent account created successfully!")
-    print(f"Name: {full_name}")
-    print(f"GRN: {new_grn}")
+    print(f"Name: {row['name']}")
+    print(f"GRN: {row['grn']}")
     print(f"Email: {email}")
-    print(f"Default password: password123")
+    print(f"Default password: {DEFAULT_PASSWORD}")
+
+# Read a roster of new students from a CSV file with first_name, last_name and a 1/0 column per subject
+def read_roster(filename):
+    with open(filename, newline='') as file:
+        return [row for row in csv.DictReader(file) if row["first_name"]]
+
+# Add newly created students to the data already loaded in memory, so they are visible without a reload
+# Every update is a dictionary insert or a binary-search insert into the rank index
+# Data that has not been loaded yet is left alone, since it will be read from the updated files,
+# and the NumPy engine and the API's cached views are dropped so they are rebuilt from the updated data the next time they are needed
+# subject_tests maps each subject the students were added to onto its number of tests
+def add_students_in_memory(user_rows, password_rows, subject_tests):
+    users_data = _loaded.get("users_data")
+    if users_data is not None:
+        for row in user_rows:
+            users_data.add(row)
+    passwords = _loaded.get("passwords")
+    if passwords is not None:
+        passwords.extend(password_rows)
+    credentials = _loaded.get("credentials")
+    if credentials is not None:
+        for row in password_rows:
+            credentials[row["email"]] = row
+    blank_scores = {}
+    for row in user_rows:
+        blank_scores[row["grn"]] = {sub: [None] * tests for sub, tests in subject_tests.items() if row[sub] == "1"}
+        for sub, scores in blank_scores[row["grn"]].items():
+            subject_data = _loaded.get(f"{sub}_data")
+            if subject_data is not None:
+                subject_data[row["grn"]] = list(scores)
+    students = _loaded.get("students")
+    if students is not None:
+        rank_index = _loaded.get("rank_index")
+        for row in user_rows:
+            students[row["grn"]] = Student(**blank_scores[row["grn"]])
+            if rank_index is not None:
+                rank_index.add(row["grn"], students[row["grn"]], get_enrolled_subjects(row))
+    drop_cached_views(subject_tests)
+
+# Drop the NumPy engine and the API's cached views of the given subjects after a write,
+# so they are rebuilt from the updated data the next time they are needed
+def drop_cached_views(subjects):
+    for key in ["engine", "teacher_averages", "current_term", *[f"{sub}_class" for sub in subjects]]:
+        _loaded.pop(key, None)
+
+# Add an empty test to a subject, in storage and in the subject data already loaded
+# No average or rank changes, since the new test has no scores yet
+# Returns the new number of tests
+def add_test(subject):
+    tests = get_storage().add_test(subject)
+    subject_data = _loaded.get(f"{subject}_data")
+    if subject_data is not None:
+        for scores in subject_data.values():
+            scores.extend([None] * (tests - len(scores)))
+    drop_cached_views([subject])
+    return tests
+
+# Save the scores a teacher entered and apply them to the data already loaded in memory
+# marks maps each GRN to {test index: "obtained/max"}; returns the number of tests in the subject
+@instrumented
+def record_scores(subject, marks):
+    tests = get_storage().record_scores(subject, marks)
+    update_scores_in_memory(subject, marks, tests)
+    return tests
+
+# Patch the loaded subject data and Student objects with newly entered scores
+# Each changed student has their cached averages dropped and is then moved in the rank index,
+# all in one batch, so entering a whole class costs O(N log N) rather than a list shift per student
+def update_scores_in_memory(subject, marks, tests):
+    subject_data = _loaded.get(f"{subject}_data")
+    students = _loaded.get("students")
+    rank_index = _loaded.get("rank_index")
+    changed = {}
+    for grn, entered in marks.items():
+        patch = [None] * tests
+        for test, cell in entered.items():
+            patch[test] = parse_mark(cell)
+        if subject_data is not None:
+            scores = subject_data.setdefault(grn, [])
+            scores.extend([None] * (tests - len(scores)))
+            merge_scores(scores, patch)
+        student = students.get(grn) if students is not None else None
+        if student is not None:
+            scores = student.marks(subject)
+            scores.extend([None] * (tests - len(scores)))
+            merge_scores(scores, patch)
+            student.set_scores(subject, scores)
+            if rank_index is not None and grn in rank_index.entries:
+                changed[grn] = student
+    if changed:
+        rank_index.update_many(changed)
+    drop_cached_views([subject])
+
+# Bring the data already loaded in memory up to date with changes made to the CSV files from outside this process
+# (by hand, or by another copy of the program), found by polling each loaded file's size and modification time
+# Rows appended to a file are parsed from where the last read stopped; a file edited in place is parsed again
+# and compared GRN by GRN, and only the students whose rows changed are rebuilt and moved in the rank index
+# Subject files are applied before users.csv, so a new student's scores are in place when their Student is built
+# Returns the names of the files that changed
+@instrumented
+def refresh_data():
+    storage = _loaded.get("storage")
+    if not isinstance(storage, CSVStorage):
+        return []
+    changes = storage.poll_changes()
+    students = _loaded.get("students")
+    rank_index = _loaded.get("rank_index")
+    moved = {}
+    for filename, (change, text) in changes.items():
+        subject = filename.removesuffix(".csv")
+        if filename in ["users.csv", "passwords.csv"] or f"{subject}_data" not in _loaded:
+            continue
+        for grn in refresh_subject(filename, _loaded[f"{subject}_data"], change, text):
+            student = students.get(grn) if students is not None else None
+            if student is not None:
+                student.set_scores(subject, _loaded[f"{subject}_data"].get(grn, []))
+                if rank_index is not None and grn in rank_index.entries:
+                    moved[grn] = student
+        drop_cached_views([subject])
+    if moved:
+        rank_index.update_many(moved)
+    if "users.csv" in changes and "users_data" in _loaded:
+        if not refresh_users(_loaded["users_data"], *changes["users.csv"]):
+            # The subject columns themselves changed, so everything is loaded again from scratch on next use
+            _loaded.clear()
+            return list(changes)
+    if "passwords.csv" in changes and "passwords" in _loaded:
+        refresh_passwords(*changes["passwords.csv"])
+    return list(changes)
+
+# Apply a change to a loaded subject file to its GRN -> scores dictionary, in place
+# Appended rows are merged like load_subject merges patch rows; an edited file is parsed again and compared
+# Returns the GRNs whose scores changed (including GRNs whose row was removed)
+def refresh_subject(filename, subject_data, change, text):
+    if change == "appended":
+        with open(filename, newline='') as file:
+            header = next(csv.reader(file))
+        changed = set()
+        for grn, scores in subject_rows(header, csv.reader(io.StringIO(text))):
+            if grn in subject_data:
+                merge_scores(subject_data[grn], scores)
+            else:
+                subject_data[grn] = scores
+            changed.add(grn)
+        return changed
+    new_data = load_subject(filename)
+    changed = {grn for grn in subject_data.keys() | new_data.keys() if subject_data.get(grn) != new_data.get(grn)}
+    subject_data.clear()
+    subject_data.update(new_data)
+    return changed
+
+# Apply a change to users.csv to the loaded UserDirectory, in place, and to the loaded Students and rank index
+# New students get a Student built from the loaded subject data, removed ones leave the rank index,
+# and students whose enrollments changed are re-indexed under their new subjects
+# Returns False, changing nothing, if the subject columns changed
+def refresh_users(users_data, change, text):
+    if change == "appended":
+        with open("users.csv", newline='') as file:
+            header = next(csv.reader(file))
+        added = []
+        for row in csv.DictReader(io.StringIO(text), fieldnames=header):
+            if row["grn"] not in users_data.by_grn:
+                users_data.add(row)
+                if row["grn"]:
+                    added.append(row)
+        removed, changed = [], []
+    else:
+        new_users = load_users_data()
+        if new_users.subjects != users_data.subjects:
+            return False
+        old_rows = dict(users_data.by_grn)
+        users_data.replace(new_users.rows, new_users.offset)
+        added = [row for grn, row in users_data.by_grn.items() if grn not in old_rows]
+        removed = [grn for grn in old_rows if grn not in users_data.by_grn]
+        changed = [row for grn, row in users_data.by_grn.items()
+                   if grn in old_rows and get_enrolled_subjects(row) != get_enrolled_subjects(old_rows[grn])]
+    students = _loaded.get("students")
+    rank_index = _loaded.get("rank_index")
+    if students is not None:
+        subject_data = get_all_subjects()
+        for grn in removed:
+            students.pop(grn, None)
+            if rank_index is not None and grn in rank_index.entries:
+                rank_index.remove(grn)
+        for row in added:
+            grn = row["grn"]
+            students[grn] = Student(**{sub: data[grn] for sub, data in subject_data.items() if grn in data})
+            if rank_index is not None:
+                rank_index.add(grn, students[grn], get_enrolled_subjects(row))
+        for row in changed:
+            if rank_index is not None and row["grn"] in rank_index.entries:
+                rank_index.update(row["grn"], students[row["grn"]], get_enrolled_subjects(row))
+    drop_cached_views(users_data.subjects)
+    return True
+
+# Apply a change to passwords.csv to the loaded password rows and credentials, in place
+def refresh_passwords(change, text):
+    passwords = _loaded["passwords"]
+    if change == "appended":
+        rows = list(csv.DictReader(io.StringIO(text), fieldnames=["name", "email", "password"]))
+        passwords.extend(rows)
+    else:
+        passwords[:] = load_passwords()
+        rows = passwords
+    credentials = _loaded.get("credentials")
+    if credentials is not None:
+        if change != "appended":
+            credentials.clear()
+        credentials.update(load_credentials(rows))
+
+# Past terms are kept as read-only partitions, one directory per term under TERMS_DIRECTORY (e.g. terms/2024-autumn),
+# each holding users.csv and the subject files as they were when the term was closed; the working directory is the open term
+# A closed term is only read when a query asks for it, and then only its summary (see load_term_summary)
+TERMS_DIRECTORY = "terms"
+
+# The name the open term is shown under next to the closed ones
+CURRENT_TERM = os.environ.get("SMS_TERM", "current")
+
+# The closed terms, oldest first (term directories are named so that they sort in order, e.g. 2024-1, 2024-2)
+# Hidden directories are terms still being closed (see CSVStorage.close_term)
+def list_terms():
+    try:
+        return sorted(entry.name for entry in os.scandir(TERMS_DIRECTORY) if entry.is_dir() and not entry.name.startswith("."))
+    except FileNotFoundError:
+        return []
+
+# Aggregates of one term, kept column by column in the order of grns (positions maps a GRN back to its place):
+# every student's overall average and rank, their average in each subject (NaN without a row in it),
+# and the cohort statistics (summarize_averages) of the overall averages and of each subject
+def summarize_term(users_data, subject_data, students):
+    grns = list(students)
+    overall = array("d", [students[grn].average() for grn in grns])
+    ordered = sorted(overall)
+    subjects = {sub: array("d", [students[grn].average(sub) if grn in data else nan for grn in grns]) for sub, data in subject_data.items()}
+    return {
+        "grns": grns,
+        "positions": {grn: position for position, grn in enumerate(grns)},
+        "overall": overall,
+        "ranks": array("I", [len(ordered) - bisect_right(ordered, avg) + 1 for avg in overall]),
+        "subjects": subjects,
+        "cohort": {"overall": summarize_averages(ordered),
+                   **{sub: summarize_averages([avg for avg in averages if avg == avg]) for sub, averages in subjects.items()}},
+    }
+
+# The size and modification time of each of a closed term's files, stored with its summary to tell when it is out of date
+def term_fingerprint(directory, subjects):
+    fingerprint = {}
+    for filename in ["users.csv", *[f"{sub}.csv" for sub in subjects]]:
+        stat = os.stat(os.path.join(directory, filename))
+        fingerprint[filename] = [stat.st_size, stat.st_mtime_ns]
+    return fingerprint
+
+# Binary summary written next to a closed term's files (summary.<average mode>.cache)
+# Layout: a header with the length of a JSON block holding the file fingerprint, the cohort statistics,
+# the subject names and the GRNs, then (padded to 8 bytes) the overall averages, each subject's averages
+# and the ranks as little-endian arrays, so a term loads with one read instead of parsing its files
+TERM_SUMMARY_HEADER = struct.Struct("<4sIQ")
+TERM_SUMMARY_MAGIC = b"SMST"
+TERM_SUMMARY_VERSION = 1
+
+# Write a closed term's summary through a temporary file renamed into place
+def write_term_summary(filename, summary, fingerprint):
+    header = json.dumps({"files": fingerprint, "cohort": summary["cohort"], "subjects": list(summary["subjects"]), "grns": summary["grns"]}).encode()
+    with open(f"{filename}.tmp", "wb") as file:
+        file.write(TERM_SUMMARY_HEADER.pack(TERM_SUMMARY_MAGIC, TERM_SUMMARY_VERSION, len(header)) + header + b"\0" * (-len(header) % 8))
+        summary["overall"].tofile(file)
+        for averages in summary["subjects"].values():
+            averages.tofile(file)
+        summary["ranks"].tofile(file)
+    os.replace(f"{filename}.tmp", filename)
+
+# Read a closed term's summary, or None when there is none, it is damaged, or the term's files changed since it was written
+def read_term_summary(filename, directory):
+    try:
+        with open(filename, "rb") as file:
+            data = file.read()
+        magic, version, length = TERM_SUMMARY_HEADER.unpack_from(data)
+        header = json.loads(data[TERM_SUMMARY_HEADER.size:TERM_SUMMARY_HEADER.size + length])
+        subjects = header["subjects"]
+        if (magic, version) != (TERM_SUMMARY_MAGIC, TERM_SUMMARY_VERSION) or header["files"] != term_fingerprint(directory, subjects):
+            return None
+        count = len(header["grns"])
+        columns = []
+        offset = TERM_SUMMARY_HEADER.size + length + (-length % 8)
+        for typecode in ["d"] * (len(subjects) + 1) + ["I"]:
+            column = array(typecode)
+            column.frombytes(data[offset:offset + count * column.itemsize])
+            if len(column) != count:
+                return None
+            columns.append(column)
+            offset += count * column.itemsize
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
+    grns = header["grns"]
+    return {"grns": grns, "positions": {grn: position for position, grn in enumerate(grns)}, "overall": columns[0],
+            "ranks": columns[-1], "subjects": dict(zip(subjects, columns[1:-1])), "cohort": header["cohort"]}
+
+# Load the summary of a closed term, computing it from the term's files only when its cached copy is missing or stale
+# Closed terms never change, so the summary is kept next to their files and later runs read that one file
+# instead of parsing the term; editing the term's files by hand makes it stale
+@instrumented
+def load_term_summary(directory):
+    filename = os.path.join(directory, f"summary.{AVERAGE_MODE}.cache")
+    summary = read_term_summary(filename, directory)
+    if summary is not None:
+        return summary
+    users_data = load_users_data(os.path.join(directory, "users.csv"))
+    fingerprint = term_fingerprint(directory, users_data.subjects)
+    with gc_paused():
+        subject_data = {sub: load_subject_cached(os.path.join(directory, f"{sub}.csv")) for sub in users_data.subjects}
+        summary = summarize_term(users_data, subject_data, load_students(subject_data, users_data))
+    try:
+        write_term_summary(filename, summary, fingerprint)
+    except OSError:
+        pass
+    return summary
+
+# The summary of a closed term, or of the open term (CURRENT_TERM) worked out from the data loaded for the menus
+def get_term_summary(term):
+    if term == CURRENT_TERM:
+        return lazy("current_term", lambda: summarize_term(get_users_data(), get_all_subjects(), get_students()))
+    return lazy(f"{term}_term", lambda: load_term_summary(os.path.join(TERMS_DIRECTORY, term)))
+
+# A student's averages and overall rank in every term they were in, oldest first and ending with the open term
+# terms limits the query to some terms; only the summaries of the terms asked about are loaded
+def student_trend(grn, terms=None):
+    trend = []
+    for term in list_terms() + [CURRENT_TERM] if terms is None else terms:
+        summary = get_term_summary(term)
+        position = summary["positions"].get(grn)
+        if position is not None:
+            trend.append({"term": term, "average": summary["overall"][position], "rank": summary["ranks"][position], "total_students": len(summary["grns"]),
+                          "subjects": {sub: averages[position] for sub, averages in summary["subjects"].items() if averages[position] == averages[position]}})
+    return trend
+
+# The cohort statistics of every term, of the overall averages or of one subject's, oldest first and ending with the open term
+# Terms that did not teach the subject are left out
+def cohort_averages(subject=None, terms=None):
+    cohorts = []
+    for term in list_terms() + [CURRENT_TERM] if terms is None else terms:
+        statistics = get_term_summary(term)["cohort"].get(subject or "overall")
+        if statistics is not None:
+            cohorts.append({"term": term, **statistics})
+    return cohorts
+
+# Close the open term under a new name and start the next one with the same students and no tests
+# The closed term's summary is written with its files, so queries never have to parse them
+# Terms are partitions of CSV files, so this needs the CSV storage; raises ValueError for a bad or used name
+def close_term(term):
+    storage = get_storage()
+    if isinstance(storage, SQLiteStorage):
+        raise ValueError("terms can only be closed with the CSV files as storage")
+    if not term or term == CURRENT_TERM or os.sep in term or term.startswith("."):
+        raise ValueError(f"invalid term name: {term}")
+    try:
+        directory = storage.close_term(term, get_subjects())
+    except FileExistsError:
+        raise ValueError(f"term {term} is already closed")
+    _loaded.clear()
+    return lazy(f"{term}_term", lambda: load_term_summary(directory))
+
+# Create accounts for every student in a roster, assigning consecutive GRNs in one pass
+# The storage backend allocates the GRNs and writes every new row as one atomic write,
+# so concurrent admins never share a GRN and a crash never leaves the data out of step
+# The in-memory data is then updated without a reload
+# The default password is hashed once per account, each with its own salt, so no two new accounts share a hash;
+# DEFAULT_PASSWORD_ITERATIONS is lower than for chosen passwords because the default is printed for the admin anyway
+# and stretching a known password protects nothing, while a full-strength hash per student would stall large intakes
+# Returns the new users.csv rows together with the students' emails
+def create_student_accounts(roster):
+    users_data = get_users_data()
+    new_students = []
+    for student in roster:
+        first_name, last_name = student["first_name"].strip(), student["last_name"].strip()
+        new_students.append({
+            "name": f"{first_name} {last_name}",
+            "email": f"{first_name.lower()}.{last_name.lower()}@student.edu",
+            "password": hash_password(DEFAULT_PASSWORD, DEFAULT_PASSWORD_ITERATIONS),
+            **{sub: "1" if student.get(sub, "").strip() == "1" else "0" for sub in users_data.subjects}
+        })
+    user_rows, password_rows, subject_tests = get_storage().add_students(users_data, new_students)
+    add_students_in_memory(user_rows, password_rows, subject_tests)
+    return [(row, password_row["email"]) for row, password_row in zip(user_rows, password_rows)]
+
+# Create student accounts in bulk from a roster file chosen by the admin
+def admin_bulk_create_student_accounts():
+    filename = input("Enter roster file name: ").strip()
+    try:
+        roster = read_roster(filename)
+    except (OSError, KeyError):
+        print("Please enter a readable roster file with first_name and last_name columns!")
+        return
+    created = create_student_accounts(roster)
+    print(f"\nCreated {len(created)} student accounts with default password {DEFAULT_PASSWORD}")
+    if created:
+        print(f"GRNs: {created[0][0]['grn']} to {created[-1][0]['grn']}")
+
+# Print the cohort statistics of every term, overall or for one subject chosen by the admin
+def admin_print_cohort_averages():
+    subject = input("Enter a subject, or leave blank for overall averages: ").strip().lower() or None
+    cohorts = cohort_averages(subject)
+    if not cohorts:
+        print("No term has averages for that subject!")
+    for cohort in cohorts:
+        print(f"{cohort['term']}: Average: {cohort['mean']:.2f}; {cohort['count']} students; Median: {cohort['median']:.2f}; Min: {cohort['min']:.2f}; Max: {cohort['max']:.2f}")
+
+# Close the current term under a name chosen by the admin, after asking for confirmation
+def admin_close_term():
+    term = input("Enter a name for the term being closed (e.g. 2024-autumn): ").strip()
+    if input(f"Archive the current scores as {term} and start a new term with no tests? (y/n): ").strip().lower() != "y":
+        return
+    try:
+        summary = close_term(term)
+    except ValueError as error:
+        print(f"Could not close the term: {error}")
+        return
+    print(f"Closed {term}: {summary['cohort']['overall']['count']} students, overall average {summary['cohort']['overall']['mean']:.2f}")
 
 # Admin menu providing options to view student/teacher data or create new accounts
 def admin_menu(name):
@@ -317,8 +2389,9 @@ def admin_menu(name):
     while True:
         try:
             print("\nPress Ctrl+D at any time to exit")
-            op = input("1. Print all student averages with names and ranks\n2. Print all teacher averages with names\n3. Create a new student account\nEnter choice (1-3): ")
-            if op in ["1", "2", "3"]:
+            op = input("1. Print all student averages with names and ranks\n2. Print all teacher averages with names\n3. Create a new student account\n4. Create student accounts from a roster file\n5. Print cohort averages per term\n6. Close the current term\nEnter choice (1-6): ")
+            refresh_data()
+            if op in ["1", "2", "3", "4", "5", "6"]:
                 match op:
                     case "1":
                         print("\nAll student averages with ranks:")
@@ -332,6 +2405,17 @@ def admin_menu(name):
                         print("\nCreating new student account...")
                         admin_create_student_account()
                         print()
+                    case "4":
+                        print("\nCreating student accounts from a roster...")
+                        admin_bulk_create_student_accounts()
+                        print()
+                    case "5":
+                        print("\nCohort averages per term:")
+                        admin_print_cohort_averages()
+                        print()
+                    case "6":
+                        admin_close_term()
+                        print()
             else:
                 print("Please choose from the options available!")
         except EOFError:
@@ -340,32 +2424,20 @@ def admin_menu(name):
 
 # Determine which subject a teacher teaches by checking their user data
 def get_teacher_subject(name, users_data):
-    for row in users_data:
-        if row["name"] == name:
-            for sub in ["math","phy","chem","bio","cs"]:
-                if row[sub] == "1":
-                    return sub
+    row = users_data.by_name.get(name)
+    if row:
+        for sub in get_enrolled_subjects(row):
+            return sub
     return None
 
 # Prepare student data for a teacher's specific subject including averages and rankings
-def prepare_teacher_data(teacher_subject, math_data, phy_data, chem_data, bio_data, cs_data, students, users_data):
+# Only needs the teacher's own subject data, so other subject files never have to be loaded
+@instrumented
+def prepare_teacher_data(teacher_subject, subject_data, users_data):
     student_averages = []
-    subject_data = {
-        "math": math_data,
-        "phy": phy_data,
-        "chem": chem_data,
-        "bio": bio_data,
-        "cs": cs_data
-    }[teacher_subject]
-
-    for grn in subject_data:
-        student_averages.append({"grn": grn, "name": None, "scores": getattr(students[grn], f"{teacher_subject}"), "average": getattr(students[grn], f"{teacher_subject}_average")()})
-
-    for student in student_averages:
-        for row in users_data:
-            if row["grn"] == student["grn"]:
-                student["name"] = row["name"]
-                break
+    for grn, scores in subject_data.items():
+        row = users_data.by_grn.get(grn)
+        student_averages.append({"grn": grn, "name": row["name"] if row else None, "scores": percentages(scores), "average": scores_average(scores)})
 
     sorted_averages = sorted(student_averages, key=lambda student: student["average"], reverse=True)
     rank = 1
@@ -376,26 +2448,10 @@ def prepare_teacher_data(teacher_subject, math_data, phy_data, chem_data, bio_da
     return student_averages, sorted_averages
 
 # Print all student scores in the teacher's subject in tabular format
+@instrumented
 def teacher_print_scores(teacher_subject, student_averages):
-    headers = ["Student Name"]
-    table_data = []
-    max_test = 0
-    for student in student_averages:
-        if len(student["scores"]) > max_test:
-            max_test = len(student["scores"])
-        row = [student["name"]]
-        for score in student["scores"]:
-            if score:
-                row.append(f"{score:.2f}%")
-            else:
-                row.append("N/A")
-        row.append(f"{student['average']:.2f}%")
-        table_data.append(row)
-    for i in range(max_test):
-        headers.append(f"Test {i+1}")
-    headers.append("Average")
     print(f"\nAll {teacher_subject.upper()} Scores:")
-    print(tabulate(table_data, headers=headers, tablefmt="grid"))
+    print_score_table("Student Name", [(student["name"], student["scores"], student["average"]) for student in student_averages], TABLE_PAGE_ROWS)
 
 # Find a specific student in the teacher's class by GRN
 def teacher_find_student(student_averages):
@@ -412,17 +2468,84 @@ def teacher_find_student(student_averages):
             sys.exit()
     return None
 
+# Ask for a test number until a valid one is entered; returns the test's index
+def input_test(tests):
+    while True:
+        test = input(f"Enter test number (1-{tests}): ").strip()
+        if test.isdigit() and 1 <= int(test) <= tests:
+            return int(test) - 1
+        print("Please enter a valid test number!")
+
+# Ask for a score until a valid "obtained/max" one is entered; a blank answer returns None if allow_blank is set
+def input_marks(prompt, allow_blank=False):
+    while True:
+        marks = input(prompt).strip()
+        if allow_blank and not marks:
+            return None
+        try:
+            return parse_marks(marks)
+        except ValueError:
+            print("Please enter the score as obtained/max, e.g. 17/20!")
+
+# Add a new, empty test to the teacher's subject
+def teacher_add_test(teacher_subject):
+    tests = add_test(teacher_subject)
+    print(f"Added test{tests} to {teacher_subject}")
+    print()
+
+# Enter or update one student's score in one test of the teacher's subject
+def teacher_enter_score(teacher_subject, subject_data):
+    tests = max((len(scores) for scores in subject_data.values()), default=0)
+    if not tests:
+        print("Please add a test first!")
+        return
+    grn = input("Enter student GRN: ").strip()
+    while grn not in subject_data:
+        print("Please enter a valid student ID!")
+        grn = input("Enter student GRN: ").strip()
+    test = input_test(tests)
+    marks = input_marks("Enter score (obtained/max): ")
+    record_scores(teacher_subject, {grn: {test: marks}})
+    print(f"Recorded {marks} for {grn} in test{test + 1}")
+    print()
+
+# Enter one test's scores for the whole class, saved together in one write once every student has been asked
+# Students left blank keep their current score
+def teacher_enter_class_scores(teacher_subject, subject_data, users_data):
+    tests = max((len(scores) for scores in subject_data.values()), default=0)
+    if not tests:
+        print("Please add a test first!")
+        return
+    test = input_test(tests)
+    print("Enter each student's score as obtained/max, or leave it blank to skip")
+    marks = {}
+    for grn in subject_data:
+        row = users_data.by_grn.get(grn)
+        entered = input_marks(f"{row['name'] if row else grn} ({grn}): ", allow_blank=True)
+        if entered is not None:
+            marks[grn] = {test: entered}
+    if marks:
+        record_scores(teacher_subject, marks)
+    print(f"Recorded {len(marks)} scores in test{test + 1}")
+    print()
+
 # Teacher menu providing class-wide and individual student operations
+# The class listing is rebuilt from the subject data the first time it is needed after scores change
 def teacher_menu(name):
     print(f"Welcome, {name}! What would you like to do today?")
-    teacher_subject = get_teacher_subject(name, users_data)
-    student_averages, sorted_averages = prepare_teacher_data(teacher_subject, math_data, phy_data, chem_data, bio_data, cs_data, students, users_data)
+    student_averages = None
 
     while True:
         try:
             print("\nPress Ctrl+D at any time to exit")
-            op = input("FOR THE WHOLE CLASS:\n1.Print all available student test scores in a tabular form\n2.Calculate class average\n3.Calculate class ranks\n4.Display all the students enrolled in your course\nFOR A PARTICULAR STUDENT:\n5.Find student average\n6.Display student rank\nEnter choice (1-6): ")
-            if op in ["1","2","3","4","5","6"]:
+            op = input("FOR THE WHOLE CLASS:\n1.Print all available student test scores in a tabular form\n2.Calculate class average\n3.Calculate class ranks\n4.Display all the students enrolled in your course\nFOR A PARTICULAR STUDENT:\n5.Find student average\n6.Display student rank\nSCORE ENTRY:\n7.Add a new test\n8.Enter or update a student's score\n9.Enter a test's scores for the whole class\nEnter choice (1-9): ")
+            if refresh_data():
+                student_averages = None
+            # The data is fetched again every time, since a refresh may have loaded it afresh
+            teacher_subject = get_teacher_subject(name, get_users_data())
+            if op in ["1","2","3","4","5","6","7","8","9"]:
+                if student_averages is None and op in ["1","2","3","4","5","6"]:
+                    student_averages, sorted_averages = prepare_teacher_data(teacher_subject, get_subject(teacher_subject), get_users_data())
                 match op:
                     case "1":
                         teacher_print_scores(teacher_subject, student_averages)
@@ -453,94 +2576,76 @@ def teacher_menu(name):
                                             print(f"{student['name']} is ranked {student['rank']} out of {len(sorted_averages)} in {teacher_subject} with {student['average']:.2f}%")
                                             print()
                                             break
+                    case "7":
+                        teacher_add_test(teacher_subject)
+                        student_averages = None
+                    case "8":
+                        teacher_enter_score(teacher_subject, get_subject(teacher_subject))
+                        student_averages = None
+                    case "9":
+                        teacher_enter_class_scores(teacher_subject, get_subject(teacher_subject), get_users_data())
+                        student_averages = None
             else:
                 print("Please choose from the options available!")
         except EOFError:
             print("\nExiting...")
             sys.exit()
 
-# Find student data by name in the users_data list
+# Find student data by name in the users directory
 def get_student_row(name, users_data):
-    for user in users_data:
-        if name == user["name"]:
-            return user
-    return None
+    return users_data.by_name.get(name)
 
 # Get list of subjects a student is enrolled in based on their user data
 def get_enrolled_subjects(student_row):
-    subjects = ["math","phy","chem","bio","cs"]
-    return [sub for sub in subjects if student_row[sub]=="1"]
+    return [sub for sub in row_subjects(student_row) if student_row[sub]=="1"]
 
 # Print student's scores in all enrolled subjects in tabular format
-def student_print_scores(student_row, enrolled_subjects, math_data, phy_data, chem_data, bio_data, cs_data, students):
-    headers = ["Subject"]
+# subjects maps each enrolled subject to its data, so only those files have to be loaded
+@instrumented
+def student_print_scores(student_row, enrolled_subjects, subjects):
     grn = student_row["grn"]
-    max_test = 0
-    for subject in enrolled_subjects:
-        subject_data = {
-            "math": math_data,
-            "phy": phy_data,
-            "chem": chem_data,
-            "bio": bio_data,
-            "cs": cs_data
-        }[subject]
-        test_count = len(subject_data[f"{grn}"])
-        if test_count > max_test:
-            max_test = test_count
-    headers.extend([f"Test {i+1}" for i in range(max_test)])
-    headers.append("Average")
-    table_data = []
-    for subject in enrolled_subjects:
-        subject_data = {
-            "math": math_data,
-            "phy": phy_data,
-            "chem": chem_data,
-            "bio": bio_data,
-            "cs": cs_data
-        }[subject]
-        row = [subject.upper()]
-        for score in subject_data[grn]:
-            if score:
-                row.append(f"{score:.2f}%")
-            else:
-                row.append("N/A")
-        subject_avg = getattr(students[grn], f"{subject}_average")()
-        row.append(f"{subject_avg:.2f}%")
-        table_data.append(row)
+    entries = [(subject.upper(), percentages(subjects[subject][grn]), scores_average(subjects[subject][grn])) for subject in enrolled_subjects]
     print(f"\nAll Your Scores - {student_row['name']}:")
-    print(tabulate(table_data, headers=headers, tablefmt="grid"))
+    print_score_table("Subject", entries)
 
 # Print student's subject-wise and overall averages
 def student_print_averages(student_row, enrolled_subjects, students):
     print("Your averages are as follows:")
     subject_averages = []
     for sub in enrolled_subjects:
-        avg = getattr(students[student_row["grn"]], f"{sub}_average")()
+        avg = students[student_row["grn"]].average(sub)
         print(f"{sub}: {avg:.2f}%")
         subject_averages.append(avg)
     overall_avg = students[student_row["grn"]].average()
     print(f"Overall average: {overall_avg:.2f}%")
 
 # Print student's ranks in each subject and overall rank
-def student_print_ranks(student_row, enrolled_subjects, users_data, students):
+def student_print_ranks(student_row, enrolled_subjects):
     print("Your ranks are as follows:")
-    subject_ranks = calculate_student_ranks_in_subjects(student_row, enrolled_subjects, users_data, students)
+    subject_ranks, overall_rank, total = get_student_ranks(student_row, enrolled_subjects)
     for rank_info in subject_ranks:
         print(f"{rank_info['subject']}: Rank {rank_info['rank']} out of {rank_info['total_students']}")
-    overall_rank = calculate_overall_rank(student_row, students)
-    print(f"Overall: Rank {overall_rank} out of {len(students)}")
+    print(f"Overall: Rank {overall_rank} out of {total}")
+
+# Print a student's overall average and rank in every term, with each subject's average
+def student_print_trend(student_row):
+    print("Your averages by term are as follows:")
+    for entry in student_trend(student_row["grn"]):
+        subjects = ", ".join(f"{sub}: {avg:.2f}%" for sub, avg in entry["subjects"].items())
+        print(f"{entry['term']}: {entry['average']:.2f}% (rank {entry['rank']} out of {entry['total_students']}){'; ' + subjects if subjects else ''}")
 
 # Student menu providing access to personal academic information
 def student_menu(name):
     print(f"Welcome, {name}! What would you like to do today?")
-    student_row = get_student_row(name, users_data)
-    enrolled_subjects = get_enrolled_subjects(student_row)
-
     while True:
         try:
             print("\nPress Ctrl+D at any time to exit")
-            op = input("1. Print a list of all your courses\n2. Calculate course-wise and overall averages\n3. Print all your scores and averages in a tabular format\n4. Display your rank in each subject and overall\nEnter choice (1-4): ")
-            if op in ["1","2","3","4"]:
+            op = input("1. Print a list of all your courses\n2. Calculate course-wise and overall averages\n3. Print all your scores and averages in a tabular format\n4. Display your rank in each subject and overall\n5. Show your averages term by term\nEnter choice (1-5): ")
+            refresh_data()
+            # The row is looked up again every time, since a refresh may have changed or reloaded it
+            student_row = get_student_row(name, get_users_data())
+            enrolled_subjects = get_enrolled_subjects(student_row)
+            if op in ["1","2","3","4","5"]:
                 match op:
                     case "1":
                         print("You are enrolled in the following courses:")
@@ -550,13 +2655,16 @@ def student_menu(name):
                             number += 1
                         print()
                     case "2":
-                        student_print_averages(student_row, enrolled_subjects, students)
+                        student_print_averages(student_row, enrolled_subjects, {student_row["grn"]: get_student(student_row["grn"])})
                         print()
                     case "3":
-                        student_print_scores(student_row, enrolled_subjects, math_data, phy_data, chem_data, bio_data, cs_data, students)
+                        student_print_scores(student_row, enrolled_subjects, get_student_subjects(student_row["grn"], enrolled_subjects))
                         print()
                     case "4":
-                        student_print_ranks(student_row, enrolled_subjects, users_data, students)
+                        student_print_ranks(student_row, enrolled_subjects)
+                        print()
+                    case "5":
+                        student_print_trend(student_row)
                         print()
             else:
                 print("Please choose from the options available!")
@@ -574,8 +2682,368 @@ def launch_menu(name, domain):
         case "student.edu":
             student_menu(name)
 
+# Build one student's report: their scores, average, rank and percentile in every enrolled subject, and overall
+def student_report(student_row, subject_data, students, rank_index):
+    grn = student_row["grn"]
+    student = students[grn]
+    subjects = []
+    for sub in get_enrolled_subjects(student_row):
+        avg = student.average(sub)
+        subjects.append({"subject": sub, "scores": percentages(subject_data[sub].get(grn, [])), "average": avg,
+                         "rank": rank_index.rank(avg, sub), "total_students": rank_index.total(sub),
+                         "percentile": rank_index.percentile(avg, sub)})
+    overall_avg = student.average()
+    return {"grn": grn, "name": student_row["name"], "subjects": subjects, "average": overall_avg,
+            "rank": rank_index.rank(overall_avg), "total_students": rank_index.total(), "percentile": rank_index.percentile(overall_avg)}
+
+# Build one teacher's report: every student in their subject with scores, average and class rank, best first
+def teacher_report(teacher_row, subject_data, users_data):
+    subject = get_enrolled_subjects(teacher_row)[0]
+    student_averages, sorted_averages = prepare_teacher_data(subject, subject_data[subject], users_data)
+    return {"name": teacher_row["name"], "subject": subject, "average": calculate_class_average(student_averages),
+            "students": [{key: student[key] for key in ["grn", "name", "scores", "average", "rank"]} for student in sorted_averages]}
+
+# Column headers of the CSV reports; tests is the largest number of tests in any subject
+REPORT_COLUMNS = {
+    "student": ["grn", "name", "subject", "average", "rank", "total_students"],
+    "teacher": ["teacher", "subject", "grn", "name", "average", "rank"],
+}
+
+# Format a percentage for a CSV report cell, leaving missing tests blank
+def report_cell(score):
+    return "" if score is None else f"{score:.2f}"
+
+# Format one report as CSV rows: one row per subject plus an "overall" row for a student,
+# and one row per student in the class for a teacher
+def report_csv_rows(role, report):
+    if role == "student":
+        rows = [[report["grn"], report["name"], sub["subject"], report_cell(sub["average"]), sub["rank"], sub["total_students"],
+                 *map(report_cell, sub["scores"])] for sub in report["subjects"]]
+        rows.append([report["grn"], report["name"], "overall", report_cell(report["average"]), report["rank"], report["total_students"]])
+        return rows
+    return [[report["name"], report["subject"], student["grn"], student["name"], report_cell(student["average"]), student["rank"],
+             *map(report_cell, student["scores"])] for student in report["students"]]
+
+# Format one report as text: a JSON object, its CSV rows, or the grid tables the menus print
+@instrumented
+def format_report(role, report, output_format):
+    if output_format == "json":
+        return json.dumps(report)
+    if output_format == "csv":
+        return csv_text(report_csv_rows(role, report))
+    if role == "student":
+        lines = [f"{report['name']} ({report['grn']})",
+                 scores_table("Subject", [(sub["subject"].upper(), sub["scores"], sub["average"]) for sub in report["subjects"]])]
+        lines.extend(f"{sub['subject']}: Rank {sub['rank']} out of {sub['total_students']}" for sub in report["subjects"])
+        lines.append(f"Overall: {report['average']:.2f}%, Rank {report['rank']} out of {report['total_students']}")
+    else:
+        lines = [f"{report['name']} - {report['subject'].upper()} (class average {report['average']:.2f}%)",
+                 scores_table("Student Name", [(student["name"], student["scores"], student["average"]) for student in report["students"]])]
+    return "\n".join(lines) + "\n\n"
+
+# Build and format the reports of the given users one at a time, from the data loaded in this process
+def render_reports(role, rows, output_format):
+    subject_data = get_all_subjects()
+    if role == "student":
+        students, rank_index = get_students(), get_rank_index()
+        for row in rows:
+            yield format_report(role, student_report(row, subject_data, students, rank_index), output_format)
+    else:
+        users_data = get_users_data()
+        for row in rows:
+            yield format_report(role, teacher_report(row, subject_data, users_data), output_format)
+
+# Worker side of a parallel report run: adopt the data the parent loaded, then format one shard of users
+def share_loaded(loaded):
+    _loaded.update(loaded)
+
+def render_report_shard(role, rows, output_format):
+    return list(render_reports(role, rows, output_format))
+
+# Format reports across a pool of worker processes, yielding them in the same order as render_reports
+# The parent loads the data once and hands it to each worker when it starts (inherited without copying where
+# processes are forked); users are split into contiguous shards and executor.map returns the shards in order
+def render_reports_parallel(role, rows, output_format, workers):
+    get_all_subjects()
+    if role == "student":
+        get_rank_index()
+    loaded = {key: value for key, value in _loaded.items() if key not in ("storage", "engine")}
+    shard_size = max(1, -(-len(rows) // (workers * 8)))
+    shards = [rows[i:i + shard_size] for i in range(0, len(rows), shard_size)]
+    with ProcessPoolExecutor(workers, initializer=share_loaded, initargs=(loaded,)) as executor:
+        for texts in executor.map(render_report_shard, repeat(role), shards, repeat(output_format)):
+            yield from texts
+
+# Write the reports of the chosen students or teachers (every one when no GRNs or names are given) in one streaming pass
+# JSON output is one array with a report per element, CSV output has one header row, and table output is
+# the menus' grid tables one after another; with workers > 1 the reports are formatted by a process pool
+# and the output is byte for byte the same as with one worker
+# The data is loaded once; returns the number of reports written
+def write_reports(role, file, output_format="csv", grns=None, names=None, workers=1):
+    users_data = get_users_data()
+    rows = select_report_rows(role, users_data, grns, names)
+    if workers > 1:
+        texts = render_reports_parallel(role, rows, output_format, workers)
+    else:
+        texts = render_reports(role, rows, output_format)
+    if output_format == "csv":
+        tests = max((len(scores) for data in get_all_subjects().values() for scores in data.values()), default=0)
+        file.write(csv_text([REPORT_COLUMNS[role] + [f"test{i + 1}" for i in range(tests)]]))
+    separator = "[\n" if output_format == "json" else ""
+    for text in texts:
+        file.write(separator + text)
+        if output_format == "json":
+            separator = ",\n"
+    if output_format == "json":
+        file.write("[]\n" if separator == "[\n" else "\n]\n")
+    return len(rows)
+
+# Rows of the students or teachers to report on, in users.csv order when every one is reported
+# Raises KeyError for a GRN or name that is not a user of the given role
+def select_report_rows(role, users_data, grns=None, names=None):
+    if not grns and not names:
+        return [row for row in users_data if bool(row["grn"]) == (role == "student")]
+    rows = []
+    for key in grns or names:
+        row = users_data.by_grn.get(key) if grns else users_data.by_name.get(key)
+        if row is None or bool(row["grn"]) != (role == "student"):
+            raise KeyError(key)
+        rows.append(row)
+    return rows
+
+# Check an email and password against passwords.csv, like login() does
+# Returns the user's name and email domain, or None if either is wrong
+def authenticate(email, password):
+    credential = get_credentials().get(email)
+    if credential is None or not verify_password(password, credential["password"]):
+        return None
+    return credential["name"], credential["email"].split("@")[1]
+
+# HTTP/JSON API serving the menu views from one warm in-memory copy of the data
+# POST /login with {"email", "password"} returns a bearer token; every other endpoint needs
+# "Authorization: Bearer <token>" from a user whose email domain matches the endpoint's role
+# Tokens expire SMS_SESSION_SECONDS (default 8 hours) after login, or at POST /logout
+# Request bodies over API_MAX_BODY bytes are refused, since the only body the API reads is a login
+API_SESSIONS = {}
+API_SESSION_SECONDS = float(os.environ.get("SMS_SESSION_SECONDS", 8 * 3600))
+API_MAX_BODY = 64 * 1024
+
+# Views shared by every request are computed once and cached next to the data they come from
+def get_teacher_averages():
+    return lazy("teacher_averages", lambda: calculate_teacher_averages(get_users_data(), get_all_subjects(), get_students(), get_engine()))
+
+def get_class(subject):
+    return lazy(f"{subject}_class", lambda: prepare_teacher_data(subject, get_subject(subject), get_users_data()))
+
+# Admin: students' names, averages and ranks overall or in ?subject=, best first; ?offset= and ?limit= select a page
+# Pages are sliced out of the rank index, so nothing is sorted per request
+def api_student_rankings(name, query, match):
+    rank_index, users_data = get_rank_index(), get_users_data()
+    subject = query.get("subject")
+    total = rank_index.total(subject)
+    offset = int(query.get("offset", 0))
+    limit = int(query.get("limit", total))
+    students = [{"name": users_data.by_grn[student["grn"]]["name"], **student} for student in rank_index.rank_range(offset + 1, offset + limit, subject)]
+    return {"total": total, "students": students}
+
+# Admin: the averages at the quantiles in ?q= (comma separated, default quartiles) overall or in ?subject=
+def api_student_quantiles(name, query, match):
+    rank_index = get_rank_index()
+    quantiles = [float(q) for q in query.get("q", "0.25,0.5,0.75").split(",")]
+    if not all(0 <= q <= 1 for q in quantiles):
+        raise ValueError(quantiles)
+    return {"quantiles": {str(q): rank_index.quantile(q, query.get("subject")) for q in quantiles}}
+
+# Admin: every teacher's subject average and subject statistics
+def api_teacher_averages(name, query, match):
+    return {"teachers": get_teacher_averages()}
+
+# The signed-in teacher's subject; a teacher with no subject assigned has no class to show
+# Raises PermissionError, which the API answers with a 403
+def api_teacher_subject(name):
+    subject = get_teacher_subject(name, get_users_data())
+    if subject is None:
+        raise PermissionError("no subject is assigned to you")
+    return subject
+
+# Teacher: the class table, class average and ranks of the teacher's subject, best first
+def api_class(name, query, match):
+    subject = api_teacher_subject(name)
+    student_averages, sorted_averages = get_class(subject)
+    return {"subject": subject, "average": calculate_class_average(student_averages), "students": sorted_averages}
+
+# Teacher: one student of the class
+def api_class_student(name, query, match):
+    student_averages, sorted_averages = get_class(api_teacher_subject(name))
+    for student in sorted_averages:
+        if student["grn"] == match["grn"]:
+            return {**student, "total_students": len(sorted_averages)}
+    raise LookupError(match["grn"])
+
+# Student: the same report the report subcommand writes, trimmed to what each menu option shows
+def api_student_report(name):
+    return student_report(get_student_row(name, get_users_data()), get_all_subjects(), get_students(), get_rank_index())
+
+def api_courses(name, query, match):
+    return {"courses": [sub["subject"] for sub in api_student_report(name)["subjects"]]}
+
+def api_averages(name, query, match):
+    report = api_student_report(name)
+    return {"averages": {sub["subject"]: sub["average"] for sub in report["subjects"]}, "overall": report["average"]}
+
+def api_scores(name, query, match):
+    report = api_student_report(name)
+    return {"scores": {sub["subject"]: {"scores": sub["scores"], "average": sub["average"]} for sub in report["subjects"]}}
+
+# Student: their averages and overall rank in every term
+def api_trend(name, query, match):
+    return {"terms": student_trend(get_student_row(name, get_users_data())["grn"])}
+
+# Admin: the cohort statistics of every term, of the overall averages or of ?subject=
+def api_cohorts(name, query, match):
+    return {"terms": cohort_averages(query.get("subject"))}
+
+def api_ranks(name, query, match):
+    report = api_student_report(name)
+    return {"ranks": [{key: sub[key] for key in ["subject", "rank", "total_students", "percentile"]} for sub in report["subjects"]],
+            "overall": {key: report[key] for key in ["rank", "total_students", "percentile"]}}
+
+# (method, path pattern, email domain allowed, handler)
+API_ROUTES = [
+    ("GET", re.compile(r"/students/rankings"), "admin.edu", api_student_rankings),
+    ("GET", re.compile(r"/students/quantiles"), "admin.edu", api_student_quantiles),
+    ("GET", re.compile(r"/teachers/averages"), "admin.edu", api_teacher_averages),
+    ("GET", re.compile(r"/terms/cohorts"), "admin.edu", api_cohorts),
+    ("GET", re.compile(r"/class"), "teacher.edu", api_class),
+    ("GET", re.compile(r"/class/(?P<grn>\d+)"), "teacher.edu", api_class_student),
+    ("GET", re.compile(r"/me/courses"), "student.edu", api_courses),
+    ("GET", re.compile(r"/me/averages"), "student.edu", api_averages),
+    ("GET", re.compile(r"/me/scores"), "student.edu", api_scores),
+    ("GET", re.compile(r"/me/ranks"), "student.edu", api_ranks),
+    ("GET", re.compile(r"/me/trend"), "student.edu", api_trend),
+]
+
+# Log in or out, or find the route for a request and run it for the signed-in user
+# Returns the HTTP status and the JSON body
+async def dispatch_api(method, target, headers, body):
+    path, _, query_string = target.partition("?")
+    query = dict(parse_qsl(query_string))
+    if (method, path) == ("POST", "/login"):
+        try:
+            credentials = json.loads(body)
+            email, password = credentials["email"], credentials["password"]
+        except (ValueError, KeyError, TypeError):
+            return 400, {"error": "send a JSON object with email and password"}
+        # Password hashing takes a while, so it runs in a thread instead of blocking every other request
+        user = await asyncio.get_running_loop().run_in_executor(None, authenticate, email, password)
+        if user is None:
+            return 401, {"error": "invalid email or password"}
+        now = time.monotonic()
+        # Expired sessions that were never used again are dropped here, so the table does not grow without bound
+        for token in [token for token, (_, expires) in API_SESSIONS.items() if expires <= now]:
+            del API_SESSIONS[token]
+        token = secrets.token_urlsafe(32)
+        API_SESSIONS[token] = (user, now + API_SESSION_SECONDS)
+        return 200, {"token": token, "name": user[0], "role": user[1], "expires_in": API_SESSION_SECONDS}
+    token = headers.get("authorization", "").removeprefix("Bearer ")
+    user, expires = API_SESSIONS.get(token, (None, 0))
+    if expires <= time.monotonic():
+        API_SESSIONS.pop(token, None)
+        return 401, {"error": "log in first and send Authorization: Bearer <token>"}
+    if (method, path) == ("POST", "/logout"):
+        del API_SESSIONS[token]
+        return 200, {}
+    for route_method, pattern, domain, handler in API_ROUTES:
+        match = pattern.fullmatch(path)
+        if match and route_method == method:
+            if user[1] != domain:
+                return 403, {"error": "not available to your role"}
+            try:
+                return 200, handler(user[0], query, match)
+            except PermissionError as error:
+                return 403, {"error": str(error)}
+            except LookupError:
+                return 404, {"error": "not found"}
+            except ValueError:
+                return 400, {"error": "invalid query"}
+    return 404, {"error": "not found"}
+
+# Serve HTTP/1.1 requests on one connection until the client closes it (keep-alive is the default)
+# A missing or malformed Content-Length, or a body over API_MAX_BODY, is answered and the connection closed,
+# since the rest of the stream can no longer be split into requests
+# An unexpected error in a request is logged and answered with a 500, keeping the server and the connection up
+async def handle_api_connection(reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, target, version = request_line.decode("latin-1").split()
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+            close = version == "HTTP/1.0" or headers.get("connection", "").lower() == "close"
+            length = headers.get("content-length", "0")
+            if not (length.isascii() and length.isdigit()):
+                status, payload, close = 400, {"error": "invalid Content-Length"}, True
+            elif int(length) > API_MAX_BODY:
+                status, payload, close = 413, {"error": f"request bodies are limited to {API_MAX_BODY} bytes"}, True
+            else:
+                body = await reader.readexactly(int(length))
+                try:
+                    status, payload = await dispatch_api(method, target, headers, body)
+                except Exception:
+                    traceback.print_exc()
+                    status, payload = 500, {"error": "internal error"}
+            data = json.dumps(payload).encode()
+            head = f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+            if close:
+                head += "Connection: close\r\n"
+            writer.write(f"{head}\r\n".encode() + data)
+            await writer.drain()
+            if close:
+                break
+    except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+# Load and index every file before accepting connections, so no request pays for a cold load
+def warm_api_data():
+    get_credentials()
+    get_rank_index()
+    get_teacher_averages()
+    for subject in get_subjects():
+        get_class(subject)
+
+async def run_api_server(host, port):
+    server = await asyncio.start_server(handle_api_connection, host, port, backlog=1024)
+    print(f"Serving the API on http://{host}:{server.sockets[0].getsockname()[1]}", flush=True)
+    watcher = asyncio.create_task(watch_data(float(os.environ.get("SMS_WATCH_INTERVAL", "1"))))
+    async with server:
+        try:
+            await server.serve_forever()
+        finally:
+            watcher.cancel()
+
+# Pick up outside edits to the data files every interval seconds while the server runs
+# Runs on the event loop between requests, so a request never sees data half updated
+async def watch_data(interval):
+    while True:
+        await asyncio.sleep(interval)
+        refresh_data()
+
+# Start the API server after finishing any interrupted write and warming the data
+def serve(host="127.0.0.1", port=8000):
+    get_storage().recover()
+    warm_api_data()
+    asyncio.run(run_api_server(host, port))
+
 # Main program handling login and menu navigation
 def main():
+    if get_storage().recover():
+        print("Finished a data write that was interrupted last time")
     try:
         name, domain = login()
         launch_menu(name, domain)
@@ -583,6 +3051,92 @@ def main():
         print("\nExiting...")
         sys.exit()
 
-# Calling the main function 
+# Command-line interface; with no subcommand the interactive menus are started after a login
+def build_parser():
+    parser = argparse.ArgumentParser(prog="project.py", description="Student Management System")
+    parser.add_argument("--profile", metavar="FILE", help="write a JSON timing summary (or a cProfile dump, for a .prof file) at exit")
+    parser.add_argument("--profile-memory", action="store_true", help="also trace the bytes each instrumented function allocates")
+    parser.add_argument("--average", choices=["mean", "weighted"], help="average the tests' percentages (mean, the default) or total marks over total max marks (weighted)")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("migrate-passwords", help="hash every plain password in passwords.csv")
+    commands.add_parser("import-roster", help="create student accounts from a roster CSV").add_argument("roster")
+    commands.add_parser("csv-to-sqlite", help="copy the CSV files into a SQLite database").add_argument("database")
+    commands.add_parser("sqlite-to-csv", help="write a SQLite database back out as CSV files").add_argument("database")
+    report = commands.add_parser("report", help="write score reports without logging in")
+    report.add_argument("--role", choices=["student", "teacher"], required=True)
+    selection = report.add_mutually_exclusive_group(required=True)
+    selection.add_argument("--all", action="store_true", help="report on every student or teacher")
+    selection.add_argument("--grn", action="append", help="report on the student with this GRN (repeatable)")
+    selection.add_argument("--name", action="append", help="report on the user with this name (repeatable)")
+    report.add_argument("--format", choices=["csv", "json", "table"], default="csv")
+    report.add_argument("--output", help="file to write to instead of standard output")
+    report.add_argument("--workers", type=int, default=1, help="number of processes formatting reports (default 1)")
+    commands.add_parser("close-term", help="archive the current scores as a past term and start a new one").add_argument("term")
+    terms = commands.add_parser("terms", help="print cohort averages per term, or one student's trend over the terms")
+    terms.add_argument("--subject", help="cohort averages of this subject instead of overall")
+    terms.add_argument("--grn", help="print this student's averages in every term instead")
+    api = commands.add_parser("serve", help="serve the menu views as an HTTP/JSON API")
+    api.add_argument("--host", default="127.0.0.1")
+    api.add_argument("--port", type=int, default=8000)
+    return parser
+
+# Write the requested reports and print the throughput to standard error, so it never mixes with the report itself
+def run_report(args):
+    get_storage().recover()
+    start = time.perf_counter()
+    try:
+        if args.output:
+            with open(args.output, "w", newline='') as file:
+                count = write_reports(args.role, file, args.format, args.grn, args.name, args.workers)
+        else:
+            count = write_reports(args.role, sys.stdout, args.format, args.grn, args.name, args.workers)
+    except KeyError as error:
+        sys.exit(f"No {args.role} found for {error.args[0]}")
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {count} {args.role} reports in {elapsed:.2f}s ({count / elapsed:.0f} reports/s)", file=sys.stderr)
+
+# Calling the main function, or one of the command-line tools:
+# python project.py migrate-passwords
+# python project.py import-roster <roster.csv>
+# python project.py csv-to-sqlite <school.db>
+# python project.py sqlite-to-csv <school.db>
+# python project.py report --role student|teacher --all|--grn <grn>|--name <name> [--format csv|json|table] [--output <file>] [--workers <n>]
+# python project.py close-term <term>
+# python project.py terms [--subject <subject>] [--grn <grn>]
+# python project.py serve [--host <host>] [--port <port>]
+# Any of them can be profiled with python project.py --profile <file> [--profile-memory] ... or SMS_PROFILE=<file>
+# and can use weighted averages with python project.py --average weighted ... or SMS_AVERAGE=weighted
 if __name__ == "__main__":
-    main()
+    args = build_parser().parse_args()
+    if args.average:
+        AVERAGE_MODE = args.average
+    profile_file = args.profile or os.environ.get("SMS_PROFILE")
+    if profile_file:
+        start_profiling(profile_file, args.profile_memory or os.environ.get("SMS_PROFILE_MEMORY") == "1")
+    match args.command:
+        case "migrate-passwords":
+            print(f"Hashed {migrate_passwords()} passwords")
+        case "import-roster":
+            print(f"Created {len(create_student_accounts(read_roster(args.roster)))} student accounts")
+        case "csv-to-sqlite":
+            csv_to_sqlite(args.database)
+            print(f"Copied the CSV files into {args.database}")
+        case "sqlite-to-csv":
+            sqlite_to_csv(args.database)
+            print(f"Wrote the CSV files from {args.database}")
+        case "report":
+            run_report(args)
+        case "close-term":
+            try:
+                summary = close_term(args.term)
+            except ValueError as error:
+                sys.exit(f"Could not close the term: {error}")
+            print(f"Closed {args.term} with {summary['cohort']['overall']['count']} students")
+        case "terms":
+            rows = student_trend(args.grn) if args.grn else cohort_averages(args.subject)
+            json.dump(rows, sys.stdout, indent=2)
+            print()
+        case "serve":
+            serve(args.host, args.port)
+        case _:
+            main()
@@ -0,0 +1,153 @@
+import json
+import os
+import platform
+import random
+import time
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import project
+from benchmark import generate_school
+
+# Performance benchmarks for the load and calculate paths, run with pytest-benchmark on generated schools
+# SMS_BENCH_SIZES picks the school sizes (default 1000; SMS_BENCH_SIZES=1000,100000,1000000 for the full set)
+# Each benchmark's fastest round is divided by the fastest run of a fixed pure-Python workload timed right after it,
+# so a machine that is busy or throttled for the whole run does not look like a regression
+# That ratio is compared with the baseline stored for this machine in benchmark_baselines.json,
+# and the benchmark fails when it is more than SMS_BENCH_THRESHOLD slower (default 1.0, i.e. twice as slow;
+# on a shared single-core machine identical runs still varied by up to 60% after the normalization)
+# Run with SMS_BENCH_SAVE=1 to record this machine's ratios as the new baselines
+SIZES = [int(size) for size in os.environ.get("SMS_BENCH_SIZES", "1000").split(",")]
+THRESHOLD = float(os.environ.get("SMS_BENCH_THRESHOLD", "1.0"))
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baselines.json")
+MACHINE = f"{platform.system()}-{platform.machine()}-{platform.python_implementation()}-{'.'.join(platform.python_version_tuple()[:2])}-{os.cpu_count()}cpu"
+ENGINES = ["python", pytest.param("numpy", marks=pytest.mark.skipif(project.np is None, reason="NumPy is not installed"))]
+
+# Ratios measured in this run, saved at the end of the module when SMS_BENCH_SAVE=1
+measured = {}
+
+# Fastest of several runs of a fixed workload mixing the dictionary, float and sorting work the benchmarks do
+def reference_time(runs=20):
+    rng = random.Random(50)
+    values = {str(i): rng.random() for i in range(20_000)}
+    fastest = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        sorted(values.items(), key=lambda item: item[1])
+        sum(value * 100 for value in values.values())
+        fastest = min(fastest, time.perf_counter() - start)
+    return fastest
+
+def load_baselines():
+    try:
+        with open(BASELINE_FILE) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+@pytest.fixture(scope="module", autouse=True)
+def save_baselines():
+    yield
+    if os.environ.get("SMS_BENCH_SAVE") == "1" and measured:
+        baselines = load_baselines()
+        baselines.setdefault(MACHINE, {}).update(measured)
+        with open(BASELINE_FILE, "w") as file:
+            json.dump(baselines, file, indent=2, sort_keys=True)
+            file.write("\n")
+
+# Fail a benchmark whose median regressed past the threshold against this machine's baseline
+@pytest.fixture
+def check_baseline(benchmark, request):
+    yield
+    if benchmark.disabled or benchmark.stats is None:
+        return
+    ratio = benchmark.stats.stats.min / reference_time()
+    measured[request.node.name] = ratio
+    baseline = load_baselines().get(MACHINE, {}).get(request.node.name)
+    if baseline is not None and os.environ.get("SMS_BENCH_SAVE") != "1" and ratio > baseline * (1 + THRESHOLD):
+        pytest.fail(f"{request.node.name} took {ratio:.3f}x the reference workload, over {THRESHOLD:.0%} slower than the baseline {baseline:.3f}x")
+
+# A generated school per size, with its files and everything loaded from them
+@pytest.fixture(scope="module", params=SIZES, ids=lambda size: f"{size}")
+def school(request, tmp_path_factory):
+    directory = tmp_path_factory.mktemp(f"school_{request.param}")
+    generate_school(str(directory), request.param)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(directory)
+        monkeypatch.setattr(project, "_loaded", {})
+        users_data = project.load_users_data()
+        subject_data = project.load_all_subjects(users_data.subjects)
+        students = project.load_students(subject_data, users_data)
+        yield {
+            "users_data": users_data,
+            "subject_data": subject_data,
+            "students": students,
+            "rank_index": project.RankIndex(users_data, students),
+            "engine": project.load_score_engine(users_data, subject_data) if project.np is not None else None,
+            "student": next(row for row in users_data if row["grn"]),
+        }
+
+# Drop every cached average so each round measures the calculation rather than the cache
+def cold(students, *args):
+    for student in students.values():
+        student.invalidate()
+    return args, {}
+
+def test_load_users_data(benchmark, check_baseline, school):
+    benchmark(project.load_users_data)
+
+def test_load_passwords(benchmark, check_baseline, school):
+    benchmark(project.load_passwords)
+
+def test_load_subject(benchmark, check_baseline, school):
+    benchmark(project.load_subject, "math.csv")
+
+def test_load_subject_cached(benchmark, check_baseline, school):
+    project.load_subject_cached("math.csv")
+    benchmark(project.load_subject_cached, "math.csv")
+
+def test_stream_subject_averages(benchmark, check_baseline, school):
+    benchmark(project.stream_subject_averages, "math.csv")
+
+def test_load_students(benchmark, check_baseline, school):
+    benchmark(project.load_students, school["subject_data"], school["users_data"])
+
+def test_rank_index(benchmark, check_baseline, school):
+    benchmark(project.RankIndex, school["users_data"], school["students"])
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_calculate_student_rankings(benchmark, check_baseline, school, engine):
+    args = (school["users_data"], school["students"], school["engine"] if engine == "numpy" else None)
+    benchmark.pedantic(project.calculate_student_rankings, setup=lambda: cold(school["students"], *args), rounds=5, warmup_rounds=1)
+
+def test_calculate_student_rankings_top_10(benchmark, check_baseline, school):
+    benchmark(project.calculate_student_rankings, school["users_data"], school["students"], None, 10)
+
+@pytest.mark.parametrize("indexed", [False, True], ids=["scan", "rank_index"])
+def test_calculate_overall_rank(benchmark, check_baseline, school, indexed):
+    benchmark(project.calculate_overall_rank, school["student"], school["students"], school["rank_index"] if indexed else None)
+
+@pytest.mark.parametrize("indexed", [False, True], ids=["scan", "rank_index"])
+def test_calculate_student_ranks_in_subjects(benchmark, check_baseline, school, indexed):
+    row = school["student"]
+    benchmark(project.calculate_student_ranks_in_subjects, row, project.get_enrolled_subjects(row),
+              school["users_data"], school["students"], school["rank_index"] if indexed else None)
+
+def test_prepare_teacher_data(benchmark, check_baseline, school):
+    benchmark(project.prepare_teacher_data, "math", school["subject_data"]["math"], school["users_data"])
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_calculate_subject_statistics(benchmark, check_baseline, school, engine):
+    args = (school["subject_data"], school["students"], school["engine"] if engine == "numpy" else None)
+    benchmark.pedantic(project.calculate_subject_statistics, setup=lambda: cold(school["students"], *args), rounds=5, warmup_rounds=1)
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_calculate_teacher_averages(benchmark, check_baseline, school, engine):
+    args = (school["users_data"], school["subject_data"], school["students"], school["engine"] if engine == "numpy" else None)
+    benchmark.pedantic(project.calculate_teacher_averages, setup=lambda: cold(school["students"], *args), rounds=5, warmup_rounds=1)
+
+@pytest.mark.skipif(project.np is None, reason="NumPy is not installed")
+def test_load_score_engine(benchmark, check_baseline, school):
+    benchmark(project.load_score_engine, school["users_data"], school["subject_data"])
@@ -1,10 +1,28 @@
+import os
+import subprocess
+import sys
+
 import pytest
+from benchmark import http_request
 from project import (calculate_student_rankings,
     calculate_teacher_averages,
+    calculate_subject_statistics,
     calculate_class_average,
     calculate_student_ranks_in_subjects,
     calculate_overall_rank,
-    Student)
+    RankIndex,
+    UserDirectory,
+    get_student_row,
+    get_teacher_subject,
+    Student,
+    hash_password,
+    verify_password,
+    migrate_passwords,
+    iter_subject,
+    load_subject,
+    load_subject_cached,
+    scores_average,
+    stream_subject_averages)
 
 def test_calculate_student_rankings():
     # Tests student ranking calculation with sample data
@@ -24,6 +42,25 @@ def test_calculate_class_average():
     class_avg = calculate_class_average(student_averages)
     assert class_avg == 85.0
 
+def test_subject_statistics_and_empty_class():
+    # Checks the per-subject statistics shared by every teacher, and that an empty class averages to 0
+    users_data = [
+        {"grn": "1", "name": "A", "math": "1", "phy": "0"},
+        {"grn": "2", "name": "B", "math": "1", "phy": "0"},
+        {"grn": "3", "name": "C", "math": "1", "phy": "0"},
+        {"grn": "", "name": "Teacher A", "math": "1", "phy": "0"},
+        {"grn": "", "name": "Teacher B", "math": "1", "phy": "0"},
+        {"grn": "", "name": "Teacher C", "math": "0", "phy": "1"},
+    ]
+    subject_data = {"math": {"1": [80, 90], "2": [60], "3": [70, None]}, "phy": {}}
+    students = {grn: Student(math=scores) for grn, scores in subject_data["math"].items()}
+    statistics = calculate_subject_statistics(subject_data, students)
+    assert statistics["math"] == {"count": 3, "mean": 215 / 3, "min": 60.0, "max": 85.0, "stddev": pytest.approx(10.27, abs=0.01), "median": 70.0}
+    teachers = calculate_teacher_averages(users_data, subject_data, students)
+    assert [(teacher["name"], teacher["average"]) for teacher in teachers] == [("Teacher A", 215 / 3), ("Teacher B", 215 / 3), ("Teacher C", 0)]
+    assert teachers[0]["statistics"] is teachers[1]["statistics"]
+    assert calculate_class_average([]) == 0
+
 def test_calculate_overall_rank():
     # Tests overall rank calculation for a student
     student_row = {"grn": "1"}
@@ -39,15 +76,744 @@ def test_calculate_overall_rank():
 def test_student_average_calculation():
     # Tests Student class average calculation methods
     student = Student(math=[80, 90, None], phy=[70, 80, 90])
-    assert student.math_average() == 85.0
-    assert student.phy_average() == 80.0
+    assert student.average("math") == 85.0
+    assert student.average("phy") == 80.0
     assert student.average() == 82.5
 
 def test_student_empty_scores():
     # Checks that averages for students who are not enrolled in a subject or
     # have no scores entered yet default to 0
     student = Student(math=[None, None], phy=[])
-    assert student.math_average() == 0
-    assert student.phy_average() == 0
+    assert student.average("math") == 0
+    assert student.average("phy") == 0
     assert student.average() == 0
 
+
+def test_rank_index_matches_linear_ranks():
+    # Checks that binary-search ranks agree with the linear scan, including ties
+    users_data = [
+        {"grn": "1", "name": "A", "math": "1", "phy": "0", "chem": "0", "bio": "0", "cs": "0"},
+        {"grn": "2", "name": "B", "math": "1", "phy": "1", "chem": "0", "bio": "0", "cs": "0"},
+        {"grn": "3", "name": "C", "math": "1", "phy": "0", "chem": "0", "bio": "0", "cs": "0"},
+    ]
+    students = {
+        "1": Student(math=[80, 90]),
+        "2": Student(math=[90, 80], phy=[60]),
+        "3": Student(math=[70, 80]),
+    }
+    rank_index = RankIndex(users_data, students)
+    for user in users_data:
+        enrolled = ["math"] if user["phy"] == "0" else ["math", "phy"]
+        assert calculate_overall_rank(user, students, rank_index) == calculate_overall_rank(user, students)
+        assert (calculate_student_ranks_in_subjects(user, enrolled, users_data, students, rank_index)
+                == calculate_student_ranks_in_subjects(user, enrolled, users_data, students))
+    # Students 1 and 2 tie in math, so both are ranked 1st
+    assert rank_index.rank(85.0, "math") == 1
+    assert rank_index.rank(75.0, "math") == 3
+
+def test_rank_index_update():
+    # Checks that re-indexing a student after a score change moves their rank
+    users_data = [{"grn": "1", "name": "A", "math": "1"}, {"grn": "2", "name": "B", "math": "1"}]
+    students = {"1": Student(math=[50]), "2": Student(math=[60])}
+    rank_index = RankIndex(users_data, students)
+    assert calculate_overall_rank({"grn": "1"}, students, rank_index) == 2
+    students["1"] = Student(math=[70])
+    rank_index.update("1", students["1"])
+    assert calculate_overall_rank({"grn": "1"}, students, rank_index) == 1
+    assert calculate_student_ranks_in_subjects({"grn": "2"}, ["math"], users_data, students, rank_index)[0]["rank"] == 2
+    assert rank_index.total() == 2
+
+def test_rank_index_batch_update_matches_rebuild():
+    # Checks that moving a few or many students at once leaves the same sorted lists as building the index again
+    users_data = [{"grn": str(grn), "name": f"S{grn}", "math": "1"} for grn in range(100)]
+    students = {str(grn): Student(math=[grn % 7 * 10 + 10]) for grn in range(100)}
+    rank_index = RankIndex(users_data, students)
+    for changed in [["3", "50"], [str(grn) for grn in range(0, 100, 3)]]:
+        for grn in changed:
+            students[grn].set_scores("math", [int(grn) % 5 * 20 + 5])
+        rank_index.update_many({grn: students[grn] for grn in changed})
+        rebuilt = RankIndex(users_data, students)
+        for ordered, expected in [(rank_index.overall, rebuilt.overall), (rank_index.subjects["math"], rebuilt.subjects["math"])]:
+            assert list(ordered) == list(expected)
+
+def test_ordered_averages_blocks(monkeypatch):
+    # Checks that inserts and removes across many small blocks keep the same order and answers as a sorted list
+    import random
+    import project
+    monkeypatch.setattr(project.OrderedAverages, "BLOCK", 4)
+    rng = random.Random(7)
+    pairs = [(rng.randrange(10) * 10.0, position) for position in range(60)]
+    ordered = project.OrderedAverages(pairs[:20])
+    for pair in pairs[20:]:
+        ordered.insert(*pair)
+    for pair in pairs[::3]:
+        ordered.remove(*pair)
+    expected = sorted(set(pairs) - set(pairs[::3]), key=lambda pair: (pair[0], -pair[1]))
+    values = [average for average, position in expected]
+    assert list(ordered) == expected and len(ordered) == len(expected)
+    assert ordered.places(0, len(expected)) == expected[::-1]
+    assert ordered.places(5, 12) == expected[::-1][5:12]
+    for average in [0.0, 35.0, 50.0, 90.0, 100.0]:
+        assert ordered.rank(average) == 1 + sum(value > average for value in values)
+        assert ordered.percentile(average) == (sum(value < average for value in values) + sum(value == average for value in values) / 2) / len(values) * 100
+    assert [ordered.quantile(q) for q in [0, 1]] == [values[0], values[-1]]
+
+def test_rank_index_order_statistics():
+    # Checks top-K, rank-range, percentile and quantile queries against a full sort, before and after a score change
+    users_data = [{"grn": str(grn), "name": f"S{grn}", "math": "1"} for grn in range(1, 9)]
+    scores = [70, 90, 80, 90, 60, 100, 80, 50]
+    students = {str(grn): Student(math=[score]) for grn, score in zip(range(1, 9), scores)}
+    rank_index = RankIndex(users_data, students)
+    assert [student["name"] for student in calculate_student_rankings(users_data, students)] == ["S6", "S2", "S4", "S3", "S7", "S1", "S5", "S8"]
+    assert [(s["grn"], s["rank"]) for s in rank_index.top(4)] == [("6", 1), ("2", 2), ("4", 2), ("3", 4)]
+    assert [s["grn"] for s in rank_index.rank_range(3, 5, "math")] == ["4", "3", "7"]
+    assert rank_index.rank_range(8, 20) == [{"grn": "8", "average": 50.0, "rank": 8}]
+    assert calculate_student_rankings(users_data, students, limit=3) == calculate_student_rankings(users_data, students)[:3]
+    assert rank_index.percentile(80.0) == 50.0
+    assert rank_index.quantile(0) == 50.0 and rank_index.quantile(1) == 100.0
+    assert rank_index.quantile(0.5, "math") == 80.0
+    students["8"] = Student(math=[95])
+    rank_index.update("8", students["8"])
+    assert [s["grn"] for s in rank_index.top(3)] == ["6", "8", "2"]
+    assert rank_index.percentile(100.0) == 100 - 100 / 16
+
+def test_student_set_scores_invalidates_cache():
+    # Checks that cached averages are recomputed after a subject's scores change
+    student = Student(math=[80, 90], phy=[70, None])
+    assert student.average() == 77.5
+    student.set_scores("math", [100, None, 90])
+    assert student.average("math") == 95.0
+    assert student.average("phy") == 70.0
+    assert student.average() == 82.5
+    assert list(student.scores("phy"))[0] == 70.0
+    assert len(student.scores("math")) == 3
+
+def test_exact_averages_and_weighted_mode(monkeypatch):
+    # Checks that equal averages tie whatever order the marks come in, and that the weighted mode divides total marks
+    import project
+    students = {
+        "1": Student(math=[(1, 10), (2, 10), (7, 10), (1, 3), (2, 3)]),
+        "2": Student(math=[(2, 3), (1, 3), (7, 10), (2, 10), (1, 10)]),
+        "3": Student(math=[(1, 5)]),
+    }
+    assert students["1"].average() == students["2"].average() == 40.0
+    assert calculate_overall_rank({"grn": "2"}, students) == 1
+    assert students["1"].marks("math")[3] == (1, 3) and students["3"].scores("math")[0] == 20.0
+    monkeypatch.setattr(project, "AVERAGE_MODE", "weighted")
+    student = Student(math=[(10, 20), (100, 100), None], phy=[(0, 50), (3, 4)])
+    assert student.average("math") == 11000 / 120
+    assert student.average() == 250 / 3
+    if project.np is not None:
+        users_data = [{"grn": "1", "name": "A", "math": "1", "phy": "1"}]
+        engine = project.load_score_engine(users_data, {"math": {"1": student.marks("math")}, "phy": {"1": student.marks("phy")}})
+        assert engine.overall[0] == student.average() and engine.subject_averages["math"][0] == student.average("math")
+
+def test_numpy_engine_matches_python_backend():
+    # Checks that the vectorized backend returns exactly the same results as the pure-Python one
+    pytest.importorskip("numpy")
+    import project
+    subjects = project.get_all_subjects()
+    engine = project.load_score_engine(project.users_data, subjects)
+    users_data, students = project.users_data, project.students
+    assert calculate_student_rankings(users_data, students, engine) == calculate_student_rankings(users_data, students)
+    assert (calculate_teacher_averages(users_data, subjects, students, engine)
+            == calculate_teacher_averages(users_data, subjects, students))
+    for user in users_data:
+        if user["grn"]:
+            enrolled = project.get_enrolled_subjects(user)
+            assert calculate_overall_rank(user, students, engine=engine) == calculate_overall_rank(user, students)
+            assert (calculate_student_ranks_in_subjects(user, enrolled, users_data, students, engine=engine)
+                    == calculate_student_ranks_in_subjects(user, enrolled, users_data, students))
+    averages = engine.matrices["math"].averages
+    assert calculate_class_average(averages) == calculate_class_average([{"average": float(avg)} for avg in averages])
+
+def test_password_hashing_and_migration(tmp_path):
+    # Checks that hashed and not-yet-migrated passwords both verify, and that migration hashes plain rows
+    stored = hash_password("teach01!", iterations=1000)
+    assert stored.startswith("pbkdf2_sha256$1000$")
+    assert verify_password("teach01!", stored)
+    assert not verify_password("teach02!", stored)
+    assert verify_password("stud01!", "stud01!")
+    filename = tmp_path / "passwords.csv"
+    filename.write_text(f"name,email,password\nA,a@student.edu,stud01!\nB,b@student.edu,{stored}\n")
+    assert migrate_passwords(filename) == 1
+    assert migrate_passwords(filename) == 0
+    rows = filename.read_text().splitlines()
+    assert rows[1].startswith("A,a@student.edu,pbkdf2_sha256$")
+    assert rows[2].endswith(stored)
+    assert verify_password("stud01!", rows[1].split(",")[2])
+
+def test_user_directory_indexes():
+    # Checks the GRN, name and subject indexes and the running max GRN
+    users_data = UserDirectory([
+        {"grn": "1230", "name": "Student A", "math": "1", "phy": "0", "chem": "0", "bio": "0", "cs": "1"},
+        {"grn": "", "name": "Teacher A", "math": "0", "phy": "0", "chem": "0", "bio": "0", "cs": "1"},
+    ])
+    users_data.add({"grn": "1235", "name": "Student B", "math": "1", "phy": "0", "chem": "0", "bio": "0", "cs": "0"})
+    assert len(users_data) == 3
+    assert users_data.max_grn == 1235
+    assert users_data.by_grn["1235"]["name"] == "Student B"
+    assert [row["grn"] for row in users_data.by_subject["math"]] == ["1230", "1235"]
+    assert [row["grn"] for row in users_data.by_subject["cs"]] == ["1230"]
+    # Subject ranks read the subject index and match a scan of the plain rows
+    students = {"1230": Student(math=[60], cs=[70]), "1235": Student(math=[80])}
+    assert (calculate_student_ranks_in_subjects(users_data.by_grn["1230"], ["math", "cs"], users_data, students)
+            == calculate_student_ranks_in_subjects(users_data.by_grn["1230"], ["math", "cs"], list(users_data), students)
+            == [{"subject": "math", "rank": 2, "total_students": 2}, {"subject": "cs", "rank": 1, "total_students": 1}])
+    assert get_student_row("Student A", users_data)["grn"] == "1230"
+    assert get_student_row("Nobody", users_data) is None
+    assert get_teacher_subject("Teacher A", users_data) == "cs"
+
+def test_subjects_discovered_from_users_header(tmp_path, monkeypatch):
+    # Checks that a subject added as a users.csv column and a <subject>.csv file works without code changes
+    import project
+    (tmp_path / "users.csv").write_text("grn,name,math,art\n1230,A,1,1\n1231,B,0,1\n,Teacher,0,1\n")
+    (tmp_path / "math.csv").write_text("grn,test1\n1230,17/20\n")
+    (tmp_path / "art.csv").write_text("grn,test1,test2\n1230,9/10,\n1231,7/10,8/10\n")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(project, "_loaded", {})
+    assert project.get_subjects() == ["math", "art"]
+    students = project.get_students()
+    assert students["1230"].average("art") == 90.0
+    assert students["1230"].average() == 87.5
+    assert students["1231"].average("math") == 0
+    assert project.get_enrolled_subjects(project.get_users_data().by_grn["1231"]) == ["art"]
+    assert project.get_teacher_subject("Teacher", project.get_users_data()) == "art"
+    [teacher] = project.calculate_teacher_averages(project.get_users_data(), project.get_all_subjects(), students)
+    assert (teacher["name"], teacher["subject"], teacher["average"]) == ("Teacher", "art", 82.5)
+    ranks, overall_rank, total = project.get_student_ranks({"grn": "1231", "name": "B", "math": "0", "art": "1"}, ["art"])
+    assert ranks == [{"subject": "art", "rank": 2, "total_students": 2}]
+    assert (overall_rank, total) == (2, 2)
+
+def test_report_cli_matches_menus(tmp_path, monkeypatch):
+    # Checks that the CSV and JSON reports agree with the ranks and averages the menus show
+    import io
+    import json
+    import project
+    monkeypatch.setattr(project, "_loaded", {})
+    buffer = io.StringIO()
+    assert project.write_reports("student", buffer, "json") == 11
+    reports = json.loads(buffer.getvalue())
+    row = project.get_users_data().by_grn["1231"]
+    subject_ranks, overall_rank, total = project.get_student_ranks(row, project.get_enrolled_subjects(row))
+    [report] = [report for report in reports if report["grn"] == "1231"]
+    assert [(sub["subject"], sub["rank"], sub["total_students"]) for sub in report["subjects"]] == [(sub["subject"], sub["rank"], sub["total_students"]) for sub in subject_ranks]
+    assert (report["rank"], report["total_students"]) == (overall_rank, total)
+    buffer = io.StringIO()
+    project.write_reports("student", buffer, "csv", grns=["1231"])
+    assert buffer.getvalue().splitlines()[-1] == f"1231,Haris Khan,overall,{report['average']:.2f},{overall_rank},{total}"
+    buffer = io.StringIO()
+    assert project.write_reports("teacher", buffer, "csv") == 5
+    assert buffer.getvalue().splitlines()[1].startswith("Ali Khan,math,1240,David Malan,93.33,1,93.33,,,")
+    with pytest.raises(KeyError):
+        project.write_reports("teacher", io.StringIO(), "csv", grns=["1231"])
+    env = {**os.environ, "PYTHONPATH": os.path.dirname(os.path.abspath(__file__))}
+    result = subprocess.run([sys.executable, os.path.abspath("project.py"), "report", "--role", "student", "--grn", "1231", "--output", str(tmp_path / "r.csv")],
+                            env=env, capture_output=True, text=True)
+    assert "reports/s" in result.stderr
+    assert (tmp_path / "r.csv").read_text().splitlines()[-1] == f"1231,Haris Khan,overall,{report['average']:.2f},{overall_rank},{total}"
+
+def test_parallel_reports_match_serial(monkeypatch):
+    # Checks that reports formatted by a process pool come out byte for byte the same as serial ones
+    import io
+    import project
+    monkeypatch.setattr(project, "_loaded", {})
+    for role in ["student", "teacher"]:
+        for output_format in ["csv", "json", "table"]:
+            serial, parallel = io.StringIO(), io.StringIO()
+            project.write_reports(role, serial, output_format)
+            project.write_reports(role, parallel, output_format, workers=2)
+            assert serial.getvalue() == parallel.getvalue()
+
+def test_score_table_matches_tabulate_grid():
+    # Checks that the streaming score table draws exactly what tabulate's grid format drew
+    tabulate = pytest.importorskip("tabulate").tabulate
+    import project
+    entries = [("Abyan Ansari", [88.0, None, 0, 91.5], 89.75), (None, [100.0], 100.0), ("Zayan Farooq ", [], 0), ("Dawood", [12345.678, float("nan")], 12345.678)]
+    table_data = [[label, *[project.format_score(score) for score in scores], f"{average:.2f}%"] for label, scores, average in entries]
+    expected = tabulate(table_data, headers=["Student Name", "Test 1", "Test 2", "Test 3", "Test 4", "Average"], tablefmt="grid")
+    assert project.scores_table("Student Name", entries) == expected
+    assert project.scores_table("Subject", []) == tabulate([], headers=["Subject", "Average"], tablefmt="grid")
+
+def test_score_table_pagination(monkeypatch, capsys):
+    # Checks that a long table asks before each further page and stops when the reader enters q
+    import project
+    prompts = []
+    monkeypatch.setattr("builtins.input", lambda prompt: prompts.append(prompt) or "q")
+    project.print_score_table("Student Name", [(f"Student {i}", [50.0], 50.0) for i in range(7)], page_rows=3)
+    output = capsys.readouterr().out
+    assert len(prompts) == 1
+    assert "Student 2 " in output and "Student 3 " not in output
+    assert output.endswith("+\n")
+
+def test_api_server_views(monkeypatch):
+    # Checks login, role checks and that the API returns the same ranks as the menus
+    import asyncio
+    import project
+    monkeypatch.setattr(project, "_loaded", {})
+    monkeypatch.setattr(project, "API_SESSIONS", {})
+
+    async def session():
+        server = await asyncio.start_server(project.handle_api_connection, "127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+        assert (await http_request(reader, writer, "POST", "/login", body=b'{"email": "haris.khan@student.edu", "password": "wrong"}'))[0] == 401
+        status, login = await http_request(reader, writer, "POST", "/login", body=b'{"email": "haris.khan@student.edu", "password": "stud02!"}')
+        assert status == 200 and login["role"] == "student.edu"
+        results = {path: await http_request(reader, writer, "GET", path, login["token"]) for path in ["/me/ranks", "/me/courses", "/students/rankings", "/nowhere"]}
+        assert (await http_request(reader, writer, "GET", "/me/ranks"))[0] == 401
+        writer.close()
+        server.close()
+        return results
+
+    results = asyncio.run(session())
+    row = project.get_users_data().by_grn["1231"]
+    subject_ranks, overall_rank, total = project.get_student_ranks(row, project.get_enrolled_subjects(row))
+    status, ranks = results["/me/ranks"]
+    rank_index = project.get_rank_index()
+    assert status == 200
+    assert ranks["ranks"] == [{**rank, "percentile": rank_index.percentile(project.get_student("1231").average(rank["subject"]), rank["subject"])} for rank in subject_ranks]
+    assert ranks["overall"] == {"rank": overall_rank, "total_students": total, "percentile": rank_index.percentile(project.get_student("1231").average())}
+    assert results["/me/courses"] == (200, {"courses": ["phy", "chem", "bio"]})
+    assert results["/students/rankings"][0] == 403
+    assert results["/nowhere"][0] == 404
+
+def test_api_server_limits_and_errors(monkeypatch):
+    # Checks URL-decoded queries, refused bodies, 500s for unexpected errors, logout and session expiry
+    import asyncio
+    import re
+    import project
+    monkeypatch.setattr(project, "_loaded", {})
+    monkeypatch.setattr(project, "API_SESSIONS", {})
+    monkeypatch.setattr(project, "API_ROUTES", [*project.API_ROUTES, ("GET", re.compile(r"/broken"), "admin.edu", lambda name, query, match: open("None.csv"))])
+
+    # Each request gets its own connection, since refused bodies close it
+    async def request(port, method, path, token=None, body=b"", headers=None):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        response = await http_request(reader, writer, method, path, token, body, headers)
+        writer.close()
+        return response
+
+    async def session():
+        server = await asyncio.start_server(project.handle_api_connection, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        body = b'{"email": "sara.khan@admin.edu", "password": "admin01!"}'
+        token = (await request(port, "POST", "/login", body=body))[1]["token"]
+        results = {
+            "quantiles": await request(port, "GET", "/students/quantiles?q=0.25%2C0.75", token),
+            "bad length": await request(port, "POST", "/login", headers={"Content-Length": "ten"}),
+            "too long": await request(port, "POST", "/login", headers={"Content-Length": project.API_MAX_BODY + 1}),
+            "broken": await request(port, "GET", "/broken", token),
+            "logout": await request(port, "POST", "/logout", token),
+            "after logout": await request(port, "GET", "/teachers/averages", token),
+        }
+        monkeypatch.setattr(project, "API_SESSION_SECONDS", 0)
+        token = (await request(port, "POST", "/login", body=body))[1]["token"]
+        results["expired"] = await request(port, "GET", "/teachers/averages", token)
+        server.close()
+        return results
+
+    results = asyncio.run(session())
+    assert results["quantiles"][0] == 200 and list(results["quantiles"][1]["quantiles"]) == ["0.25", "0.75"]
+    assert [results[key][0] for key in ["bad length", "too long", "broken", "logout", "after logout", "expired"]] == [400, 413, 500, 200, 401, 401]
+    assert project.API_SESSIONS == {}
+
+def test_api_teacher_without_subject(monkeypatch):
+    # Checks that a teacher with no subject assigned gets a 403 from the class endpoints instead of a 500
+    import asyncio
+    import project
+    monkeypatch.setattr(project, "_loaded", {})
+    monkeypatch.setattr(project, "API_SESSIONS", {})
+    teacher = dict(project.get_users_data().by_name["Ali Khan"])
+    monkeypatch.setitem(project.get_users_data().by_name, "Ali Khan", {**teacher, **{sub: "0" for sub in project.get_subjects()}})
+
+    async def session():
+        server = await asyncio.start_server(project.handle_api_connection, "127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+        _, login = await http_request(reader, writer, "POST", "/login", body=b'{"email": "ali.khan@teacher.edu", "password": "teach01!"}')
+        results = [await http_request(reader, writer, "GET", path, login["token"]) for path in ["/class", "/class/1230"]]
+        writer.close()
+        server.close()
+        return results
+
+    assert asyncio.run(session()) == [(403, {"error": "no subject is assigned to you"})] * 2
+
+def test_import_does_no_file_io(tmp_path):
+    # Checks that project can be imported from a directory without any data files
+    env = {**os.environ, "PYTHONPATH": os.path.dirname(os.path.abspath(__file__))}
+    result = subprocess.run([sys.executable, "-c", "import project; assert project._loaded == {}"], cwd=tmp_path, env=env)
+    assert result.returncode == 0
+
+def test_subjects_load_on_first_use(tmp_path, monkeypatch):
+    # Checks that asking for one subject only parses that subject's file
+    import project
+    (tmp_path / "phy.csv").write_text("grn,test1,test2\n1230,17/20,\n")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(project, "_loaded", {})
+    assert project.get_subject("phy") == {"1230": [(17, 20), None]}
+    assert [key for key in project._loaded if key != "storage"] == ["phy_data"]
+
+def test_streaming_subject_ingestion(tmp_path):
+    # Checks that streamed rows match load_subject and that streamed averages match the full averages
+    filename = tmp_path / "math.csv"
+    filename.write_text("grn,test1,test2,test3\n1230,17/20,,45/50\n\n1231,0/20,10/20\n")
+    assert list(iter_subject(filename)) == [("1230", [(17, 20), None, (45, 50)]), ("1231", [(0, 20), (10, 20), None])]
+    data = load_subject(filename)
+    assert data == {"1230": [(17, 20), None, (45, 50)], "1231": [(0, 20), (10, 20), None]}
+    assert stream_subject_averages(filename) == {grn: scores_average(scores) for grn, scores in data.items()}
+
+def test_subject_cache_rebuilt_when_csv_changes(tmp_path):
+    # Checks that the binary sidecar gives the same data and is ignored once the CSV changes
+    filename = tmp_path / "math.csv"
+    filename.write_text("grn,test1,test2\n1230,17/20,\n1231,9/10,1/3\n")
+    assert load_subject_cached(filename) == load_subject(filename)
+    assert (tmp_path / "math.csv.cache").exists()
+    assert load_subject_cached(filename) == {"1230": [(17, 20), None], "1231": [(9, 10), (1, 3)]}
+    filename.write_text("grn,test1,test2\n1230,17/20,\n1231,9/10,1/3\n1232,1/2,\n")
+    assert load_subject_cached(filename)["1232"] == [(1, 2), None]
+
+def test_bulk_student_accounts(tmp_path, monkeypatch):
+    # Checks that a roster is written to every file in one go and shows up in the loaded data
+    import project
+    (tmp_path / "users.csv").write_text("grn,name,math,phy,chem,bio,cs\n1230,Abyan Ansari,1,0,0,0,0\n")
+    (tmp_path / "passwords.csv").write_text("name,email,password\n")
+    (tmp_path / "math.csv").write_text("grn,test1,test2\n1230,17/20,18/20\n")
+    for sub in ["phy", "chem", "bio", "cs"]:
+        (tmp_path / f"{sub}.csv").write_text("grn,test1\n")
+    (tmp_path / "roster.csv").write_text("first_name,last_name,math,phy,chem,bio,cs\nSara,Ali,1,1,0,0,0\nOmar,Khan,0,1,0,0,0\n")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(project, "_loaded", {})
+    students = project.get_students()
+    created = project.create_student_accounts(project.read_roster("roster.csv"))
+    assert [(row["grn"], email) for row, email in created] == [("1231", "sara.ali@student.edu"), ("1232", "omar.khan@student.edu")]
+    assert (tmp_path / "math.csv").read_text().splitlines()[-1] == "1231,,"
+    assert (tmp_path / "phy.csv").read_text().splitlines()[1:] == ["1231,", "1232,"]
+    assert project.get_users_data().by_grn["1232"]["name"] == "Omar Khan"
+    sara, omar = (project.get_credentials()[email]["password"] for _, email in created)
+    assert sara != omar and verify_password("password123", sara) and verify_password("password123", omar)
+    assert project.get_subject("math")["1231"] == [None, None]
+    assert students["1232"].average() == 0
+    monkeypatch.setattr(project, "_loaded", {})
+    assert project.get_students().keys() == students.keys()
+
+def test_new_account_visible_without_reload(tmp_path, monkeypatch):
+    # Checks that an account created from the admin menu is usable and ranked in the same session
+    import project
+    (tmp_path / "users.csv").write_text("grn,name,math,phy,chem,bio,cs\n1230,Abyan Ansari,1,0,0,0,0\n")
+    (tmp_path / "passwords.csv").write_text("name,email,password\nAbyan Ansari,abyan.ansari@student.edu,stud01!\n")
+    (tmp_path / "math.csv").write_text("grn,test1\n1230,17/20\n")
+    for sub in ["phy", "chem", "bio", "cs"]:
+        (tmp_path / f"{sub}.csv").write_text("grn,test1\n")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(project, "_loaded", {})
+    rank_index = project.get_rank_index()
+    credentials = project.get_credentials()
+    answers = iter(["Sara", "Ali", "y", "n", "n", "n", "n"])
+    monkeypatch.setattr("builtins.input", lambda prompt: next(answers))
+    project.admin_create_student_account()
+    assert verify_password("password123", credentials["sara.ali@student.edu"]["password"])
+    assert rank_index.total() == 2
+    assert rank_index.total("math") == 2
+    assert calculate_overall_rank({"grn": "1231"}, project.get_students(), rank_index) == 2
+
+def test_journal_recovery_after_crash(tmp_path, monkeypatch):
+    # Checks that a committed write interrupted half way is finished, and an uncommitted one is dropped
+    import json
+    import project
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "users.csv").write_text("grn,name\n1230,A\n")
+    (tmp_path / "passwords.csv").write_text("name,email,password\n")
+    entries = [
+        {"file": "users.csv", "size": (tmp_path / "users.csv").stat().st_size, "data": "1231,B\r\n"},
+        {"file": "passwords.csv", "size": (tmp_path / "passwords.csv").stat().st_size, "data": "B,b@student.edu,x\r\n"},
+    ]
+    # The crash happened after users.csv got half of its new row and before passwords.csv was touched
+    with open("users.csv", "a") as file:
+        file.write("123")
+    (tmp_path / ".sms.journal").write_text(json.dumps(entries))
+    (tmp_path / ".sms.journal.tmp").write_text("[")
+    assert project.recover_journal()
+    assert (tmp_path / "users.csv").read_bytes() == b"grn,name\n1230,A\n1231,B\r\n"
+    assert (tmp_path / "passwords.csv").read_bytes().endswith(b"B,b@student.edu,x\r\n")
+    assert not (tmp_path / ".sms.journal").exists()
+    assert not (tmp_path / ".sms.journal.tmp").exists()
+    assert not project.recover_journal()
+
+def test_grn_allocation_sees_other_writers(tmp_path, monkeypatch):
+    # Checks that GRNs appended by another process after loading are not handed out again
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "users.csv").write_text("grn,name\n1230,A\n")
+    users_data = UserDirectory([{"grn": "1230", "name": "A"}])
+    users_data.offset = (tmp_path / "users.csv").stat().st_size
+    with open("users.csv", "a") as file:
+        file.write("1231,B\n,Teacher\n1232,C\n")
+    assert users_data.max_grn == 1230
+    assert users_data.refresh_max_grn() == 1232
+
+def test_sqlite_storage_round_trip(tmp_path, monkeypatch):
+    # Checks that the SQLite backend loads the same data as the CSV files and ranks like the rank index
+    import shutil
+    import project
+    for filename in ["users.csv", "passwords.csv", "math.csv", "phy.csv", "chem.csv", "bio.csv", "cs.csv"]:
+        shutil.copy(filename, tmp_path)
+    monkeypatch.chdir(tmp_path)
+    project.csv_to_sqlite("school.db")
+    storage = project.SQLiteStorage("school.db")
+    csv_storage = project.CSVStorage()
+    assert list(storage.load_users_data()) == list(csv_storage.load_users_data())
+    assert storage.load_passwords() == csv_storage.load_passwords()
+    for sub in ["math", "phy", "chem", "bio", "cs"]:
+        assert storage.load_subject(sub) == csv_storage.load_subject(sub)
+    monkeypatch.setattr(project, "_loaded", {})
+    users_data = project.get_users_data()
+    rankings = project.get_student_rankings()
+    expected_ranks = {row["grn"]: project.get_student_ranks(row, project.get_enrolled_subjects(row)) for row in users_data if row["grn"]}
+    for row in users_data:
+        if row["grn"]:
+            assert storage.student_ranks(row["grn"], project.get_enrolled_subjects(row)) == expected_ranks[row["grn"]]
+    assert [student["name"] for student in storage.student_rankings()] == [student["name"] for student in rankings]
+    assert [student["average"] for student in storage.student_rankings()] == [student["average"] for student in rankings]
+    user_rows, _, subject_tests = storage.add_students(users_data, [{"name": "Sara Ali", "email": "sara.ali@student.edu", "password": "x", "math": "1", "phy": "0", "chem": "0", "bio": "0", "cs": "0"}])
+    assert user_rows[0]["grn"] == "1241"
+    assert subject_tests == {"math": 4}
+    (tmp_path / "users.csv").unlink()
+    project.sqlite_to_csv("school.db")
+    assert (tmp_path / "users.csv").read_text().splitlines()[-1] == "1241,Sara Ali,1,0,0,0,0"
+    assert load_subject("math.csv")["1241"] == [None, None, None, None]
+
+def test_score_entry_updates_files_and_ranks(tmp_path, monkeypatch):
+    # Checks that entered scores are appended as patch rows, reload the same, and move students in the rank index
+    import project
+    (tmp_path / "users.csv").write_text("grn,name,math\n1230,A,1\n1231,B,1\n,Teacher,1\n")
+    (tmp_path / "math.csv").write_text("grn,test1\n1230,18/20\n1231,10/20\n")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(project, "_loaded", {})
+    rank_index = project.get_rank_index()
+    assert project.add_test("math") == 2
+    assert project.get_subject("math")["1231"] == [(10, 20), None]
+    assert project.record_scores("math", {"1231": {1: "20/20"}, "1230": {0: "10/20"}}) == 2
+    assert (tmp_path / "math.csv").read_text().splitlines()[-2:] == ["1231,,20/20", "1230,10/20,"]
+    assert project.get_subject("math") == load_subject("math.csv") == {"1230": [(10, 20), None], "1231": [(10, 20), (20, 20)]}
+    assert stream_subject_averages("math.csv") == {"1230": 50.0, "1231": 75.0}
+    assert [rank_index.rank(project.get_students()[grn].average()) for grn in ["1230", "1231"]] == [2, 1]
+    assert project.add_test("math") == 3
+    assert (tmp_path / "math.csv").read_text().splitlines() == ["grn,test1,test2,test3", "1230,10/20,,", "1231,10/20,20/20,"]
+    with pytest.raises(ValueError):
+        project.record_scores("math", {"1230": {3: "1/2"}})
+    with pytest.raises(ValueError):
+        project.parse_marks("21/20")
+
+def test_sqlite_score_entry(tmp_path, monkeypatch):
+    # Checks that the SQLite backend stores entered scores like the CSV files do
+    import project
+    (tmp_path / "users.csv").write_text("grn,name,math\n1230,A,1\n1231,B,1\n")
+    (tmp_path / "passwords.csv").write_text("name,email,password\n")
+    (tmp_path / "math.csv").write_text("grn,test1\n1230,18/20\n1231,10/20\n1231,12/20\n")
+    monkeypatch.chdir(tmp_path)
+    project.csv_to_sqlite("school.db")
+    storage = project.SQLiteStorage("school.db")
+    assert storage.load_subject("math") == {"1230": [(18, 20)], "1231": [(12, 20)]}
+    assert storage.add_test("math") == 2
+    storage.record_scores("math", {"1231": {1: "20/20"}, "1230": {0: "10/20"}})
+    assert storage.load_subject("math") == {"1230": [(10, 20), None], "1231": [(12, 20), (20, 20)]}
+    monkeypatch.setattr(project, "_loaded", {"storage": storage})
+    assert project.get_student_subjects("1231", ["math"]) == {"math": {"1231": [(12, 20), (20, 20)]}}
+    assert "math_data" not in project._loaded
+
+def test_sqlite_ranks_exact_ties(tmp_path, monkeypatch):
+    # Checks that SQLite storage ties students whose averages are equal as fractions,
+    # even though summing their percentages in test order gives different floats
+    import project
+    (tmp_path / "users.csv").write_text("grn,name,math\n1230,A,1\n1231,B,1\n1232,C,1\n")
+    (tmp_path / "passwords.csv").write_text("name,email,password\n")
+    (tmp_path / "math.csv").write_text("grn,test1,test2,test3\n1230,1/3,2/3,1/7\n1231,1/7,2/3,1/3\n1232,1/3,1/3,1/3\n")
+    monkeypatch.chdir(tmp_path)
+    assert (1 / 3 * 100 + 2 / 3 * 100 + 1 / 7 * 100) != (1 / 7 * 100 + 2 / 3 * 100 + 1 / 3 * 100)
+    project.csv_to_sqlite("school.db")
+    storage = project.SQLiteStorage("school.db")
+    rankings = storage.student_rankings()
+    assert [student["name"] for student in rankings] == ["A", "B", "C"]
+    assert rankings[0]["average"] == rankings[1]["average"] == Student(math=[(1, 3), (2, 3), (1, 7)]).average()
+    assert storage.student_ranks("1231", ["math"]) == ([{"subject": "math", "rank": 1, "total_students": 3}], 1, 3)
+    assert storage.student_ranks("1232", ["math"])[1] == 3
+    # Entered scores update the cached averages, and switching AVERAGE_MODE works them all out again
+    storage.record_scores("math", {"1232": {0: "3/3"}})
+    assert storage.student_ranks("1232", ["math"]) == ([{"subject": "math", "rank": 1, "total_students": 3}], 1, 3)
+    monkeypatch.setattr(project, "AVERAGE_MODE", "weighted")
+    assert storage.student_rankings()[0] == {"name": "C", "average": 100 * 5 / 9}
+    assert project.SQLiteStorage("school.db").stored_average_mode() == "weighted"
+
+def test_profiling_summary(tmp_path):
+    # Checks that instrumented functions are counted, timed and traced only while profiling is on
+    import json
+    import project
+    students = {"1": Student(math=[80]), "2": Student(math=[90])}
+    users_data = [{"grn": "1", "name": "A", "math": "1"}, {"grn": "2", "name": "B", "math": "1"}]
+    calculate_student_rankings(users_data, students)
+    project.start_profiling(str(tmp_path / "profile.json"), memory=True)
+    for _ in range(3):
+        calculate_student_rankings(users_data, students)
+    RankIndex(users_data, students)
+    project.stop_profiling()
+    summary = json.loads((tmp_path / "profile.json").read_text())
+    rankings = summary["functions"]["calculate_student_rankings"]
+    assert rankings["calls"] == 3
+    assert rankings["p99_ms"] <= rankings["total_seconds"] * 1000
+    assert "peak_bytes" in summary["functions"]["RankIndex.__init__"]
+    assert project._profile == {}
+
+def test_teacher_menu_sees_data_reloaded_by_refresh(tmp_path, monkeypatch, capsys):
+    # Checks that the menu keeps using the reloaded data after a users.csv column change makes refresh_data start over,
+    # so a row appended after that still reaches it
+    import project
+    (tmp_path / "users.csv").write_text("grn,name,math\n1230,A,1\n,T,1\n")
+    (tmp_path / "passwords.csv").write_text("name,email,password\n")
+    (tmp_path / "math.csv").write_text("grn,test1\n1230,10/20\n")
+    (tmp_path / "art.csv").write_text("grn,test1\n")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(project, "_loaded", {})
+
+    def answers():
+        yield "2"
+        (tmp_path / "users.csv").write_text("grn,name,math,art\n1230,A,1,0\n1231,B,1,0\n,T,1,0\n")
+        yield "2"
+        with open(tmp_path / "math.csv", "a") as file:
+            file.write("1231,20/20\n")
+        yield "2"
+
+    inputs = answers()
+
+    def answer(prompt):
+        for choice in inputs:
+            return choice
+        raise EOFError
+
+    monkeypatch.setattr("builtins.input", answer)
+    with pytest.raises(SystemExit):
+        project.teacher_menu("T")
+    output = capsys.readouterr().out
+    assert "class is 50.00%" in output and "class is 75.00%" in output
+
+def test_file_state_tells_appends_from_edits(tmp_path, monkeypatch):
+    # Checks that appends are read from the window before them, and that same-size edits and replaced files are edits
+    import os
+    import project
+    monkeypatch.setattr(project, "FILE_TAIL_WINDOW", 16)
+    filename = tmp_path / "math.csv"
+    filename.write_text("grn,test1\n" + "".join(f"{grn},10/20\n" for grn in range(1230, 1240)))
+    state = project.FileState(filename)
+    assert state.poll(filename) == ("unchanged", "")
+    with open(filename, "a") as file:
+        file.write("1240,20/20\n1241,")
+    assert state.poll(filename) == ("appended", "1240,20/20\n")
+    with open(filename, "a") as file:
+        file.write("5/20\n")
+    assert state.poll(filename) == ("appended", "1241,5/20\n")
+    text = filename.read_text()
+    filename.write_text(text.replace("1231,10/20", "1231,11/20"))
+    os.utime(filename, ns=(state.mtime_ns + 1, state.mtime_ns + 1))
+    assert state.poll(filename) == ("edited", "")
+    (tmp_path / "new.csv").write_text(text + "1242,1/20\n")
+    os.replace(tmp_path / "new.csv", filename)
+    assert state.poll(filename) == ("edited", "")
+    assert state.size == len(text) + len("1242,1/20\n")
+
+def test_refresh_picks_up_outside_edits(tmp_path, monkeypatch):
+    # Checks that appended and edited CSV rows reach the loaded students and rank index without a reload,
+    # and that the program's own writes are not applied a second time
+    import project
+    (tmp_path / "users.csv").write_text("grn,name,math,art\n1230,A,1,1\n1231,B,1,0\n")
+    (tmp_path / "passwords.csv").write_text("name,email,password\nA,a@student.edu,x\n")
+    (tmp_path / "math.csv").write_text("grn,test1,test2\n1230,10/20,\n1231,18/20,\n")
+    (tmp_path / "art.csv").write_text("grn,test1\n1230,9/10\n")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(project, "_loaded", {})
+    rank_index = project.get_rank_index()
+    credentials = project.get_credentials()
+    assert project.refresh_data() == []
+    with open("math.csv", "a") as file:
+        file.write("1230,,20/20\n1232,20/20,20/20\n1231,5/")
+    with open("users.csv", "a") as file:
+        file.write("1232,C,1,0\n")
+    with open("passwords.csv", "a") as file:
+        file.write("C,c@student.edu,y\n")
+    assert sorted(project.refresh_data()) == ["math.csv", "passwords.csv", "users.csv"]
+    assert project.get_subject("math")["1230"] == [(10, 20), (20, 20)]
+    assert project.get_students()["1232"].average() == 100.0
+    assert rank_index.rank(100.0) == 1 and rank_index.total() == 3
+    assert credentials["c@student.edu"]["password"] == "y"
+    # The half-written row is read once it is finished
+    with open("math.csv", "a") as file:
+        file.write("20,\n")
+    assert project.refresh_data() == ["math.csv"]
+    assert project.get_subject("math")["1231"] == [(5, 20), None]
+    project.record_scores("math", {"1231": {1: "20/20"}})
+    assert project.refresh_data() == []
+    # Edits in place are compared GRN by GRN
+    (tmp_path / "math.csv").write_text("grn,test1,test2\n1230,20/20,20/20\n1231,2/20,\n")
+    (tmp_path / "users.csv").write_text("grn,name,math,art\n1230,A,1,1\n1231,B,1,1\n")
+    assert sorted(project.refresh_data()) == ["math.csv", "users.csv"]
+    assert project.get_subject("math") == load_subject("math.csv")
+    assert "1232" not in project.get_students() and rank_index.total() == 2
+    assert project.get_students()["1231"].average() == 10.0
+    assert rank_index.total("art") == 2
+    assert [s["grn"] for s in rank_index.rank_range(1, 2)] == ["1230", "1231"]
+
+def test_terms_trend_and_cohorts(tmp_path, monkeypatch):
+    # Checks that closing a term archives it, starts the next with no tests, and that trends and cohorts
+    # are answered from the closed term's cached summary without parsing its files again
+    import project
+    (tmp_path / "users.csv").write_text("grn,name,math,art\n1230,A,1,1\n1231,B,1,0\n")
+    (tmp_path / "math.csv").write_text("grn,test1,test2\n1230,10/20,\n1231,18/20,\n1231,,20/20\n")
+    (tmp_path / "art.csv").write_text("grn,test1\n1230,9/10\n")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(project, "_loaded", {})
+    summary = project.close_term("2024-1")
+    assert (summary["grns"], list(summary["overall"]), list(summary["ranks"])) == (["1230", "1231"], [70.0, 95.0], [2, 1])
+    assert (tmp_path / "math.csv").read_text().splitlines() == ["grn", "1230", "1231"]
+    assert (tmp_path / "terms" / "2024-1" / "summary.mean.cache").exists()
+    with pytest.raises(ValueError):
+        project.close_term("2024-1")
+    assert project.add_test("math") == 1
+    project.record_scores("math", {"1230": {0: "20/20"}})
+    monkeypatch.setattr(project, "_loaded", {})
+    monkeypatch.setattr(project, "load_subject_cached", None)
+    assert project.list_terms() == ["2024-1"]
+    trend = project.student_trend("1230", ["2024-1"])
+    assert trend == [{"term": "2024-1", "average": 70.0, "rank": 2, "total_students": 2, "subjects": {"math": 50.0, "art": 90.0}}]
+    assert [(cohort["term"], cohort["mean"]) for cohort in project.cohort_averages("math", ["2024-1"])] == [("2024-1", 72.5)]
+    assert list(project._loaded) == ["2024-1_term"]
+    monkeypatch.undo()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(project, "_loaded", {})
+    assert [(entry["term"], entry["average"], entry["rank"]) for entry in project.student_trend("1230")] == [("2024-1", 70.0, 2), ("current", 100.0, 1)]
+    assert [(cohort["term"], cohort["mean"]) for cohort in project.cohort_averages("art")] == [("2024-1", 90.0), ("current", 0)]
+
+def test_close_term_survives_crashes(tmp_path, monkeypatch):
+    # Checks that a close interrupted before its journal commits leaves the term open,
+    # and one interrupted after it is finished by recovery, with the files reset and the summary in place
+    import project
+    (tmp_path / "users.csv").write_text("grn,name,math\n1230,A,1\n1231,B,1\n")
+    (tmp_path / "math.csv").write_text("grn,test1\n1230,10/20\n1231,18/20\n")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(project, "_loaded", {})
+
+    def crash(*args):
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as patch:
+        patch.setattr(project, "summarize_term", crash)
+        with pytest.raises(KeyboardInterrupt):
+            project.close_term("2024-1")
+    assert project.list_terms() == [] and os.listdir(tmp_path / "terms") == []
+    assert (tmp_path / "math.csv").read_text() == "grn,test1\n1230,10/20\n1231,18/20\n"
+    with monkeypatch.context() as patch:
+        patch.setattr(project, "replay_journal", crash)
+        with pytest.raises(KeyboardInterrupt):
+            project.close_term("2024-1")
+    assert project.list_terms() == [] and (tmp_path / ".sms.journal").exists()
+    assert project.CSVStorage().recover()
+    assert project.list_terms() == ["2024-1"] and os.listdir(tmp_path / "terms") == ["2024-1"]
+    assert (tmp_path / "math.csv").read_text().splitlines() == ["grn", "1230", "1231"]
+    assert (tmp_path / "terms" / "2024-1" / "math.csv").read_text() == "grn,test1\n1230,10/20\n1231,18/20\n"
+    monkeypatch.setattr(project, "load_subject_cached", None)
+    assert list(project.get_term_summary("2024-1")["overall"]) == [50.0, 90.0]